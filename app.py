@@ -1,7 +1,7 @@
 import os
 import json
 from datetime import datetime
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, send_from_directory, current_app
+from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, send_from_directory, send_file, current_app, stream_with_context
 from flask_admin import Admin
 from flask_admin.contrib.sqla import ModelView
 from flask_wtf import FlaskForm
@@ -18,16 +18,63 @@ import io
 import uuid
 import pandas as pd
 from PIL import Image
+from sqlalchemy import inspect
+from sqlalchemy.orm import joinedload, selectinload
 
 from config import Config
-from models import db, Product, Order, User, SystemSetting, Category
-from utils import send_email_notification, send_sms_notification, fetch_product_image, allowed_file, resize_image
+from models import db, Product, Order, OrderItem, User, SystemSetting, Category, NotificationOutbox, ProductSalesDaily, ImportJob
+from utils import fetch_product_image, allowed_file, resize_image
+from search_index import product_index
+from search_backends import create_search_backend
+from prefix_index import prefix_index
+from lookup_cache import lookup_cache, lookup_product
+from pagination import Cursor
+from category_tree import category_tree
+from cache_versions import cache_versions
+from response_cache import response_cache
+from metrics import request_metrics
+from query_budget import query_budget, query_budget_monitor
+from orders import place_order, place_cart_order, resolve_lines
+from notification_outbox import outbox_worker
+from smtp_pool import smtp_pool
+from settings_cache import settings_cache, BOOLEAN_SETTINGS, SECRET_SETTINGS
+import dashboard_counters
+import sales_rollup
+from import_jobs import create_import_job, import_job_runner
+import order_export
 
 csrf = CSRFProtect()
 
-def create_app():
+def create_missing_indexes(engine):
+    """为已有的表补建 models.py 中声明、数据库里还没有的索引，返回新建的索引名
+
+    create_all 只在建表时建索引。PostgreSQL 上用 CREATE INDEX CONCURRENTLY，
+    建索引期间不阻塞产品、订单的写入；CONCURRENTLY 不能在事务中执行，连接使用自动提交。
+    """
+    concurrently = engine.dialect.name == 'postgresql'
+    created = []
+    with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+        inspector = inspect(conn)
+        for table in db.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {index['name'] for index in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name in existing:
+                    continue
+                options = index.dialect_options['postgresql']
+                options['concurrently'] = concurrently
+                try:
+                    index.create(bind=conn)
+                finally:
+                    # 只对这一次生效，create_all 在事务中建表时不能带 CONCURRENTLY
+                    options['concurrently'] = False
+                created.append(index.name)
+    return created
+
+def create_app(config_class=Config):
     app = Flask(__name__)
-    app.config.from_object(Config)
+    app.config.from_object(config_class)
     csrf.init_app(app)
 
     # 创建必要的目录
@@ -36,6 +83,24 @@ def create_app():
     os.makedirs(os.path.join(app.config['UPLOAD_FOLDER'], 'temp'), exist_ok=True)
 
     db.init_app(app)
+    request_metrics.init_app(app, db)
+    cache_versions.init_app(app)
+    response_cache.init_app(app)
+    product_index.init_app(app)
+    prefix_index.init_app(app)
+    lookup_cache.init_app(app)
+    category_tree.init_app(app)
+    outbox_worker.init_app(app)
+    import_job_runner.init_app(app)
+    smtp_pool.init_app(app)
+    settings_cache.init_app(app)
+    query_budget_monitor.init_app(app)
+    search_backend = create_search_backend(app.config['SEARCH_BACKEND'], app.config['SQLALCHEMY_DATABASE_URI'])
+
+    # 页脚年份（原先依赖未安装也未初始化的 flask-moment）
+    @app.context_processor
+    def inject_current_year():
+        return {'current_year': datetime.utcnow().year}
 
     # 管理后台设置
     admin = Admin(app, name='后台管理', template_mode='bootstrap4', url='/admin')
@@ -55,6 +120,7 @@ def create_app():
         column_list = ('id', 'product', 'quantity', 'customer_name', 'customer_phone', 'status', 'total_amount', 'created_at')
         column_searchable_list = ('customer_name', 'customer_phone')
         column_filters = ('status', 'created_at')
+        column_default_sort = ('created_at', True)
         form_columns = ('product', 'quantity', 'customer_name', 'customer_phone', 'status', 'notes')
         
     class CategoryAdmin(ModelView):
@@ -70,14 +136,44 @@ def create_app():
 
     admin.add_view(ProductAdmin(Product, db.session))
     admin.add_view(OrderAdmin(Order, db.session))
+    
+    class OrderItemAdmin(ModelView):
+        column_list = ('order_id', 'product', 'quantity', 'unit_price', 'total_amount')
+        column_filters = ('order_id',)
+        can_create = False
+        can_edit = False
+    
+    admin.add_view(OrderItemAdmin(OrderItem, db.session, name='订单明细'))
     admin.add_view(CategoryAdmin(Category, db.session))
     admin.add_view(UserAdmin(User, db.session))
     admin.add_view(ModelView(SystemSetting, db.session))
+    
+    class OutboxAdmin(ModelView):
+        column_list = ('order_id', 'channel', 'status', 'attempts', 'next_attempt_at', 'last_error', 'created_at', 'sent_at')
+        column_filters = ('status', 'channel')
+        column_default_sort = ('id', True)
+        form_columns = ('status', 'next_attempt_at')
+        can_create = False
+    
+    admin.add_view(OutboxAdmin(NotificationOutbox, db.session, name='通知发件箱'))
+    
+    class ImportJobAdmin(ModelView):
+        column_list = ('filename', 'status', 'rows_read', 'inserted', 'updated', 'skipped', 'failed',
+                       'message', 'created_at', 'finished_at')
+        column_filters = ('status',)
+        column_default_sort = ('id', True)
+        
+    admin.add_view(ImportJobAdmin(ImportJob, db.session, name='导入任务'))
 
     # 创建默认管理员账户
     @app.before_first_request
     def create_tables():
+        # 已有的表缺少的索引不在这里补建（会在大表上锁表），升级后运行 flask --app app create-indexes
         db.create_all()
+        search_backend.install(db.engine)
+        
+        # 启动时构建输入联想索引，之后随产品变更增量更新
+        prefix_index.build()
         
         # 创建默认管理员账户
         if not User.query.filter_by(username='admin').first():
@@ -112,38 +208,58 @@ def create_app():
                 db.session.add(setting)
                 
         db.session.commit()
+        
+        # 首次部署时从现有数据生成统计页计数器，之后随产品、订单变更增量维护
+        if not dashboard_counters.read_counters():
+            dashboard_counters.reconcile()
+        # 已有订单但还没有销量汇总时（升级后首次启动）从订单重建
+        if not db.session.query(ProductSalesDaily.id).first() and db.session.query(Order.id).first():
+            sales_rollup.reconcile()
+        
+        # 启动通知投递线程，OUTBOX_WORKERS=0 时由 notification_worker.py 单独投递
+        outbox_worker.start(app)
+        # 启动导入线程，IMPORT_WORKERS=0 时由 import_worker.py 单独导入
+        import_job_runner.start(app)
 
     @app.route('/')
     def index():
         return redirect(url_for('search'))
 
     @app.route('/search', methods=['GET', 'POST'])
+    @query_budget(5)
+    @response_cache.cached('catalog')
     def search():
         q = request.args.get('q', '').strip() if request.method == 'GET' else request.form.get('q', '').strip()
         sku = request.args.get('sku', '').strip() if request.method == 'GET' else request.form.get('sku', '').strip()
         barcode = request.args.get('barcode', '').strip() if request.method == 'GET' else request.form.get('barcode', '').strip()
         category = request.args.get('category', '') if request.method == 'GET' else request.form.get('category', '')
+        cursor = Cursor.decode(request.args.get('cursor', ''))
+        per_page = app.config['PRODUCTS_PER_PAGE']
         
-        products = []
-        categories = Category.query.filter_by(is_active=True).all()
+        page = None
+        categories = category_tree.active_categories()
         
         if q or sku or barcode or category:
-            query = Product.query.filter_by(is_active=True)
-            if q:
-                query = query.filter(Product.name.ilike(f"%{q}%"))
-            if sku:
-                query = query.filter(Product.sku.ilike(f"%{sku}%"))
-            if barcode:
-                query = query.filter(Product.barcode == barcode)
-            if category:
-                query = query.filter(Product.category_id == category)
+            query = filter_products(Product.query.filter_by(is_active=True), barcode, category)
+            # 名称、货号匹配交给搜索后端（n-gram 索引、全文检索或 ilike）
+            page = search_backend.paginate(query, q, sku, per_page, cursor)
             
-            products = query.order_by(Product.created_at.desc()).limit(100).all()
-            
-        return render_template('search.html', products=products, q=q, sku=sku, barcode=barcode, 
+        products = page.items if page else []
+        return render_template('search.html', products=products, page=page, q=q, sku=sku, barcode=barcode, 
                              category=category, categories=categories)
 
+    def filter_products(query, barcode, category):
+        """按条码、分类过滤产品查询"""
+        if barcode:
+            query = query.filter(Product.barcode == barcode)
+        if category:
+            # 选中父分类时包含全部子分类的产品
+            category_ids = category_tree.subtree_ids(int(category)) if category.isdigit() else ()
+            query = query.filter(Product.category_id.in_(category_ids))
+        return query
+
     @app.route('/product/<int:product_id>')
+    @query_budget(2)
     def product_detail(product_id):
         p = Product.query.get_or_404(product_id)
         if not p.is_active:
@@ -151,7 +267,59 @@ def create_app():
             return redirect(url_for('search'))
         return render_template('result.html', p=p)
 
+    # 未命中缓存时读一次 catalog 版本号、查一次产品
+    @app.route('/api/lookup')
+    @query_budget(2)
+    def api_lookup():
+        # 扫码枪专用：按条码或货号精确查询，结果走进程内缓存
+        for field in ('barcode', 'sku'):
+            code = request.args.get(field, '').strip()
+            if code:
+                break
+        else:
+            return jsonify({'error': '请提供条码或货号'}), 400
+            
+        result = lookup_product(field, code)
+        if result is None:
+            return jsonify({'error': '未找到产品'}), 404
+        is_active, payload = result
+        if not is_active:
+            return jsonify({'error': '该产品已下架'}), 404
+        return app.response_class(payload, mimetype='application/json')
+
+    @app.route('/api/suggest')
+    def api_suggest():
+        # 输入联想：按名称、货号或条码前缀匹配上架产品
+        prefix = request.args.get('q', '').strip()
+        field = request.args.get('field', '')
+        limit = min(request.args.get('limit', 10, type=int) or 10, 50)
+        return jsonify({'suggestions': prefix_index.suggest(prefix, field=field, limit=limit)})
+
+    @app.route('/api/products')
+    @query_budget(1)
+    def api_products():
+        # 以 NDJSON 流式返回产品，每行一个 JSON 对象，内存占用与结果数量无关
+        q = request.args.get('q', '').strip()
+        sku = request.args.get('sku', '').strip()
+        barcode = request.args.get('barcode', '').strip()
+        category = request.args.get('category', '')
+        include_inactive = request.args.get('include_inactive', 'false').lower() == 'true'
+        
+        # 分类随产品一起 JOIN 加载，to_dict() 不再逐个查询分类
+        query = Product.query.options(joinedload(Product.category))
+        if not include_inactive:
+            query = query.filter_by(is_active=True)
+        query = filter_products(query, barcode, category)
+        rows = search_backend.iter_rows(query, q, sku, batch_size=app.config['API_STREAM_BATCH_SIZE'])
+        
+        def generate():
+            for product in rows:
+                yield json.dumps(product.to_dict(), ensure_ascii=False) + '\n'
+                
+        return app.response_class(stream_with_context(generate()), mimetype='application/x-ndjson')
+
     @app.route('/order/<int:product_id>', methods=['GET', 'POST'])
+    @query_budget(1, POST=12)
     def order(product_id):
         p = Product.query.get_or_404(product_id)
         if not p.is_active:
@@ -161,40 +329,91 @@ def create_app():
         form = OrderForm()
         
         if form.validate_on_submit():
-            # 检查库存
-            if p.stock_quantity and p.stock_quantity < form.quantity.data:
+            # 扣减库存和创建订单在同一事务中完成
+            order = place_order(p, form.quantity.data, form.customer_name.data,
+                                form.customer_phone.data, form.notes.data)
+            if order is None:
                 flash('库存不足', 'error')
                 return render_template('order_confirm.html', product=p, form=form)
-                
-            # 计算总金额
-            unit_price = p.wholesale_price if form.quantity.data >= 10 else p.retail_price
-            total_amount = unit_price * form.quantity.data
-            
-            order = Order(
-                product_id=p.id,
-                quantity=form.quantity.data,
-                customer_name=form.customer_name.data,
-                customer_phone=form.customer_phone.data,
-                total_amount=total_amount,
-                status='pending',
-                notes=form.notes.data
-            )
-            
-            db.session.add(order)
-            
-            # 更新库存
-            if p.stock_quantity:
-                p.stock_quantity -= form.quantity.data
-                
-            db.session.commit()
-            
-            # 发送通知
-            send_notifications(order, p)
             
             return render_template('order_success.html', order=order, product=p)
             
         return render_template('order_confirm.html', product=p, form=form)
 
+    @app.route('/api/orders', methods=['POST'])
+    # 每行明细一条扣减库存的 UPDATE，预算按 3 行订单计算
+    @query_budget(13)
+    def api_create_order():
+        # 多行订单：全部明细在一个事务中扣减库存并创建，任一产品库存不足则整单失败
+        data = request.get_json(silent=True) or {}
+        customer_name = str(data.get('customer_name') or '').strip()
+        customer_phone = str(data.get('customer_phone') or '').strip()
+        
+        errors = []
+        if not 2 <= len(customer_name) <= 50:
+            errors.append('姓名长度应为2到50个字符')
+        if len(customer_phone) != 11:
+            errors.append('电话应为11位')
+        lines, line_errors = resolve_lines(data.get('items'))
+        errors.extend(line_errors)
+        if errors:
+            return jsonify({'error': '订单校验失败', 'details': errors}), 400
+            
+        order, short_product = place_cart_order(lines, customer_name, customer_phone, data.get('notes'))
+        if order is None:
+            return jsonify({'error': '库存不足', 'product_id': short_product.id, 'sku': short_product.sku}), 409
+        # 提交后重新加载订单，明细和产品一起加载，不逐行查询
+        order = Order.query.options(
+            joinedload(Order.product),
+            selectinload(Order.items).joinedload(OrderItem.product),
+        ).filter_by(id=order.id).one()
+        return jsonify(order.to_dict()), 201
+
+    @app.route('/api/top-products')
+    @query_budget(1)
+    def api_top_products():
+        # 热销排行：range 为 today、7d 或 30d，只读每日销量汇总
+        top_range = request.args.get('range', '7d')
+        if top_range not in sales_rollup.RANGES:
+            return jsonify({'error': f"range 应为 {', '.join(sales_rollup.RANGES)}"}), 400
+        limit = min(request.args.get('limit', 10, type=int) or 10, 100)
+        rows = sales_rollup.top_products(sales_rollup.RANGES[top_range], limit=limit)
+        return jsonify({'range': top_range, 'products': [{
+            'product_id': row.product.id,
+            'sku': row.product.sku,
+            'name': row.product.name,
+            'units': row.units,
+            'revenue': row.revenue,
+            'order_count': row.order_count,
+        } for row in rows]})
+
+    @app.route('/export/orders')
+    @query_budget(1)
+    def export_orders():
+        # 订单导出：按下单日期（start、end，含当天）和状态（逗号分隔）筛选，服务端游标分批读取
+        fmt = request.args.get('format', 'csv')
+        if fmt not in ('csv', 'xlsx'):
+            return jsonify({'error': 'format 应为 csv 或 xlsx'}), 400
+        try:
+            start = order_export.parse_date(request.args.get('start'))
+            end = order_export.parse_date(request.args.get('end'))
+            statuses = order_export.parse_statuses(request.args.get('status'))
+        except ValueError as e:
+            return jsonify({'error': f'筛选条件错误: {e}'}), 400
+        
+        rows = order_export.iter_rows(start, end, statuses, batch_size=app.config['API_STREAM_BATCH_SIZE'])
+        filename = order_export.export_filename(fmt, start, end)
+        if fmt == 'xlsx':
+            if not order_export.OPENPYXL_AVAILABLE:
+                return jsonify({'error': '导出 XLSX 需要安装 openpyxl'}), 400
+            # XLSX 是 zip 包，写完才能发送；只写模式逐行写入临时文件，内存占用不随行数增长
+            return send_file(order_export.xlsx_tempfile(rows), as_attachment=True, download_name=filename,
+                             mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+        response = app.response_class(stream_with_context(order_export.iter_csv(rows)),
+                                      mimetype='text/csv; charset=utf-8')
+        response.headers['Content-Disposition'] = f'attachment; filename={filename}'
+        return response
+
     @app.route('/upload_product', methods=['GET', 'POST'])
     def upload_product():
         if request.method == 'POST':
@@ -209,120 +428,72 @@ def create_app():
                 
             if file and allowed_file(file.filename, ['csv', 'xlsx']):
                 try:
-                    if file.filename.endswith('.csv'):
-                        # 处理CSV文件
-                        stream = io.StringIO(file.read().decode('utf-8'))
-                        csv_reader = csv.DictReader(stream)
-                        
-                        for row in csv_reader:
-                            product = Product(
-                                sku=row.get('sku', ''),
-                                name=row.get('name', ''),
-                                barcode=row.get('barcode', ''),
-                                spec=row.get('spec', ''),
-                                model=row.get('model', ''),
-                                retail_price=float(row.get('retail_price', 0)),
-                                wholesale_price=float(row.get('wholesale_price', 0)),
-                                stock_quantity=int(row.get('stock_quantity', 0)),
-                                description=row.get('description', '')
-                            )
-                            db.session.add(product)
-                            
-                    elif file.filename.endswith(('.xlsx', '.xls')):
-                        # 处理Excel文件
-                        try:
-                            df = pd.read_excel(file)
-                            # 重命名列以匹配标准格式
-                            column_mapping = {
-                                '货号': 'sku',
-                                '产品名称': 'name',
-                                '品名': 'name', 
-                                '名称': 'name',
-                                '条码': 'barcode',
-                                '规格': 'spec',
-                                '型号': 'model',
-                                '零售价': 'retail_price',
-                                '零售价格': 'retail_price',
-                                '批发价': 'wholesale_price',
-                                '批发价格': 'wholesale_price',
-                                '库存': 'stock_quantity',
-                                '库存数量': 'stock_quantity',
-                                '描述': 'description',
-                                '分类': 'category'
-                            }
-                            df = df.rename(columns=column_mapping)
-                            
-                            for index, row in df.iterrows():
-                                product = Product(
-                                    sku=str(row.get('sku', '')),
-                                    name=str(row.get('name', '')),
-                                    barcode=str(row.get('barcode', '')) if pd.notna(row.get('barcode')) else '',
-                                    spec=str(row.get('spec', '')) if pd.notna(row.get('spec')) else '',
-                                    model=str(row.get('model', '')) if pd.notna(row.get('model')) else '',
-                                    retail_price=float(row.get('retail_price', 0)) if pd.notna(row.get('retail_price')) else 0,
-                                    wholesale_price=float(row.get('wholesale_price', 0)) if pd.notna(row.get('wholesale_price')) else 0,
-                                    stock_quantity=int(row.get('stock_quantity', 0)) if pd.notna(row.get('stock_quantity')) else 0,
-                                    description=str(row.get('description', '')) if pd.notna(row.get('description')) else ''
-                                )
-                                db.session.add(product)
-                        except Exception as e:
-                            flash(f'Excel文件处理失败: {str(e)}', 'error')
-                            return redirect(request.url)
-                        
-                    db.session.commit()
-                    flash('产品导入成功', 'success')
-                    return redirect(url_for('search'))
-                    
+                    # 文件暂存后由后台线程导入，请求立即返回，页面轮询任务进度
+                    job = create_import_job(file, skip_existing='skip_existing' in request.form)
                 except Exception as e:
                     flash(f'导入失败: {str(e)}', 'error')
                     return redirect(request.url)
+                if request.accept_mimetypes.best == 'application/json':
+                    return jsonify(job.to_dict()), 202
+                return redirect(url_for('upload_product', job=job.id))
             else:
                 flash('不支持的文件格式', 'error')
                 return redirect(request.url)
                 
-        return render_template('upload_product.html')
+        return render_template('upload_product.html', job_id=request.args.get('job', type=int))
+
+    @app.route('/api/import-jobs/<int:job_id>')
+    @query_budget(1)
+    def api_import_job(job_id):
+        # 上传页面轮询导入进度
+        job = db.session.get(ImportJob, job_id)
+        if job is None:
+            return jsonify({'error': '导入任务不存在'}), 404
+        return jsonify(job.to_dict())
 
     @app.route('/settings', methods=['GET', 'POST'])
+    @query_budget(2)
     def settings():
         if request.method == 'POST':
-            for key, value in request.form.items():
-                setting = SystemSetting.query.filter_by(key=key).first()
-                if setting:
-                    setting.value = value
-                else:
-                    setting = SystemSetting(key=key, value=value)
-                    db.session.add(setting)
-            db.session.commit()
+            values = {key: value for key, value in request.form.items() if key != 'csrf_token'}
+            for key in BOOLEAN_SETTINGS:
+                values[key] = 'true' if key in values else 'false'
+            for key in SECRET_SETTINGS:
+                if not values.get(key):
+                    values.pop(key, None)
+            settings_cache.save(values)
             flash('设置保存成功', 'success')
             return redirect(url_for('settings'))
             
-        settings = SystemSetting.query.all()
-        settings_dict = {s.key: s.value for s in settings}
-        return render_template('settings.html', settings=settings_dict)
+        return render_template('settings.html', settings=settings_cache.snapshot())
 
     @app.route('/statistics')
+    @query_budget(4)
     def statistics():
-        total_products = Product.query.count()
-        active_products = Product.query.filter_by(is_active=True).count()
+        # 计数器随产品、订单变更在同一事务内维护，这里只读一次
+        counters = dashboard_counters.read_counters()
+        total_products = int(counters.get(dashboard_counters.PRODUCTS_TOTAL, 0))
+        active_products = int(counters.get(dashboard_counters.PRODUCTS_ACTIVE, 0))
         inactive_products = total_products - active_products
-        total_orders = Order.query.count()
-        pending_orders = Order.query.filter_by(status='pending').count()
-        
-        # 计算总销售额
-        total_sales = db.session.query(db.func.sum(Order.total_amount)).filter(Order.status != 'cancelled').scalar() or 0
+        total_orders = int(counters.get(dashboard_counters.ORDERS_TOTAL, 0))
+        pending_orders = int(counters.get(dashboard_counters.order_status_counter('pending'), 0))
+        total_sales = counters.get(dashboard_counters.SALES_TOTAL, 0)
         
         # 获取最近订单
-        recent_orders = Order.query.order_by(Order.created_at.desc()).limit(10).all()
+        recent_orders = Order.query.options(joinedload(Order.product)).order_by(Order.created_at.desc()).limit(10).all()
         
-        # 获取热门产品（按销量）
-        top_products = Product.query.filter_by(is_active=True).limit(10).all()
+        # 热门产品按每日销量汇总排行，不扫描订单表
+        top_range = request.args.get('range', '7d')
+        if top_range not in sales_rollup.RANGES:
+            top_range = '7d'
+        top_products = sales_rollup.top_products(sales_rollup.RANGES[top_range])
         
-        # 获取库存不足产品
-        low_stock_products = Product.query.filter(
+        # 库存不足产品只需要数量，按库存索引计数
+        low_stock_count = db.session.query(db.func.count(Product.id)).filter(
             Product.stock_quantity <= 10,
             Product.stock_quantity > 0,
             Product.is_active == True
-        ).all()
+        ).scalar()
         
         return render_template('statistics.html', 
                              total_products=total_products,
@@ -333,22 +504,21 @@ def create_app():
                              total_sales=total_sales,
                              recent_orders=recent_orders,
                              top_products=top_products,
-                             low_stock_products=low_stock_products)
+                             top_range=top_range,
+                             low_stock_count=low_stock_count)
 
     @app.route('/uploads/<filename>')
     def uploaded_file(filename):
         return send_from_directory(app.config['UPLOAD_FOLDER'], filename)
 
-    def send_notifications(order, product):
-        settings = {s.key: s.value for s in SystemSetting.query.all()}
-        
-        # 发送邮件通知
-        if settings.get('enable_email', 'false').lower() == 'true':
-            send_email_notification(order, product, settings)
-            
-        # 发送短信通知
-        if settings.get('enable_sms', 'false').lower() == 'true':
-            send_sms_notification(order, product, settings)
+    @app.cli.command('create-indexes')
+    def create_indexes_command():
+        """为已有数据库补建缺少的索引（升级后运行一次）"""
+        db.create_all()
+        created = create_missing_indexes(db.engine)
+        for name in created:
+            print(f"已创建索引 {name}")
+        print(f"共创建 {len(created)} 个索引")
 
     return app
 
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+产品搜索后端性能对比
+生成合成产品数据（默认100万条），分别用 ilike、ngram、fulltext 后端执行同一组查询，
+输出每个后端的首页查询延迟（平均、P50、P95）。
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from config import Config, BASE_DIR
+from app import create_app
+from models import db, Product
+from search_backends import create_search_backend
+from search_index import product_index
+
+WORDS = ['洗衣液', '洗洁精', '纸巾', '牙膏', '牙刷', '洗发水', '沐浴露', '香皂', '垃圾袋', '保鲜膜',
+         '拖把', '抹布', '衣架', '毛巾', '湿巾', '消毒液', '洗手液', '柔顺剂', '漂白剂', '除味剂']
+BRANDS = ['蓝月亮', '立白', '奥妙', '心相印', '维达', '清风', '高露洁', '佳洁士', '舒肤佳', '威露士']
+SPECS = ['500ml', '1L', '2L', '3kg', '6包装', '10卷', '家庭装', '旅行装']
+
+QUERIES = [
+    ('q', '洗衣液'),
+    ('q', '蓝月亮洗衣'),
+    ('q', '纸巾'),
+    ('q', '家庭装'),
+    ('q', '旅行装牙膏'),
+    ('q', '不存在的产品'),
+    ('sku', 'BM00123'),
+    ('sku', '9999'),
+]
+
+
+def seed_catalog(rows, batch_size=10000):
+    """批量生成合成产品数据"""
+    rng = random.Random(42)
+    base = datetime(2024, 1, 1)
+    table = Product.__table__
+    start = time.perf_counter()
+    for offset in range(0, rows, batch_size):
+        batch = []
+        for i in range(offset, min(offset + batch_size, rows)):
+            batch.append({
+                'sku': f'BM{i:07d}',
+                'barcode': f'69{i:011d}',
+                'name': f'{rng.choice(BRANDS)}{rng.choice(WORDS)}{rng.choice(SPECS)}',
+                'retail_price': round(rng.uniform(1, 200), 2),
+                'wholesale_price': round(rng.uniform(1, 150), 2),
+                'stock_quantity': rng.randint(0, 500),
+                'is_active': True,
+                'created_at': base + timedelta(seconds=i),
+                'updated_at': base + timedelta(seconds=i),
+            })
+        db.session.execute(table.insert(), batch)
+        db.session.commit()
+        print(f"\r已生成 {min(offset + batch_size, rows)}/{rows} 条", end='', flush=True)
+    print(f"\n数据生成耗时: {time.perf_counter() - start:.1f} 秒")
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+
+def run_backend(backend, repeat, per_page):
+    """执行查询组，返回每次查询的耗时（毫秒）"""
+    timings = []
+    for field, term in QUERIES:
+        q, sku = (term, '') if field == 'q' else ('', term)
+        for _ in range(repeat):
+            query = Product.query.filter_by(is_active=True)
+            start = time.perf_counter()
+            backend.paginate(query, q, sku, per_page)
+            timings.append((time.perf_counter() - start) * 1000)
+            db.session.rollback()
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description='产品搜索后端性能对比')
+    parser.add_argument('--rows', type=int, default=1000000, help='合成产品数量')
+    parser.add_argument('--database-url', default=f"sqlite:///{BASE_DIR / 'benchmark_search.db'}",
+                        help='基准测试使用的数据库（不要指向生产库）')
+    parser.add_argument('--repeat', type=int, default=5, help='每个查询重复次数')
+    parser.add_argument('--backends', default='ilike,ngram,fulltext', help='参与对比的后端，逗号分隔')
+    args = parser.parse_args()
+
+    class BenchmarkConfig(Config):
+        SQLALCHEMY_DATABASE_URI = args.database_url
+
+    app = create_app(BenchmarkConfig)
+    with app.app_context():
+        db.create_all()
+        existing = Product.query.count()
+        if existing < args.rows:
+            if existing:
+                print(f"数据库已有 {existing} 条产品，少于 {args.rows} 条，请换一个空数据库")
+                return
+            seed_catalog(args.rows)
+        print(f"产品数量: {Product.query.count()}")
+
+        per_page = app.config['PRODUCTS_PER_PAGE']
+        print(f"\n{'后端':<10}{'准备(秒)':>10}{'平均(ms)':>12}{'P50(ms)':>12}{'P95(ms)':>12}")
+        for name in args.backends.split(','):
+            backend = create_search_backend(name.strip(), args.database_url)
+            start = time.perf_counter()
+            backend.install(db.engine)
+            if backend.name == 'ngram':
+                product_index.build()
+            prepare = time.perf_counter() - start
+
+            timings = run_backend(backend, args.repeat, per_page)
+            print(f"{backend.name:<10}{prepare:>10.1f}{statistics.mean(timings):>12.2f}"
+                  f"{percentile(timings, 0.5):>12.2f}{percentile(timings, 0.95):>12.2f}")
+
+
+if __name__ == '__main__':
+    main()
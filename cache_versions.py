@@ -0,0 +1,109 @@
+"""
+缓存版本号
+cache_version 表按名称保存版本号，被跟踪的模型在事务中有增删改时，
+在同一事务内把对应版本号加一。各进程读取版本号判断本地缓存是否过期，
+多个 gunicorn worker 之间也能及时失效。
+"""
+
+import threading
+import time
+from datetime import datetime
+from itertools import chain
+
+from sqlalchemy import event, insert, select, update
+from sqlalchemy.orm import Session
+
+from models import db, Product, Category, SystemSetting, CacheVersion
+
+# 版本名称 -> 会使其加一的模型
+TRACKED = {
+    'catalog': (Product, Category),
+    'category': (Category,),
+    'settings': (SystemSetting,),
+}
+
+_BUMPED_KEY = '_bumped_cache_versions'
+
+
+def bump(session, name):
+    """在 session 当前事务内把版本号加一，同一事务只加一次
+
+    批量 UPDATE 等绕过 ORM 的写操作需要手动调用。
+    """
+    bumped = session.info.setdefault(_BUMPED_KEY, set())
+    if name in bumped:
+        return
+    conn = session.connection()
+    result = conn.execute(
+        update(CacheVersion)
+        .where(CacheVersion.name == name)
+        .values(version=CacheVersion.version + 1, updated_at=datetime.utcnow())
+    )
+    if result.rowcount == 0:
+        conn.execute(insert(CacheVersion).values(name=name, version=1, updated_at=datetime.utcnow()))
+    bumped.add(name)
+
+
+@event.listens_for(Session, 'after_flush')
+def _bump_tracked_versions(session, flush_context):
+    # after_flush 时 new/dirty/deleted 仍是 flush 前的状态
+    changed = list(chain(session.new, session.dirty, session.deleted))
+    if not changed:
+        return
+    for name, models in TRACKED.items():
+        if any(isinstance(obj, models) for obj in changed):
+            bump(session, name)
+
+
+@event.listens_for(Session, 'after_commit')
+def _publish_bumped_versions(session):
+    bumped = session.info.pop(_BUMPED_KEY, None)
+    if bumped:
+        cache_versions.invalidate(*bumped)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_bumped_versions(session):
+    session.info.pop(_BUMPED_KEY, None)
+
+
+class VersionReader:
+    """读取版本号，在 check_interval 秒内复用上次读到的值
+
+    本进程提交的变更会立即失效本地记录，其他进程的变更最多延迟 check_interval 秒。
+    """
+
+    def __init__(self, check_interval=1.0):
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def init_app(self, app):
+        self.check_interval = app.config.get('CACHE_VERSION_CHECK_INTERVAL', self.check_interval)
+        self.invalidate()
+        app.extensions['cache_versions'] = self
+
+    def current(self, name):
+        """返回版本号，需要在应用上下文中调用"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._values.get(name)
+        if entry is not None and now - entry[1] < self.check_interval:
+            return entry[0]
+        version = db.session.execute(
+            select(CacheVersion.version).where(CacheVersion.name == name)
+        ).scalar() or 0
+        with self._lock:
+            self._values[name] = (version, now)
+        return version
+
+    def invalidate(self, *names):
+        """丢弃本地记录的版本号，不传名称时全部丢弃"""
+        with self._lock:
+            if not names:
+                self._values.clear()
+            for name in names:
+                self._values.pop(name, None)
+
+
+cache_versions = VersionReader()
@@ -0,0 +1,114 @@
+"""
+分类树缓存
+进程内缓存全部分类及每个节点的后代ID集合（闭包），分类变更时 category 版本号加一，
+各进程下次访问时重建。按父分类筛选产品时直接用 category_id IN (...) 一次查询。
+"""
+
+import threading
+
+from cache_versions import cache_versions
+from models import db, Category
+
+
+class CategoryNode:
+    """分类树节点，只保存展示和筛选需要的字段，不持有 ORM 对象"""
+
+    __slots__ = ('id', 'name', 'parent_id', 'sort_order', 'is_active', 'depth', 'children')
+
+    def __init__(self, id, name, parent_id, sort_order, is_active):
+        self.id = id
+        self.name = name
+        self.parent_id = parent_id
+        self.sort_order = sort_order or 0
+        self.is_active = is_active
+        self.depth = 0
+        self.children = []
+
+
+class CategoryTree:
+    """按 category 版本号失效的分类树缓存"""
+
+    VERSION_NAME = 'category'
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._built_version = None
+        self._nodes = {}
+        self._ordered = []
+        self._descendants = {}
+
+    def init_app(self, app):
+        with self._lock:
+            self._built_version = None
+        app.extensions['category_tree'] = self
+
+    def _ensure_built(self):
+        version = cache_versions.current(self.VERSION_NAME)
+        if self._built_version == version:
+            return
+        with self._lock:
+            if self._built_version == version:
+                return
+            rows = db.session.query(
+                Category.id, Category.name, Category.parent_id, Category.sort_order, Category.is_active
+            ).all()
+            nodes = {row.id: CategoryNode(*row) for row in rows}
+
+            roots = []
+            for node in nodes.values():
+                parent = nodes.get(node.parent_id)
+                if parent is None or node.parent_id == node.id:
+                    roots.append(node)
+                else:
+                    parent.children.append(node)
+
+            # 先序遍历得到展示顺序，同时算出每个节点的后代集合
+            ordered = []
+            descendants = {}
+            visited = set()
+
+            def walk(node, depth):
+                visited.add(node.id)
+                node.depth = depth
+                ordered.append(node)
+                subtree = {node.id}
+                for child in sorted(node.children, key=lambda n: (n.sort_order, n.id)):
+                    if child.id not in visited:
+                        subtree |= walk(child, depth + 1)
+                descendants[node.id] = frozenset(subtree)
+                return subtree
+
+            for root in sorted(roots, key=lambda n: (n.sort_order, n.id)):
+                walk(root, 0)
+            # 成环的分类挂不到任何根节点上，单独处理
+            for node in nodes.values():
+                if node.id not in visited:
+                    walk(node, 0)
+
+            self._nodes = nodes
+            self._ordered = ordered
+            self._descendants = descendants
+            self._built_version = version
+
+    def active_categories(self):
+        """按树形顺序返回启用的分类，父分类停用时其子分类也不展示"""
+        self._ensure_built()
+        result = []
+        hidden_depth = None
+        for node in self._ordered:
+            if hidden_depth is not None and node.depth > hidden_depth:
+                continue
+            hidden_depth = None
+            if not node.is_active:
+                hidden_depth = node.depth
+                continue
+            result.append(node)
+        return result
+
+    def subtree_ids(self, category_id):
+        """返回分类及其全部子孙分类的ID，分类不存在时只返回自身"""
+        self._ensure_built()
+        return self._descendants.get(category_id, frozenset([category_id]))
+
+
+category_tree = CategoryTree()
@@ -26,6 +26,50 @@ class Config:
     SMS_SIGN_NAME = os.environ.get("SMS_SIGN_NAME", "产品查询系统")
     SMS_TEMPLATE_CODE = os.environ.get("SMS_TEMPLATE_CODE", "SMS_123456789")
     
+    # 搜索后端：ngram（进程内索引）、fulltext（PostgreSQL pg_trgm / SQLite FTS5）、ilike（模糊查询，便于对比延迟）
+    SEARCH_BACKEND = os.environ.get("SEARCH_BACKEND", "ngram")
+    
+    # 条码/货号查询缓存：产品、分类变更随 catalog 版本号失效，
+    # 其他 worker 下单扣减的库存不改变版本号，最多延迟 LOOKUP_CACHE_TTL 秒显示
+    LOOKUP_CACHE_SIZE = int(os.environ.get("LOOKUP_CACHE_SIZE", 10000))
+    LOOKUP_CACHE_TTL = int(os.environ.get("LOOKUP_CACHE_TTL", 300))
+    LOOKUP_NEGATIVE_TTL = int(os.environ.get("LOOKUP_NEGATIVE_TTL", 30))
+    
+    # 缓存版本号的检查间隔（秒），其他进程的修改最多延迟这么久生效
+    CACHE_VERSION_CHECK_INTERVAL = float(os.environ.get("CACHE_VERSION_CHECK_INTERVAL", 1.0))
+    
+    # 搜索页面响应缓存的页面数
+    RESPONSE_CACHE_SIZE = int(os.environ.get("RESPONSE_CACHE_SIZE", 1000))
+    # 搜索页面缓存的有效秒数：下单扣减库存不让页面缓存失效，页面上的库存最多延迟这么久
+    RESPONSE_CACHE_TTL = int(os.environ.get("RESPONSE_CACHE_TTL", 30))
+    
+    # /api/products 和订单导出每批从数据库读取的行数
+    API_STREAM_BATCH_SIZE = int(os.environ.get("API_STREAM_BATCH_SIZE", 1000))
+    
+    # 产品导入每块的行数，每块一次批量写入并提交
+    IMPORT_CHUNK_SIZE = int(os.environ.get("IMPORT_CHUNK_SIZE", 1000))
+    
+    # 上传导入任务：每个进程的导入线程数（0 表示不在 Web 进程内导入）、轮询间隔、租约（秒）
+    IMPORT_WORKERS = int(os.environ.get("IMPORT_WORKERS", 1))
+    IMPORT_POLL_INTERVAL = float(os.environ.get("IMPORT_POLL_INTERVAL", 5))
+    IMPORT_LEASE = float(os.environ.get("IMPORT_LEASE", 300))
+    
+    # 通知发件箱：每个进程的投递线程数（0 表示不在 Web 进程内投递）、轮询间隔、重试策略（秒）
+    OUTBOX_WORKERS = int(os.environ.get("OUTBOX_WORKERS", 2))
+    OUTBOX_POLL_INTERVAL = float(os.environ.get("OUTBOX_POLL_INTERVAL", 5))
+    OUTBOX_MAX_ATTEMPTS = int(os.environ.get("OUTBOX_MAX_ATTEMPTS", 8))
+    OUTBOX_BACKOFF_BASE = float(os.environ.get("OUTBOX_BACKOFF_BASE", 10))
+    OUTBOX_BACKOFF_MAX = float(os.environ.get("OUTBOX_BACKOFF_MAX", 3600))
+    OUTBOX_LEASE = float(os.environ.get("OUTBOX_LEASE", 300))
+    
+    # SMTP 连接池：每个账号保留的空闲连接数、空闲关闭时间、超过多久取出时先发 NOOP 检查（秒）
+    SMTP_POOL_SIZE = int(os.environ.get("SMTP_POOL_SIZE", 4))
+    SMTP_POOL_IDLE_TIMEOUT = float(os.environ.get("SMTP_POOL_IDLE_TIMEOUT", 60))
+    SMTP_NOOP_INTERVAL = float(os.environ.get("SMTP_NOOP_INTERVAL", 10))
+    
+    # 是否开启 /metrics 监控端点（需要安装 prometheus_client）
+    METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "true").lower() == "true"
+    
     # 分页配置
     PRODUCTS_PER_PAGE = 20
     ORDERS_PER_PAGE = 50
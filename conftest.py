@@ -0,0 +1,52 @@
+"""
+测试公共夹具
+make_app(**配置项) 创建应用并建表，默认使用临时 SQLite 数据库：默认关闭 CSRF、指标和
+后台投递/导入线程，关键字参数覆盖配置项。数据库和上传目录放在 pytest 的 tmp_path 下，
+测试结束后释放连接，目录由 pytest 清理。
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from config import Config
+from app import create_app
+from models import db
+
+# 测试默认配置：表单不校验 CSRF，不记录指标，不启动后台线程（测试中手动调用 run_pending）
+TEST_CONFIG = {
+    'WTF_CSRF_ENABLED': False,
+    'METRICS_ENABLED': False,
+    'OUTBOX_WORKERS': 0,
+    'IMPORT_WORKERS': 0,
+}
+
+
+def create_test_app(database_uri, **overrides):
+    """按测试默认配置创建应用并建表，overrides 覆盖配置项"""
+    attributes = dict(TEST_CONFIG, SQLALCHEMY_DATABASE_URI=database_uri, **overrides)
+    app = create_app(type('TestConfig', (Config,), attributes))
+    with app.app_context():
+        db.create_all()
+    return app
+
+
+@pytest.fixture
+def make_app(tmp_path):
+    apps = []
+
+    def factory(**overrides):
+        database_uri = overrides.pop('SQLALCHEMY_DATABASE_URI', None) or f"sqlite:///{tmp_path / f'test{len(apps)}.db'}"
+        overrides.setdefault('UPLOAD_FOLDER', str(tmp_path / f'uploads{len(apps)}'))
+        app = create_test_app(database_uri, **overrides)
+        apps.append(app)
+        return app
+
+    yield factory
+    for app in apps:
+        with app.app_context():
+            db.session.remove()
+            db.engine.dispose()
@@ -0,0 +1,185 @@
+"""
+统计页计数器
+dashboard_counter 表保存产品总数、上架产品数、各状态订单数和销售额，
+Product、Order 增删改时在 flush 前按差值更新，与业务数据在同一事务内提交，
+统计页只读这十来行，不再对产品表、订单表做 COUNT 和 SUM。
+
+绕过 ORM 的批量写入不会触发更新，可以运行 reconcile_counters.py 从头重算并报告偏差。
+"""
+
+from collections import defaultdict
+from datetime import datetime
+from itertools import chain
+
+from sqlalchemy import case, event, func, insert, inspect, select, update
+from sqlalchemy.orm import Session
+
+from models import db, Product, Order, DashboardCounter
+
+ORDER_STATUSES = ('pending', 'confirmed', 'shipped', 'delivered', 'cancelled')
+
+PRODUCTS_TOTAL = 'products.total'
+PRODUCTS_ACTIVE = 'products.active'
+ORDERS_TOTAL = 'orders.total'
+SALES_TOTAL = 'sales.total'
+
+
+def order_status_counter(status):
+    return f'orders.{status}'
+
+
+def old_value(obj, attr):
+    """flush 前数据库中的值，新对象返回当前值"""
+    history = inspect(obj).attrs[attr].history
+    if history.deleted:
+        return history.deleted[0]
+    if history.unchanged:
+        return history.unchanged[0]
+    return getattr(obj, attr)
+
+
+def _order_contribution(status, total_amount):
+    """一个订单对各计数器的贡献"""
+    status = status or 'pending'
+    contribution = {ORDERS_TOTAL: 1, order_status_counter(status): 1}
+    if status != 'cancelled':
+        contribution[SALES_TOTAL] = total_amount or 0
+    return contribution
+
+
+def _product_contribution(is_active):
+    contribution = {PRODUCTS_TOTAL: 1}
+    # 新对象未显式设置时按列默认值（上架）处理
+    if is_active or is_active is None:
+        contribution[PRODUCTS_ACTIVE] = 1
+    return contribution
+
+
+def _collect_deltas(session):
+    deltas = defaultdict(float)
+
+    def add(contribution, sign):
+        for name, value in contribution.items():
+            deltas[name] += sign * value
+
+    for obj in session.new:
+        if isinstance(obj, Order):
+            add(_order_contribution(obj.status, obj.total_amount), 1)
+        elif isinstance(obj, Product):
+            add(_product_contribution(obj.is_active), 1)
+
+    for obj in session.deleted:
+        if isinstance(obj, Order):
+            add(_order_contribution(old_value(obj, 'status'), old_value(obj, 'total_amount')), -1)
+        elif isinstance(obj, Product):
+            add(_product_contribution(old_value(obj, 'is_active')), -1)
+
+    for obj in session.dirty:
+        if isinstance(obj, Order):
+            add(_order_contribution(old_value(obj, 'status'), old_value(obj, 'total_amount')), -1)
+            add(_order_contribution(obj.status, obj.total_amount), 1)
+        elif isinstance(obj, Product):
+            add(_product_contribution(old_value(obj, 'is_active')), -1)
+            add(_product_contribution(obj.is_active), 1)
+
+    return {name: delta for name, delta in deltas.items() if delta}
+
+
+def apply_deltas(connection, deltas):
+    """在当前事务内按差值更新计数器，一条 UPDATE 更新全部计数器，缺少的计数器行直接插入"""
+    now = datetime.utcnow()
+    names = sorted(deltas)
+    result = connection.execute(
+        update(DashboardCounter)
+        .where(DashboardCounter.name.in_(names))
+        .values(value=DashboardCounter.value + case(deltas, value=DashboardCounter.name), updated_at=now)
+    )
+    if result.rowcount == len(names):
+        return
+    existing = set(connection.execute(
+        select(DashboardCounter.name).where(DashboardCounter.name.in_(names))
+    ).scalars())
+    for name in names:
+        if name not in existing:
+            connection.execute(insert(DashboardCounter).values(name=name, value=deltas[name], updated_at=now))
+
+
+# 修改前的值需要参与计算，属性过期后被直接赋值时也先加载旧值
+for _attr in (Order.status, Order.total_amount, Product.is_active):
+    event.listen(_attr, 'set', lambda target, value, oldvalue, initiator: None, active_history=True)
+
+
+@event.listens_for(Session, 'before_flush')
+def _update_counters(session, flush_context, instances):
+    # 在 flush 前计算：待删除的对象此时仍能加载属性，计数器与业务数据在同一事务内写入
+    if not any(isinstance(obj, (Product, Order)) for obj in chain(session.new, session.dirty, session.deleted)):
+        return
+    deltas = _collect_deltas(session)
+    if deltas:
+        apply_deltas(session.connection(), deltas)
+
+
+def read_counters():
+    """读取全部计数器，返回 {名称: 值}"""
+    return dict(db.session.execute(select(DashboardCounter.name, DashboardCounter.value)).all())
+
+
+def compute_counters():
+    """从产品表和订单表从头计算计数器的真实值"""
+    actual = {PRODUCTS_TOTAL: 0, PRODUCTS_ACTIVE: 0, ORDERS_TOTAL: 0, SALES_TOTAL: 0}
+    for status in ORDER_STATUSES:
+        actual[order_status_counter(status)] = 0
+
+    total, active = db.session.execute(
+        select(func.count(Product.id), func.count(Product.id).filter(Product.is_active.is_(True)))
+    ).one()
+    actual[PRODUCTS_TOTAL] = total
+    actual[PRODUCTS_ACTIVE] = active
+
+    rows = db.session.execute(
+        select(Order.status, func.count(Order.id), func.coalesce(func.sum(Order.total_amount), 0))
+        .group_by(Order.status)
+    ).all()
+    for status, count, amount in rows:
+        status = status or 'pending'
+        actual[ORDERS_TOTAL] += count
+        actual[order_status_counter(status)] = actual.get(order_status_counter(status), 0) + count
+        if status != 'cancelled':
+            actual[SALES_TOTAL] += amount
+    return actual
+
+
+def reconcile(apply=True):
+    """重算计数器并与表中的值比较，返回偏差列表 [(名称, 表中值, 真实值)]
+
+    apply 为 True 时把真实值写回。先锁住计数器行再计算，
+    期间提交的订单会等重算完成后再累加，不会丢失。
+    """
+    stored = dict(db.session.execute(
+        select(DashboardCounter.name, DashboardCounter.value).with_for_update()
+    ).all())
+    actual = compute_counters()
+
+    drift = []
+    for name in sorted(set(stored) | set(actual)):
+        stored_value = stored.get(name)
+        actual_value = actual.get(name, 0)
+        # 缺少的计数器行读作 0
+        if abs((stored_value or 0) - actual_value) > 1e-6:
+            drift.append((name, stored_value, actual_value))
+
+    if apply and drift:
+        now = datetime.utcnow()
+        for name, stored_value, actual_value in drift:
+            if stored_value is None:
+                db.session.execute(insert(DashboardCounter).values(name=name, value=actual_value, updated_at=now))
+            else:
+                db.session.execute(
+                    update(DashboardCounter).where(DashboardCounter.name == name)
+                    .values(value=actual_value, updated_at=now)
+                )
+    if apply:
+        db.session.commit()
+    else:
+        db.session.rollback()
+    return drift
@@ -0,0 +1,217 @@
+"""
+产品导入任务
+上传的文件先暂存到 UPLOAD_FOLDER/temp 并写入 import_job 表，请求立即返回。
+后台导入线程认领待处理的任务，用 ProductImporter 分块导入，每块提交后把进度和错误明细
+写回任务表，上传页面轮询 /api/import-jobs/<id> 显示进度。
+
+认领用带条件的 UPDATE，租约随每块进度续期；进程崩溃后租约到期的任务会被重新认领，
+从已提交的行数继续导入。每次认领生成新的令牌，写回进度时要求令牌一致：
+某一块超过租约被其他线程重新认领后，原线程写回进度失败并停止导入。失败的任务保留暂存文件，在后台管理的“导入任务”中
+把状态改回 pending 即可从失败处重试。
+"""
+
+import json
+import os
+import threading
+import uuid
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import func, or_, select, update
+
+from model_events import on_committed_change
+from models import db, ImportJob
+from product_import import DEFAULT_CHUNK_SIZE, MAX_ERRORS, ProductImporter, iter_csv_rows, iter_excel_rows
+
+
+def create_import_job(file, skip_existing=False):
+    """把上传的文件暂存到 UPLOAD_FOLDER/temp 并创建导入任务，返回已提交的任务"""
+    extension = file.filename.rsplit('.', 1)[1].lower()
+    path = os.path.join(current_app.config['UPLOAD_FOLDER'], 'temp', f'import_{uuid.uuid4().hex}.{extension}')
+    file.save(path)
+    job = ImportJob(filename=file.filename[:256], path=path, skip_existing=skip_existing)
+    db.session.add(job)
+    try:
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        os.remove(path)
+        raise
+    return job
+
+
+def read_rows(path, start=0):
+    """按扩展名逐行读取暂存文件，跳过前 start 个数据行"""
+    if path.lower().endswith('.csv'):
+        with open(path, 'rb') as f:
+            yield from iter_csv_rows(f, start=start)
+    else:
+        yield from iter_excel_rows(path, start=start)
+
+
+class ClaimLost(Exception):
+    """任务已被其他线程重新认领（或在后台被改回 pending）"""
+
+
+class ImportJobRunner:
+    """导入任务线程池"""
+
+    def __init__(self):
+        self.threads = 1
+        self.poll_interval = 5.0
+        self.lease = 300.0
+        self.chunk_size = DEFAULT_CHUNK_SIZE
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._workers = []
+        self._start_lock = threading.Lock()
+
+    def init_app(self, app):
+        self.threads = app.config.get('IMPORT_WORKERS', self.threads)
+        self.poll_interval = app.config.get('IMPORT_POLL_INTERVAL', self.poll_interval)
+        self.lease = app.config.get('IMPORT_LEASE', self.lease)
+        self.chunk_size = app.config.get('IMPORT_CHUNK_SIZE', self.chunk_size)
+        app.extensions['import_job_runner'] = self
+
+    def start(self, app, threads=None):
+        """启动导入线程，重复调用不会多开"""
+        threads = self.threads if threads is None else threads
+        with self._start_lock:
+            self._workers = [t for t in self._workers if t.is_alive()]
+            self._stop.clear()
+            while len(self._workers) < threads:
+                t = threading.Thread(target=self._run, args=(app,),
+                                     name=f'import-worker-{len(self._workers) + 1}', daemon=True)
+                t.start()
+                self._workers.append(t)
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        self._wake.set()
+        for t in self._workers:
+            t.join(timeout)
+        self._workers = []
+
+    def wake(self, *args):
+        """有新任务时唤醒等待中的导入线程"""
+        self._wake.set()
+
+    def _run(self, app):
+        while not self._stop.is_set():
+            self._wake.clear()
+            with app.app_context():
+                try:
+                    processed = self.run_pending()
+                except Exception as e:
+                    db.session.rollback()
+                    print(f"导入任务出错: {e}")
+                    processed = 0
+            if not processed:
+                self._wake.wait(self.poll_interval)
+
+    def run_pending(self):
+        """认领并执行一个待处理或租约过期的任务，返回执行的任务数，需要在应用上下文中调用"""
+        now = datetime.utcnow()
+        job_ids = db.session.execute(
+            select(ImportJob.id)
+            .where(or_(ImportJob.status == 'pending',
+                       (ImportJob.status == 'running') & (ImportJob.lease_expires_at <= now)))
+            .order_by(ImportJob.id)
+            .limit(5)
+        ).scalars().all()
+        db.session.commit()
+        for job_id in job_ids:
+            token = self._claim(job_id, now)
+            if token is not None:
+                self.run_job(job_id, token)
+                return 1
+        return 0
+
+    def _claim(self, job_id, now):
+        """认领任务，返回认领令牌，被其他线程抢先时返回 None"""
+        token = uuid.uuid4().hex
+        result = db.session.execute(
+            update(ImportJob)
+            .where(ImportJob.id == job_id,
+                   or_(ImportJob.status == 'pending',
+                       (ImportJob.status == 'running') & (ImportJob.lease_expires_at <= now)))
+            .values(status='running',
+                    lease_expires_at=now + timedelta(seconds=self.lease),
+                    claim_token=token,
+                    started_at=func.coalesce(ImportJob.started_at, now),
+                    finished_at=None,
+                    message=None)
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount != 1:
+            db.session.rollback()
+            return None
+        db.session.commit()
+        return token
+
+    def run_job(self, job_id, token):
+        """执行已认领的任务，从任务记录的已提交行数继续"""
+        job = db.session.get(ImportJob, job_id)
+        base = {field: getattr(job, field) for field in ('rows_read', 'inserted', 'updated', 'skipped', 'failed')}
+        errors = [tuple(error) for error in json.loads(job.errors or '[]')]
+        path, skip_existing = job.path, job.skip_existing
+        db.session.commit()
+
+        importer = ProductImporter(
+            chunk_size=self.chunk_size,
+            skip_existing=skip_existing,
+            progress=lambda stats: self._save(job_id, token, base, errors, stats),
+        )
+        try:
+            stats = importer.run(read_rows(path, start=base['rows_read']))
+            self._save(job_id, token, base, errors, stats, status='done', finished_at=datetime.utcnow())
+        except ClaimLost:
+            db.session.rollback()
+            # 任务和暂存文件归新的认领者处理
+            print(f"导入任务 {job_id} 已被重新认领，停止导入")
+            return
+        except Exception as e:
+            db.session.rollback()
+            # 保留暂存文件，改回 pending 后从已提交的行继续
+            if self._update(job_id, token, status='failed', message=str(e), finished_at=datetime.utcnow()):
+                print(f"导入任务 {job_id} 失败: {e}")
+            return
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        print(f"导入任务 {job_id} 完成: {stats.summary()}")
+
+    def _save(self, job_id, token, base, errors, stats, **values):
+        """写回进度并续租，每块提交后调用；任务已被重新认领时抛出 ClaimLost"""
+        saved = self._update(
+            job_id,
+            token,
+            rows_read=base['rows_read'] + stats.read,
+            inserted=base['inserted'] + stats.inserted,
+            updated=base['updated'] + stats.updated,
+            skipped=base['skipped'] + stats.skipped,
+            failed=base['failed'] + stats.failed,
+            errors=json.dumps((errors + stats.errors)[:MAX_ERRORS], ensure_ascii=False),
+            lease_expires_at=datetime.utcnow() + timedelta(seconds=self.lease),
+            **values,
+        )
+        if not saved:
+            raise ClaimLost(job_id)
+
+    @staticmethod
+    def _update(job_id, token, **values):
+        """更新本线程认领的运行中任务，返回是否更新成功"""
+        # 后台把任务改回 pending、租约过期后被其他线程重新认领时令牌不再一致，不会被覆盖
+        result = db.session.execute(
+            update(ImportJob)
+            .where(ImportJob.id == job_id, ImportJob.status == 'running', ImportJob.claim_token == token)
+            .values(**values)
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+        return result.rowcount == 1
+
+
+import_job_runner = ImportJobRunner()
+on_committed_change(ImportJob, import_job_runner.wake)
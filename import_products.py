@@ -6,6 +6,7 @@
 支持从CSV、Excel文件导入产品数据
 """
 
+import argparse
 import os
 import sys
 import csv
@@ -14,173 +15,136 @@ from datetime import datetime
 from werkzeug.utils import secure_filename
 from PIL import Image
 import requests
-import io
 
 # 添加项目根目录到Python路径
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 from app import create_app
-from models import db, Product, Category
+from models import db, Product
+from product_import import (ImportCheckpoint, ProductImporter, check_header, iter_csv_rows,
+                            iter_excel_rows, map_header)
 from utils import allowed_file, resize_image, fetch_product_image
 
-def import_from_csv(file_path):
-    """从CSV文件导入产品"""
-    app = create_app()
-    with app.app_context():
+def _print_progress(stats):
+    print(f"  已处理 {stats.read} 行: 新增 {stats.inserted}，更新 {stats.updated}，"
+          f"未变化 {stats.unchanged}，失败 {stats.failed}，{stats.rows_per_second:.0f} 行/秒")
+
+
+def _print_result(stats):
+    print(f"\n导入完成!")
+    print(stats.summary())
+    if stats.errors:
+        print("\n错误详情:")
+        for line, message in stats.errors[:10]:  # 只显示前10个错误
+            print(f"  - 第 {line} 行: {message}")
+        if stats.failed > 10:
+            print(f"  ... 还有 {stats.failed - 10} 个错误")
+
+
+def fetch_missing_images():
+    """为没有图片的上架产品尝试获取图片（逐个请求网络，较慢）"""
+    products = Product.query.filter(Product.image_filename.is_(None), Product.is_active == True).all()
+    for product in products:
         try:
-            # 使用pandas读取CSV，支持更好的编码处理
-            df = pd.read_csv(file_path, encoding='utf-8')
-            
-            # 检查必要的列
-            required_columns = ['sku', 'name']
-            missing_columns = [col for col in required_columns if col not in df.columns]
-            if missing_columns:
-                print(f"错误: 缺少必要的列: {missing_columns}")
-                return False
-            
-            success_count = 0
-            error_count = 0
-            error_messages = []
-            
-            for index, row in df.iterrows():
-                try:
-                    # 检查SKU是否已存在
-                    existing_product = Product.query.filter_by(sku=str(row['sku'])).first()
-                    if existing_product:
-                        print(f"跳过已存在的SKU: {row['sku']}")
-                        continue
+            image_url = fetch_product_image(product.name)
+            if image_url:
+                # 下载并保存图片
+                response = requests.get(image_url, timeout=10)
+                if response.status_code == 200:
+                    image_data = response.content
+                    # 生成文件名
+                    filename = secure_filename(f"{product.sku}.jpg")
+                    image_path = os.path.join('static/uploads', filename)
                     
-                    # 创建产品对象
-                    product = Product(
-                        sku=str(row['sku']),
-                        name=str(row['name']),
-                        barcode=str(row.get('barcode', '')) if pd.notna(row.get('barcode')) else '',
-                        spec=str(row.get('spec', '')) if pd.notna(row.get('spec')) else '',
-                        model=str(row.get('model', '')) if pd.notna(row.get('model')) else '',
-                        retail_price=float(row.get('retail_price', 0)) if pd.notna(row.get('retail_price')) else None,
-                        wholesale_price=float(row.get('wholesale_price', 0)) if pd.notna(row.get('wholesale_price')) else None,
-                        stock_quantity=int(row.get('stock_quantity', 0)) if pd.notna(row.get('stock_quantity')) else 0,
-                        description=str(row.get('description', '')) if pd.notna(row.get('description')) else ''
-                    )
+                    # 保存图片
+                    with open(image_path, 'wb') as f:
+                        f.write(image_data)
                     
-                    # 如果有分类，尝试查找或创建分类
-                    category_name = row.get('category', '')
-                    if pd.notna(category_name) and category_name:
-                        category = Category.query.filter_by(name=str(category_name)).first()
-                        if not category:
-                            category = Category(name=str(category_name))
-                            db.session.add(category)
-                            db.session.flush()
-                        product.category_id = category.id
+                    # 调整图片大小
+                    resize_image(image_path)
                     
-                    db.session.add(product)
+                    # 更新产品记录
+                    product.image_filename = filename
                     db.session.commit()
-                    
-                    # 尝试获取产品图片
-                    try:
-                        image_url = fetch_product_image(product.name)
-                        if image_url:
-                            # 下载并保存图片
-                            response = requests.get(image_url, timeout=10)
-                            if response.status_code == 200:
-                                image_data = response.content
-                                # 生成文件名
-                                filename = secure_filename(f"{product.sku}.jpg")
-                                image_path = os.path.join('static/uploads', filename)
-                                
-                                # 保存图片
-                                with open(image_path, 'wb') as f:
-                                    f.write(image_data)
-                                
-                                # 调整图片大小
-                                resize_image(image_path)
-                                
-                                # 更新产品记录
-                                product.image_filename = filename
-                                db.session.commit()
-                    except Exception as e:
-                        print(f"获取产品图片失败 {product.name}: {e}")
-                    
-                    success_count += 1
-                    print(f"成功导入: {product.name} (SKU: {product.sku})")
-                    
-                except Exception as e:
-                    error_count += 1
-                    error_msg = f"第 {index + 2} 行导入失败: {e}"
-                    error_messages.append(error_msg)
-                    print(error_msg)
-                    db.session.rollback()
-            
-            print(f"\n导入完成!")
-            print(f"成功: {success_count} 个")
-            print(f"失败: {error_count} 个")
-            
-            if error_messages:
-                print("\n错误详情:")
-                for msg in error_messages[:10]:  # 只显示前10个错误
-                    print(f"  - {msg}")
-                if len(error_messages) > 10:
-                    print(f"  ... 还有 {len(error_messages) - 10} 个错误")
-            
-            return True
-            
         except Exception as e:
-            print(f"导入CSV文件失败: {e}")
-            return False
+            db.session.rollback()
+            print(f"获取产品图片失败 {product.name}: {e}")
 
-def import_from_excel(file_path):
-    """从Excel文件导入产品"""
+
+def _import(file_path, read_rows, label, chunk_size=None, skip_existing=False, fetch_images=False,
+            resume=False, checkpoint_path=None, workers=1, delta=False, deactivate_missing=False):
+    """按块导入 read_rows(跳过行数) 产出的行
+
+    skip_existing 为 True 时已存在的货号跳过，否则更新。每块提交后把已提交的行数
+    写入断点文件，resume 为 True 时从断点继续。workers 大于 1 时用多个进程校验数据行。
+    delta 为 True 时跳过与上次导入相比没有变化的行；deactivate_missing 为 True 时
+    下架文件中没有的产品，需要读取完整文件，不能与断点继续同时使用。
+    """
     app = create_app()
     with app.app_context():
         try:
-            # 读取Excel文件
-            df = pd.read_excel(file_path, sheet_name=0)
-            
-            # 重命名列以匹配标准格式
-            column_mapping = {
-                '货号': 'sku',
-                '产品名称': 'name',
-                '品名': 'name',
-                '名称': 'name',
-                '条码': 'barcode',
-                '规格': 'spec',
-                '型号': 'model',
-                '零售价': 'retail_price',
-                '零售价格': 'retail_price',
-                '批发价': 'wholesale_price',
-                '批发价格': 'wholesale_price',
-                '库存': 'stock_quantity',
-                '库存数量': 'stock_quantity',
-                '描述': 'description',
-                '分类': 'category'
-            }
-            
-            # 重命名列
-            df = df.rename(columns=column_mapping)
-            
-            # 转换为CSV格式进行处理
-            csv_buffer = io.StringIO()
-            df.to_csv(csv_buffer, index=False, encoding='utf-8')
-            csv_buffer.seek(0)
+            checkpoint = ImportCheckpoint(checkpoint_path or f'{file_path}.checkpoint', file_path)
+            start = checkpoint.load() if resume else 0
+            if start and deactivate_missing:
+                print("错误: 下架缺失产品需要完整导入，请删除断点文件或去掉 --resume")
+                return False
+            if start:
+                print(f"从断点继续: 跳过已导入的 {start} 行")
             
-            # 保存为临时CSV文件
-            temp_csv_path = 'temp_import.csv'
-            with open(temp_csv_path, 'w', encoding='utf-8') as f:
-                f.write(csv_buffer.getvalue())
+            def progress(stats):
+                checkpoint.save(start + stats.read)
+                _print_progress(stats)
             
-            # 调用CSV导入函数
-            result = import_from_csv(temp_csv_path)
+            importer = ProductImporter(
+                chunk_size=chunk_size or app.config['IMPORT_CHUNK_SIZE'],
+                skip_existing=skip_existing,
+                progress=progress,
+                workers=workers,
+                delta=delta,
+                deactivate_missing=deactivate_missing,
+            )
+            stats = importer.run(read_rows(start))
+            checkpoint.clear()
+            _print_result(stats)
             
-            # 清理临时文件
-            if os.path.exists(temp_csv_path):
-                os.remove(temp_csv_path)
+            if fetch_images:
+                fetch_missing_images()
             
-            return result
+            return True
             
         except Exception as e:
-            print(f"导入Excel文件失败: {e}")
+            print(f"导入{label}文件失败: {e}")
             return False
 
+
+def import_from_csv(file_path, encoding='utf-8-sig', **options):
+    """从CSV文件导入产品，逐行流式读取"""
+    def read_rows(start):
+        with open(file_path, 'rb') as f:
+            yield from iter_csv_rows(f, start=start, encoding=encoding)
+    
+    return _import(file_path, read_rows, 'CSV', **options)
+
+
+def import_from_excel(file_path, **options):
+    """从Excel文件导入产品
+
+    .xlsx 用 openpyxl 只读模式逐行读取；旧版 .xls 仍由 pandas 整表读取。
+    """
+    if file_path.lower().endswith('.xls'):
+        def read_rows(start):
+            df = pd.read_excel(file_path, sheet_name=0, dtype=object)
+            df.columns = map_header(df.columns)
+            check_header(df.columns)
+            for index, row in enumerate(df.to_dict('records')):
+                if index >= start:
+                    yield index + 2, row
+    else:
+        def read_rows(start):
+            return iter_excel_rows(file_path, start=start)
+    
+    return _import(file_path, read_rows, 'Excel', **options)
+
 def create_sample_csv():
     """创建示例CSV文件"""
     sample_data = [
@@ -235,35 +199,36 @@ def create_sample_csv():
 
 def main():
     """主函数"""
-    if len(sys.argv) < 2:
-        print("用法:")
-        print("  python import_products.py <文件路径>    # 导入文件")
-        print("  python import_products.py --sample     # 创建示例文件")
-        print("  python import_products.py --help       # 显示帮助")
-        return
+    parser = argparse.ArgumentParser(
+        description='产品数据导入工具，支持 CSV (.csv)、Excel (.xlsx, .xls)',
+        epilog='必需字段: sku 货号、name 产品名称；可选字段: barcode 条码、spec 规格、model 型号、'
+               'retail_price 零售价格、wholesale_price 批发价格、stock_quantity 库存数量、'
+               'description 产品描述、category 产品分类',
+    )
+    parser.add_argument('file', nargs='?', help='要导入的文件')
+    parser.add_argument('--sample', action='store_true', help='创建示例文件')
+    parser.add_argument('--chunk-size', type=int, default=None,
+                        help='每块行数，默认取 IMPORT_CHUNK_SIZE 配置')
+    parser.add_argument('--skip-existing', action='store_true', help='跳过已存在的货号（默认更新）')
+    parser.add_argument('--fetch-images', action='store_true', help='导入后为没有图片的产品获取图片')
+    parser.add_argument('--encoding', default='utf-8-sig', help='CSV 文件编码，默认 UTF-8（可带 BOM）')
+    parser.add_argument('--resume', action='store_true', help='从上次中断的断点继续导入')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='校验数据行的进程数，默认 1（在当前进程内校验），写入始终在当前进程')
+    parser.add_argument('--delta', action='store_true', help='增量导入：跳过与上次导入相比没有变化的行')
+    parser.add_argument('--deactivate-missing', action='store_true',
+                        help='导入后下架文件中没有的产品，它们再次出现在文件中时重新上架')
+    args = parser.parse_args()
     
-    if sys.argv[1] == '--help':
-        print("产品数据导入工具")
-        print("支持的文件格式: CSV (.csv), Excel (.xlsx, .xls)")
-        print("\n必需字段:")
-        print("  - sku: 产品货号 (必填)")
-        print("  - name: 产品名称 (必填)")
-        print("\n可选字段:")
-        print("  - barcode: 条码")
-        print("  - spec: 规格")
-        print("  - model: 型号")
-        print("  - retail_price: 零售价格")
-        print("  - wholesale_price: 批发价格")
-        print("  - stock_quantity: 库存数量")
-        print("  - description: 产品描述")
-        print("  - category: 产品分类")
+    if args.sample:
+        create_sample_csv()
         return
     
-    if sys.argv[1] == '--sample':
-        create_sample_csv()
+    if not args.file:
+        parser.print_help()
         return
     
-    file_path = sys.argv[1]
+    file_path = args.file
     
     if not os.path.exists(file_path):
         print(f"错误: 文件不存在: {file_path}")
@@ -276,12 +241,15 @@ def main():
         return
     
     print(f"开始导入文件: {file_path}")
+    options = dict(chunk_size=args.chunk_size, skip_existing=args.skip_existing,
+                   fetch_images=args.fetch_images, resume=args.resume, workers=args.workers,
+                   delta=args.delta, deactivate_missing=args.deactivate_missing)
     
     # 根据文件类型选择导入方法
     if file_path.lower().endswith('.csv'):
-        success = import_from_csv(file_path)
+        success = import_from_csv(file_path, encoding=args.encoding, **options)
     elif file_path.lower().endswith(('.xlsx', '.xls')):
-        success = import_from_excel(file_path)
+        success = import_from_excel(file_path, **options)
     else:
         print("错误: 不支持的文件格式")
         return
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+导入任务进程
+单独运行上传导入任务的线程，Web 进程设置 IMPORT_WORKERS=0 时使用。
+
+用法:
+  python import_worker.py             # 持续处理导入任务
+  python import_worker.py --once      # 处理完当前待处理的任务后退出（适合 cron）
+  python import_worker.py --threads 2 # 指定导入线程数
+"""
+
+import argparse
+import os
+import sys
+import time
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app import create_app
+from import_jobs import import_job_runner
+
+
+def main():
+    parser = argparse.ArgumentParser(description='产品导入任务进程')
+    parser.add_argument('--once', action='store_true', help='处理完当前待处理的任务后退出')
+    parser.add_argument('--threads', type=int, default=None, help='导入线程数，默认取 IMPORT_WORKERS')
+    args = parser.parse_args()
+
+    app = create_app()
+
+    if args.once:
+        total = 0
+        with app.app_context():
+            while import_job_runner.run_pending():
+                total += 1
+        print(f"本次处理 {total} 个导入任务")
+        return
+
+    threads = args.threads or app.config['IMPORT_WORKERS'] or 1
+    import_job_runner.start(app, threads)
+    print(f"导入任务进程已启动，线程数: {threads}")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        import_job_runner.stop(timeout=10)
+        print("导入任务进程已停止")
+
+
+if __name__ == '__main__':
+    main()
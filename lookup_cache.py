@@ -0,0 +1,131 @@
+"""
+条码/货号精确查询缓存
+扫码枪按条码或货号查询单个产品，缓存序列化后的 Product.to_dict()，
+未知编码也做短时缓存（负缓存），产品变更提交后按编码失效。
+其他进程修改产品或分类时 catalog 版本号加一，查询前发现版本号变化就清空缓存；
+其他进程下单扣减的库存不改变版本号，最多延迟 LOOKUP_CACHE_TTL 秒显示。
+"""
+
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from sqlalchemy import inspect
+from sqlalchemy.orm import joinedload
+
+from cache_versions import cache_versions
+from model_events import on_committed_change, record_change
+from models import Product, Category
+
+LOOKUP_FIELDS = ('barcode', 'sku')
+
+# 负缓存标记
+MISSING = object()
+
+
+class LookupCache:
+    """有界 LRU 缓存，键为 (字段, 编码)，值为 (是否上架, JSON文本) 或 MISSING"""
+
+    def __init__(self, maxsize=10000, ttl=300, negative_ttl=30):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        # 缓存内容对应的 catalog 版本号
+        self._version = None
+        self.hits = 0
+        self.misses = 0
+
+    def init_app(self, app):
+        self.maxsize = app.config.get('LOOKUP_CACHE_SIZE', self.maxsize)
+        self.ttl = app.config.get('LOOKUP_CACHE_TTL', self.ttl)
+        self.negative_ttl = app.config.get('LOOKUP_NEGATIVE_TTL', self.negative_ttl)
+        self.clear()
+        app.extensions['lookup_cache'] = self
+
+    def get(self, key):
+        """返回缓存值，未命中或已过期返回 None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        ttl = self.negative_ttl if value is MISSING else self.ttl
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, keys):
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def check_version(self, version):
+        """catalog 版本号变化时丢弃全部缓存，命中统计保留"""
+        with self._lock:
+            if version != self._version:
+                self._entries.clear()
+                self._version = version
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._version = None
+            self.hits = 0
+            self.misses = 0
+
+    def on_product_change(self, op, keys):
+        self.invalidate(keys)
+
+    def invalidate_after_commit(self, session, product):
+        """批量 UPDATE 修改产品时手动调用，事务提交后失效该产品的缓存"""
+        record_change(session, self.on_product_change, 'update', _product_keys(product))
+
+    def on_category_change(self, op, category_id):
+        # 分类改名会影响缓存里的 category_name，分类变更很少，直接清空
+        self.clear()
+
+
+def lookup_product(field, code):
+    """按条码或货号精确查询产品，返回 (是否上架, JSON文本)，不存在返回 None"""
+    key = (field, code)
+    lookup_cache.check_version(cache_versions.current('catalog'))
+    value = lookup_cache.get(key)
+    if value is None:
+        product = (Product.query.options(joinedload(Product.category))
+                   .filter(getattr(Product, field) == code).first())
+        if product is None:
+            value = MISSING
+        else:
+            value = (bool(product.is_active), json.dumps(product.to_dict(), ensure_ascii=False))
+        lookup_cache.put(key, value)
+    return None if value is MISSING else value
+
+
+def _product_keys(product):
+    """产品当前及修改前的条码、货号，新旧编码对应的缓存都要失效"""
+    state = inspect(product)
+    keys = set()
+    for field in LOOKUP_FIELDS:
+        history = state.attrs[field].history
+        for code in [getattr(product, field)] + list(history.deleted or ()):
+            if code:
+                keys.add((field, code))
+    return keys
+
+
+lookup_cache = LookupCache()
+on_committed_change(Product, lookup_cache.on_product_change, snapshot=_product_keys)
+on_committed_change(Category, lookup_cache.on_category_change)
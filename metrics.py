@@ -0,0 +1,164 @@
+"""
+Prometheus 监控指标
+记录每个端点的请求耗时、进行中的请求数、每个请求执行的 SQL 语句数、
+数据库连接池取连接的等待时间以及通知发送耗时，通过 /metrics 以 Prometheus 文本格式输出。
+
+多进程部署（gunicorn 多 worker）时需要设置 PROMETHEUS_MULTIPROC_DIR 环境变量，
+指向一个启动前清空的目录，各 worker 把指标写到该目录，/metrics 汇总所有 worker 的数据。
+"""
+
+import os
+import time
+from functools import wraps
+
+from flask import Response, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+try:
+    from prometheus_client import (
+        CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Gauge, Histogram, generate_latest, multiprocess,
+    )
+    PROMETHEUS_AVAILABLE = True
+except ImportError:
+    PROMETHEUS_AVAILABLE = False
+
+if PROMETHEUS_AVAILABLE:
+    REQUEST_LATENCY = Histogram(
+        'http_request_duration_seconds', '请求处理耗时（秒）',
+        ['endpoint', 'method', 'status'],
+    )
+    REQUESTS_IN_PROGRESS = Gauge(
+        'http_requests_in_progress', '正在处理的请求数',
+        ['endpoint', 'method'], multiprocess_mode='livesum',
+    )
+    REQUEST_SQL_STATEMENTS = Histogram(
+        'http_request_sql_statements', '每个请求执行的 SQL 语句数',
+        ['endpoint'], buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100, 200, float('inf')),
+    )
+    DB_POOL_CHECKOUT_WAIT = Histogram(
+        'db_pool_checkout_wait_seconds', '从连接池取得数据库连接的等待时间（秒）',
+        buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, float('inf')),
+    )
+    NOTIFICATION_DURATION = Histogram(
+        'notification_send_duration_seconds', '订单通知发送耗时（秒）',
+        ['channel', 'status'],
+        buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, float('inf')),
+    )
+
+# 未匹配到路由的请求统一归到一个标签，避免扫描器制造大量时间序列
+UNMATCHED_ENDPOINT = '<unmatched>'
+
+
+def _endpoint():
+    return request.endpoint or UNMATCHED_ENDPOINT
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _count_statement(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context():
+        g._sql_statements = g.get('_sql_statements', 0) + 1
+
+
+def request_sql_statements():
+    """返回当前请求到目前为止执行的 SQL 语句数"""
+    return g.get('_sql_statements', 0)
+
+
+def time_notification(channel):
+    """记录通知发送耗时的装饰器
+
+    被装饰函数返回 True 记为 success，返回 False 记为 failure，返回 None（未配置）记为 skipped。
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            result = func(*args, **kwargs)
+            if PROMETHEUS_AVAILABLE:
+                status = {True: 'success', False: 'failure'}.get(result, 'skipped')
+                NOTIFICATION_DURATION.labels(channel, status).observe(time.perf_counter() - start)
+            return result
+        return wrapper
+    return decorator
+
+
+class RequestMetrics:
+    """请求计时中间件和 /metrics 端点"""
+
+    def init_app(self, app, db):
+        app.extensions['metrics'] = self
+        if not app.config.get('METRICS_ENABLED', True):
+            return
+        if not PROMETHEUS_AVAILABLE:
+            print("未安装 prometheus_client，监控指标已禁用，请运行: pip install prometheus_client")
+            return
+
+        # 放在最前面，CSRF 校验等其他 before_request 拒绝的请求也计入
+        app.before_request_funcs.setdefault(None, []).insert(0, self._before_request)
+        app.after_request(self._after_request)
+        app.teardown_request(self._teardown_request)
+        app.add_url_rule('/metrics', 'metrics', self.metrics_view)
+
+        with app.app_context():
+            self._instrument_pool(db.engine)
+
+    @staticmethod
+    def _instrument_pool(engine):
+        # 连接池只有取到连接之后的 checkout 事件，等待时间需要包住 raw_connection 来测量
+        if getattr(engine, '_checkout_timed', False):
+            return
+        raw_connection = engine.raw_connection
+
+        @wraps(raw_connection)
+        def timed_raw_connection(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return raw_connection(*args, **kwargs)
+            finally:
+                DB_POOL_CHECKOUT_WAIT.observe(time.perf_counter() - start)
+
+        engine.raw_connection = timed_raw_connection
+        engine._checkout_timed = True
+
+    @staticmethod
+    def _before_request():
+        g._metrics_start = time.perf_counter()
+        g._metrics_labels = (_endpoint(), request.method)
+        g._sql_statements = 0
+        REQUESTS_IN_PROGRESS.labels(*g._metrics_labels).inc()
+
+    @staticmethod
+    def _after_request(response):
+        g._metrics_status = response.status_code
+        return response
+
+    @staticmethod
+    def _teardown_request(exc):
+        labels = g.pop('_metrics_labels', None)
+        if labels is None:
+            return
+        endpoint, method = labels
+        # 视图抛出未处理的异常时不会经过 after_request
+        status = g.pop('_metrics_status', 500)
+        REQUESTS_IN_PROGRESS.labels(endpoint, method).dec()
+        REQUEST_LATENCY.labels(endpoint, method, str(status)).observe(time.perf_counter() - g._metrics_start)
+        REQUEST_SQL_STATEMENTS.labels(endpoint).observe(request_sql_statements())
+
+    @staticmethod
+    def metrics_view():
+        if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+            registry = CollectorRegistry()
+            multiprocess.MultiProcessCollector(registry)
+        else:
+            registry = REGISTRY
+        return Response(generate_latest(registry), content_type=CONTENT_TYPE_LATEST)
+
+
+def mark_process_dead(pid):
+    """gunicorn 的 child_exit 钩子中调用，清理已退出 worker 的 livesum 数据"""
+    if PROMETHEUS_AVAILABLE and 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+        multiprocess.mark_process_dead(pid)
+
+
+request_metrics = RequestMetrics()
@@ -0,0 +1,53 @@
+"""
+模型变更事件分发
+在 flush 时记录 Product、Category 等模型的增删改，事务提交后再回调进程内的缓存和索引，
+回滚的事务不会污染缓存。
+"""
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+
+_PENDING_KEY = '_pending_model_changes'
+
+
+def on_committed_change(model, handler, snapshot=None):
+    """注册模型变更回调
+
+    handler(op, data) 在事务提交后调用，op 为 'insert'、'update' 或 'delete'；
+    data 为 snapshot(target) 的返回值，未提供 snapshot 时为主键ID。
+    snapshot 在 flush 时执行，提交后对象已过期，不能再读取属性。
+    """
+    def make_listener(op):
+        def listener(mapper, connection, target):
+            session = object_session(target)
+            if session is None:
+                return
+            data = snapshot(target) if snapshot else target.id
+            record_change(session, handler, op, data)
+        return listener
+
+    for op in ('insert', 'update', 'delete'):
+        event.listen(model, f'after_{op}', make_listener(op))
+
+
+def record_change(session, handler, op, data):
+    """登记一条变更，事务提交后调用 handler(op, data)
+
+    批量 UPDATE 等绕过 ORM 的写操作不会触发模型事件，需要手动登记。
+    """
+    session.info.setdefault(_PENDING_KEY, []).append((handler, op, data))
+
+
+@event.listens_for(Session, 'after_commit')
+def _dispatch_committed_changes(session):
+    pending = session.info.pop(_PENDING_KEY, None)
+    for handler, op, data in pending or ():
+        try:
+            handler(op, data)
+        except Exception as e:
+            print(f"模型变更回调失败: {e}")
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_pending_changes(session):
+    session.info.pop(_PENDING_KEY, None)
@@ -1,3 +1,4 @@
+import json
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime
 from werkzeug.security import generate_password_hash, check_password_hash
@@ -24,6 +25,16 @@ class Product(db.Model):
     # 关联
     category = db.relationship('Category', backref=db.backref('products', lazy=True))
     orders = db.relationship('Order', backref='product', lazy=True)
+    
+    __table_args__ = (
+        # 搜索结果按 (created_at, id) 游标分页；不带 is_active 前缀，
+        # 否则 SQLite 在没有统计信息时会放着主键不用、按 is_active 扫索引
+        db.Index('ix_product_created_id', 'created_at', 'id'),
+        # 统计页的低库存数量只扫描库存较少的那一段
+        db.Index('ix_product_stock_quantity', 'stock_quantity'),
+        # 进程内搜索索引按 updated_at 补齐其他进程提交的产品变更
+        db.Index('ix_product_updated_at', 'updated_at'),
+    )
 
     def to_dict(self):
         return {
@@ -46,8 +57,9 @@ class Product(db.Model):
 
 class Order(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    product_id = db.Column(db.Integer, db.ForeignKey('product.id'), nullable=False)
-    quantity = db.Column(db.Integer, nullable=False, default=1)
+    # 单产品订单的产品；多行订单为第一行的产品，完整明细见 items
+    product_id = db.Column(db.Integer, db.ForeignKey('product.id'), nullable=False, index=True)
+    quantity = db.Column(db.Integer, nullable=False, default=1)  # 多行订单为各行数量之和
     unit_price = db.Column(db.Float, nullable=True)
     total_amount = db.Column(db.Float, nullable=True)
     customer_name = db.Column(db.String(256), nullable=True)
@@ -57,6 +69,16 @@ class Order(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    items = db.relationship('OrderItem', backref='order', lazy=True, order_by='OrderItem.id',
+                            cascade='all, delete-orphan')
+    
+    __table_args__ = (
+        # 统计页最近订单、后台按时间排序和日期筛选
+        db.Index('ix_order_created_at', 'created_at'),
+        # 后台按状态筛选后按时间排序，如待处理订单列表
+        db.Index('ix_order_status_created', 'status', 'created_at'),
+    )
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -70,6 +92,27 @@ class Order(db.Model):
             'status': self.status,
             'notes': self.notes,
             'created_at': self.created_at.isoformat() if self.created_at else None,
+            'items': [item.to_dict() for item in self.items],
+        }
+
+class OrderItem(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    order_id = db.Column(db.Integer, db.ForeignKey('order.id'), nullable=False, index=True)
+    product_id = db.Column(db.Integer, db.ForeignKey('product.id'), nullable=False, index=True)
+    quantity = db.Column(db.Integer, nullable=False)
+    unit_price = db.Column(db.Float, nullable=True)
+    total_amount = db.Column(db.Float, nullable=True)
+    
+    product = db.relationship('Product')
+    
+    def to_dict(self):
+        return {
+            'product_id': self.product_id,
+            'sku': self.product.sku if self.product else None,
+            'product_name': self.product.name if self.product else None,
+            'quantity': self.quantity,
+            'unit_price': self.unit_price,
+            'total_amount': self.total_amount,
         }
 
 class User(db.Model):
@@ -127,4 +170,105 @@ class SystemSetting(db.Model):
             'value': self.value,
             'description': self.description,
             'created_at': self.created_at.isoformat() if self.created_at else None,
-        }
\ No newline at end of file
+        }
+
+# 缓存版本号：相关数据变更时在同一事务内加一，各进程据此判断本地缓存是否过期
+class CacheVersion(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(64), unique=True, nullable=False, index=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+# 通知发件箱：与订单在同一事务中写入，由后台线程投递，失败按指数退避重试
+class NotificationOutbox(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    order_id = db.Column(db.Integer, db.ForeignKey('order.id'), nullable=False, index=True)
+    channel = db.Column(db.String(20), nullable=False)  # email, sms
+    status = db.Column(db.String(20), nullable=False, default='pending')  # pending, sending, sent, skipped, dead
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    last_error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime, nullable=True)
+    
+    order = db.relationship('Order', backref=db.backref('notifications', lazy=True, cascade='all, delete-orphan'))
+    
+    __table_args__ = (
+        # 投递线程按 status + next_attempt_at 取到期的消息
+        db.Index('ix_notification_outbox_status_next', 'status', 'next_attempt_at'),
+    )
+
+# 统计页计数器：产品数、各状态订单数、销售额，随 Product、Order 变更在同一事务内增减
+class DashboardCounter(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(64), unique=True, nullable=False, index=True)
+    value = db.Column(db.Float, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+# 每日产品销量汇总：按订单创建日（UTC）累计销量、销售额和订单数，不含已取消订单
+class ProductSalesDaily(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, nullable=False)
+    product_id = db.Column(db.Integer, db.ForeignKey('product.id'), nullable=False, index=True)
+    units = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Float, nullable=False, default=0)
+    order_count = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    product = db.relationship('Product')
+    
+    __table_args__ = (
+        # 排行查询按日期范围扫描，再按产品汇总
+        db.UniqueConstraint('day', 'product_id', name='uq_product_sales_daily_day_product'),
+    )
+
+# 产品导入任务：上传的文件暂存到 UPLOAD_FOLDER/temp，由后台线程分块导入，每块提交后更新进度
+class ImportJob(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    filename = db.Column(db.String(256), nullable=False)  # 上传时的文件名
+    path = db.Column(db.String(512), nullable=False)  # 暂存文件路径，导入完成后删除
+    skip_existing = db.Column(db.Boolean, nullable=False, default=False)
+    status = db.Column(db.String(20), nullable=False, default='pending')  # pending, running, done, failed
+    rows_read = db.Column(db.Integer, nullable=False, default=0)  # 已提交的数据行数，重新认领时从这里继续
+    inserted = db.Column(db.Integer, nullable=False, default=0)
+    updated = db.Column(db.Integer, nullable=False, default=0)
+    skipped = db.Column(db.Integer, nullable=False, default=0)
+    failed = db.Column(db.Integer, nullable=False, default=0)
+    errors = db.Column(db.Text, nullable=True)  # JSON: [[行号, 错误信息], ...]
+    message = db.Column(db.Text, nullable=True)  # 任务失败原因
+    lease_expires_at = db.Column(db.DateTime, nullable=True)
+    claim_token = db.Column(db.String(32), nullable=True)  # 每次认领生成，只有持有者能写回进度
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+    
+    __table_args__ = (
+        # 导入线程按 status + lease_expires_at 取待处理和租约过期的任务
+        db.Index('ix_import_job_status_lease', 'status', 'lease_expires_at'),
+    )
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'filename': self.filename,
+            'status': self.status,
+            'rows_read': self.rows_read,
+            'inserted': self.inserted,
+            'updated': self.updated,
+            'skipped': self.skipped,
+            'failed': self.failed,
+            'errors': [{'line': line, 'message': message} for line, message in json.loads(self.errors or '[]')],
+            'message': self.message,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+        }
+
+# 产品导入指纹：最近一次导入时该货号数据行的哈希，增量导入据此跳过没有变化的行；
+# deactivated 表示产品因不在导入文件中被下架，再次出现在文件中时重新上架
+class ProductFingerprint(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    sku = db.Column(db.String(120), unique=True, nullable=False, index=True)
+    digest = db.Column(db.String(40), nullable=True)  # 为空表示产品导入后被修改过，下次导入一定写入
+    deactivated = db.Column(db.Boolean, nullable=False, default=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -0,0 +1,261 @@
+"""
+订单通知发件箱
+下单时在同一事务中写入 notification_outbox，请求不再等待 SMTP、短信接口。
+后台投递线程取出到期的消息发送，失败按指数退避重试，超过最大次数标记为 dead，
+在后台管理的“通知发件箱”中查看，把状态改回 pending 即可重新投递（重试次数清零）。
+
+系统设置 email_digest_window 大于 0 时开启邮件汇总：订单邮件等待该秒数后发送，
+期间到达的订单合并成一封邮件发给 notify_email。
+
+取消息用带条件的 UPDATE 认领，多个进程、多个线程同时投递也不会重复发送；
+认领后进程崩溃的消息在租约到期后会被重新认领。
+"""
+
+import random
+import threading
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, event, or_, select, update
+from sqlalchemy.orm import joinedload, selectinload
+
+from model_events import on_committed_change
+from models import db, NotificationOutbox, Order, OrderItem
+from settings_cache import settings_cache
+from utils import send_email_notification, send_sms_notification, send_email_digest
+
+# 渠道 -> (开关设置项, 发送函数)
+CHANNELS = {
+    'email': ('enable_email', send_email_notification),
+    'sms': ('enable_sms', send_sms_notification),
+}
+
+CLAIMABLE = ('pending', 'sending')
+
+# 通知内容需要订单、订单产品和全部明细行
+LOAD_ORDER = joinedload(NotificationOutbox.order).options(
+    joinedload(Order.product),
+    selectinload(Order.items).joinedload(OrderItem.product),
+)
+
+
+def digest_window(settings):
+    """邮件汇总窗口（秒），0 表示每个订单单独发送"""
+    return max(settings.get_float('email_digest_window', 0), 0)
+
+
+def enqueue_notifications(order, settings=None):
+    """按通知开关为订单写入发件箱，调用方负责提交事务"""
+    settings = settings_cache.snapshot() if settings is None else settings
+    window = digest_window(settings)
+    entries = []
+    for channel, (switch, _) in CHANNELS.items():
+        if settings.get_bool(switch):
+            entry = NotificationOutbox(order=order, channel=channel)
+            if channel == 'email' and window:
+                # 汇总模式下等窗口结束再发，窗口内的订单合并成一封
+                entry.next_attempt_at = datetime.utcnow() + timedelta(seconds=window)
+            db.session.add(entry)
+            entries.append(entry)
+    return entries
+
+
+@event.listens_for(NotificationOutbox.status, 'set')
+def _reset_attempts_on_requeue(entry, value, oldvalue, initiator):
+    """状态改回 pending（如后台重新投递死信）时重试次数和错误清零并立即到期，重新获得完整的重试机会"""
+    if value == 'pending' and oldvalue != 'pending':
+        entry.attempts = 0
+        entry.last_error = None
+        entry.next_attempt_at = datetime.utcnow()
+
+
+class OutboxWorker:
+    """发件箱投递线程池"""
+
+    def __init__(self):
+        self.threads = 2
+        self.poll_interval = 5.0
+        self.batch_size = 20
+        self.max_attempts = 8
+        self.backoff_base = 10.0
+        self.backoff_max = 3600.0
+        self.lease = 300.0
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._workers = []
+        self._start_lock = threading.Lock()
+
+    def init_app(self, app):
+        self.threads = app.config.get('OUTBOX_WORKERS', self.threads)
+        self.poll_interval = app.config.get('OUTBOX_POLL_INTERVAL', self.poll_interval)
+        self.max_attempts = app.config.get('OUTBOX_MAX_ATTEMPTS', self.max_attempts)
+        self.backoff_base = app.config.get('OUTBOX_BACKOFF_BASE', self.backoff_base)
+        self.backoff_max = app.config.get('OUTBOX_BACKOFF_MAX', self.backoff_max)
+        self.lease = app.config.get('OUTBOX_LEASE', self.lease)
+        app.extensions['outbox_worker'] = self
+
+    def start(self, app, threads=None):
+        """启动投递线程，重复调用不会多开"""
+        threads = self.threads if threads is None else threads
+        with self._start_lock:
+            self._workers = [t for t in self._workers if t.is_alive()]
+            self._stop.clear()
+            while len(self._workers) < threads:
+                t = threading.Thread(target=self._run, args=(app,),
+                                     name=f'outbox-worker-{len(self._workers) + 1}', daemon=True)
+                t.start()
+                self._workers.append(t)
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        self._wake.set()
+        for t in self._workers:
+            t.join(timeout)
+        self._workers = []
+
+    def wake(self, *args):
+        """有新消息时唤醒等待中的投递线程"""
+        self._wake.set()
+
+    def _run(self, app):
+        while not self._stop.is_set():
+            self._wake.clear()
+            with app.app_context():
+                try:
+                    processed = self.run_pending()
+                except Exception as e:
+                    db.session.rollback()
+                    print(f"通知投递出错: {e}")
+                    processed = 0
+            if not processed:
+                self._wake.wait(self.poll_interval)
+
+    def run_pending(self):
+        """投递一批到期的消息，返回本次认领的条数，需要在应用上下文中调用"""
+        now = datetime.utcnow()
+        due = db.session.execute(
+            select(NotificationOutbox.id, NotificationOutbox.channel)
+            .where(NotificationOutbox.status.in_(CLAIMABLE), NotificationOutbox.next_attempt_at <= now)
+            .order_by(NotificationOutbox.next_attempt_at)
+            .limit(self.batch_size)
+        ).all()
+        settings = settings_cache.snapshot()
+        db.session.commit()
+        window = digest_window(settings)
+
+        claimed = 0
+        digest_sent = False
+        for entry_id, channel in due:
+            if channel == 'email' and window:
+                if not digest_sent:
+                    claimed += self._deliver_digest(now, window, settings)
+                    digest_sent = True
+                continue
+            attempts = self._claim(entry_id, now)
+            if attempts is not None:
+                claimed += 1
+                self._deliver(entry_id, attempts, settings)
+        return claimed
+
+    @staticmethod
+    def _claimable(now, due_before=None):
+        """可认领的条件：pending 消息在 due_before（默认 now）之前到期，sending 消息的租约在 now 之前过期
+
+        汇总邮件提前认领窗口内的 pending 消息，但不能提前抢走别的线程正在发送、租约未过期的消息。
+        """
+        return or_(
+            and_(NotificationOutbox.status == 'pending', NotificationOutbox.next_attempt_at <= (due_before or now)),
+            and_(NotificationOutbox.status == 'sending', NotificationOutbox.next_attempt_at <= now),
+        )
+
+    def _claim(self, entry_id, now, due_before=None):
+        """认领一条可认领的消息（见 _claimable），被其他线程抢先时返回 None，否则返回本次是第几次尝试"""
+        result = db.session.execute(
+            update(NotificationOutbox)
+            .where(NotificationOutbox.id == entry_id, self._claimable(now, due_before))
+            .values(status='sending',
+                    attempts=NotificationOutbox.attempts + 1,
+                    next_attempt_at=now + timedelta(seconds=self.lease))
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount != 1:
+            db.session.rollback()
+            return None
+        attempts = db.session.execute(
+            select(NotificationOutbox.attempts).where(NotificationOutbox.id == entry_id)
+        ).scalar()
+        db.session.commit()
+        return attempts
+
+    def _deliver(self, entry_id, attempts, settings):
+        entry = db.session.get(NotificationOutbox, entry_id, options=[LOAD_ORDER])
+        order_id, channel = entry.order_id, entry.channel
+        _, send = CHANNELS[channel]
+        try:
+            result = send(entry.order, entry.order.product, settings)
+            error = f'{channel} 发送失败' if result is False else None
+        except Exception as e:
+            result, error = False, str(e)
+        db.session.rollback()
+        self._finish(entry_id, attempts, result, error, f"订单 {order_id} 的 {channel} 通知")
+        db.session.commit()
+
+    def _deliver_digest(self, now, window, settings):
+        """认领窗口内所有待发的订单邮件，合并成一封发送，返回认领的条数"""
+        due_before = now + timedelta(seconds=window)
+        ids = db.session.execute(
+            select(NotificationOutbox.id)
+            .where(NotificationOutbox.channel == 'email', self._claimable(now, due_before))
+            .order_by(NotificationOutbox.order_id)
+        ).scalars().all()
+        db.session.commit()
+
+        claimed = {}
+        for entry_id in ids:
+            attempts = self._claim(entry_id, now, due_before)
+            if attempts is not None:
+                claimed[entry_id] = attempts
+        if not claimed:
+            return 0
+
+        entries = NotificationOutbox.query.options(LOAD_ORDER).filter(NotificationOutbox.id.in_(claimed)).all()
+        orders = sorted((entry.order for entry in entries), key=lambda order: order.id)
+        try:
+            result = send_email_digest(orders, settings)
+            error = 'email 汇总发送失败' if result is False else None
+        except Exception as e:
+            result, error = False, str(e)
+        db.session.rollback()
+        for entry_id, attempts in claimed.items():
+            self._finish(entry_id, attempts, result, error, f"发件箱消息 {entry_id} 的汇总邮件")
+        db.session.commit()
+        return len(claimed)
+
+    def _finish(self, entry_id, attempts, result, error, label):
+        """按发送结果更新消息状态，由调用方提交"""
+        values = {'last_error': error}
+        if result is not False:
+            values.update(status='sent' if result else 'skipped', sent_at=datetime.utcnow())
+        elif attempts >= self.max_attempts:
+            values.update(status='dead')
+            print(f"{label}已重试 {attempts} 次，放弃投递")
+        else:
+            values.update(status='pending', next_attempt_at=datetime.utcnow() + self.backoff(attempts))
+
+        # 只更新仍由本线程持有的消息，租约过期被别人认领后不再覆盖
+        db.session.execute(
+            update(NotificationOutbox)
+            .where(NotificationOutbox.id == entry_id,
+                   NotificationOutbox.status == 'sending',
+                   NotificationOutbox.attempts == attempts)
+            .values(**values)
+            .execution_options(synchronize_session=False)
+        )
+
+    def backoff(self, attempts):
+        """第 attempts 次失败后的等待时间，指数增长并加少量随机抖动"""
+        delay = min(self.backoff_base * 2 ** (attempts - 1), self.backoff_max)
+        return timedelta(seconds=delay * random.uniform(1.0, 1.1))
+
+
+outbox_worker = OutboxWorker()
+on_committed_change(NotificationOutbox, outbox_worker.wake)
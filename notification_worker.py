@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+通知投递进程
+单独运行发件箱投递线程，Web 进程设置 OUTBOX_WORKERS=0 时使用。
+
+用法:
+  python notification_worker.py             # 持续投递
+  python notification_worker.py --once      # 投递完当前到期的消息后退出（适合 cron）
+  python notification_worker.py --threads 4 # 指定投递线程数
+"""
+
+import argparse
+import os
+import sys
+import time
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app import create_app
+from notification_outbox import outbox_worker
+
+
+def main():
+    parser = argparse.ArgumentParser(description='订单通知投递进程')
+    parser.add_argument('--once', action='store_true', help='投递完当前到期的消息后退出')
+    parser.add_argument('--threads', type=int, default=None, help='投递线程数，默认取 OUTBOX_WORKERS')
+    args = parser.parse_args()
+
+    app = create_app()
+
+    if args.once:
+        total = 0
+        with app.app_context():
+            while True:
+                processed = outbox_worker.run_pending()
+                if not processed:
+                    break
+                total += processed
+        print(f"本次投递 {total} 条通知")
+        return
+
+    threads = args.threads or app.config['OUTBOX_WORKERS'] or 1
+    outbox_worker.start(app, threads)
+    print(f"通知投递进程已启动，线程数: {threads}")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        outbox_worker.stop(timeout=10)
+        print("通知投递进程已停止")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,166 @@
+"""
+订单导出
+按下单日期范围和状态筛选订单，每个订单明细一行（没有明细的旧订单按订单头一行），
+通过服务端游标分批读取（yield_per / stream_results），边读边写 CSV 或 XLSX，
+内存占用与导出行数无关。
+"""
+
+import csv
+import io
+import tempfile
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, select
+
+from dashboard_counters import ORDER_STATUSES
+from models import db, Product, Order, OrderItem
+
+try:
+    from openpyxl import Workbook
+    OPENPYXL_AVAILABLE = True
+except ImportError:
+    OPENPYXL_AVAILABLE = False
+
+HEADERS = ('订单ID', '下单时间', '状态', '客户姓名', '客户电话',
+           '产品货号', '产品名称', '数量', '单价', '金额', '备注')
+
+# CSV 每攒够这么多行输出一次
+CSV_FLUSH_ROWS = 500
+
+# 以这些字符开头的单元格会被 Excel / WPS 当作公式执行（CSV 注入），导出时前面加单引号
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+def parse_date(value):
+    """解析 YYYY-MM-DD，空值返回 None，格式错误抛出 ValueError"""
+    value = (value or '').strip()
+    if not value:
+        return None
+    return datetime.strptime(value, '%Y-%m-%d')
+
+
+def parse_statuses(value):
+    """解析逗号分隔的状态列表，未知状态抛出 ValueError"""
+    statuses = [s.strip() for s in (value or '').split(',') if s.strip()]
+    unknown = [s for s in statuses if s not in ORDER_STATUSES]
+    if unknown:
+        raise ValueError(f"未知的订单状态: {', '.join(unknown)}")
+    return statuses
+
+
+def export_query(start=None, end=None, statuses=()):
+    """导出查询：start、end 为日期（含 end 当天），statuses 为空表示全部状态"""
+    product_id = func.coalesce(OrderItem.product_id, Order.product_id)
+    stmt = (
+        select(
+            Order.id, Order.created_at, Order.status, Order.customer_name, Order.customer_phone,
+            Product.sku, Product.name,
+            func.coalesce(OrderItem.quantity, Order.quantity),
+            func.coalesce(OrderItem.unit_price, Order.unit_price),
+            func.coalesce(OrderItem.total_amount, Order.total_amount),
+            Order.notes,
+        )
+        .select_from(Order)
+        .outerjoin(OrderItem, OrderItem.order_id == Order.id)
+        .join(Product, Product.id == product_id)
+    )
+    if start is not None:
+        stmt = stmt.where(Order.created_at >= start)
+    if end is not None:
+        stmt = stmt.where(Order.created_at < end + timedelta(days=1))
+    if statuses:
+        stmt = stmt.where(Order.status.in_(statuses))
+    return stmt.order_by(Order.created_at, Order.id, OrderItem.id)
+
+
+def iter_rows(start=None, end=None, statuses=(), batch_size=1000):
+    """逐行产出导出数据，服务端游标每次取 batch_size 行"""
+    result = db.session.execute(
+        export_query(start, end, statuses).execution_options(stream_results=True, yield_per=batch_size)
+    )
+    try:
+        for row in result:
+            yield _format_row(row)
+    finally:
+        result.close()
+
+
+def _text(value):
+    """客户填写或导入的文本，以公式字符开头时按文本输出"""
+    if value and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value or ''
+
+
+def _format_row(row):
+    order_id, created_at, status, name, phone, sku, product_name, quantity, unit_price, amount, notes = row
+    return (
+        order_id,
+        created_at.strftime('%Y-%m-%d %H:%M:%S') if created_at else '',
+        status or '',
+        _text(name),
+        _text(phone),
+        _text(sku),
+        _text(product_name),
+        quantity,
+        unit_price if unit_price is not None else '',
+        amount if amount is not None else '',
+        _text(notes),
+    )
+
+
+def iter_csv(rows):
+    """把行转成 CSV 文本块，带 BOM 以便 Excel 正确识别 UTF-8"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    buffer.write('\ufeff')
+    writer.writerow(HEADERS)
+    pending = 0
+    for row in rows:
+        writer.writerow(row)
+        pending += 1
+        if pending >= CSV_FLUSH_ROWS:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            pending = 0
+    yield buffer.getvalue()
+
+
+def write_xlsx(rows, target):
+    """用 openpyxl 只写模式写入 XLSX（文件名或二进制文件对象），返回行数
+
+    只写模式下每行写出后不再保留在内存中。
+    """
+    if not OPENPYXL_AVAILABLE:
+        raise RuntimeError('导出 XLSX 需要安装 openpyxl')
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet('订单')
+    sheet.append(HEADERS)
+    count = 0
+    for row in rows:
+        sheet.append(row)
+        count += 1
+    workbook.save(target)
+    return count
+
+
+def xlsx_tempfile(rows):
+    """写入匿名临时文件并返回定位到开头的文件对象，关闭后自动删除"""
+    fileobj = tempfile.TemporaryFile(suffix='.xlsx')
+    try:
+        write_xlsx(rows, fileobj)
+    except Exception:
+        fileobj.close()
+        raise
+    fileobj.seek(0)
+    return fileobj
+
+
+def export_filename(fmt, start=None, end=None):
+    parts = ['orders']
+    if start:
+        parts.append(start.strftime('%Y%m%d'))
+    if end:
+        parts.append(end.strftime('%Y%m%d'))
+    return '_'.join(parts) + f'.{fmt}'
@@ -0,0 +1,159 @@
+"""
+下单与库存扣减
+库存用一条带条件的 UPDATE 扣减：只有库存足够时才减，按影响行数判断是否成功。
+扣减、订单插入和通知发件箱在同一事务中提交，并发下单不会超卖，也不需要锁住整个请求；
+通知由后台线程投递，下单请求不等待邮件和短信。
+扣减库存不更新全局的 catalog 缓存版本号（否则所有订单都要排队更新同一行），
+只在提交后失效该产品的扫码查询缓存；搜索页面上的库存按 RESPONSE_CACHE_TTL 过期。
+
+多行订单（购物车）先校验全部行，再按产品ID升序逐行扣减库存，
+并发订单总是以相同顺序锁产品行，不会互相死锁；扣减期间不写其他共享行（计数器、销量汇总等
+在全部产品行锁住之后才写），明细行一次批量插入，每个订单只发一条通知。
+每日产品销量汇总在同一事务内累加（见 sales_rollup.py）。
+"""
+
+from sqlalchemy import insert, update
+
+from models import db, Product, Order, OrderItem
+from lookup_cache import lookup_cache
+from notification_outbox import enqueue_notifications
+from sales_rollup import record_order
+
+# 达到该数量按批发价计算
+WHOLESALE_QUANTITY = 10
+
+# 单个订单最多的明细行数
+MAX_ORDER_LINES = 200
+
+
+def reserve_stock(product, quantity):
+    """在当前事务中扣减库存，库存不足（或产品已下架）时返回 False"""
+    result = db.session.execute(
+        update(Product)
+        .where(Product.id == product.id,
+               Product.is_active.is_(True),
+               Product.stock_quantity >= quantity)
+        .values(stock_quantity=Product.stock_quantity - quantity)
+    )
+    if result.rowcount != 1:
+        return False
+    # 批量 UPDATE 不触发模型事件，手动让该产品的扫码查询缓存在提交后失效
+    lookup_cache.invalidate_after_commit(db.session, product)
+    return True
+
+
+def unit_price_for(product, quantity):
+    price = product.wholesale_price if quantity >= WHOLESALE_QUANTITY else product.retail_price
+    return price or 0
+
+
+def resolve_lines(items):
+    """校验购物车明细，返回 ([(产品, 数量)], 错误列表)
+
+    items 中每行为 {'product_id': ...} 或 {'sku': ...}，加上 quantity；
+    同一产品出现多次时数量合并。产品用一次查询批量加载。
+    """
+    errors = []
+    if not isinstance(items, list) or not items:
+        return [], ['订单明细不能为空']
+    if len(items) > MAX_ORDER_LINES:
+        return [], [f'订单明细不能超过 {MAX_ORDER_LINES} 行']
+
+    wanted = []
+    for i, item in enumerate(items, 1):
+        if not isinstance(item, dict):
+            errors.append(f'第 {i} 行格式错误')
+            continue
+        quantity = item.get('quantity', 1)
+        if not isinstance(quantity, int) or isinstance(quantity, bool) or quantity < 1:
+            errors.append(f'第 {i} 行数量必须是正整数')
+            continue
+        product_id = item.get('product_id')
+        if product_id is not None:
+            if not isinstance(product_id, int) or isinstance(product_id, bool):
+                errors.append(f'第 {i} 行 product_id 必须是整数')
+                continue
+            wanted.append((i, 'id', product_id, quantity))
+        elif item.get('sku'):
+            wanted.append((i, 'sku', str(item['sku']).strip(), quantity))
+        else:
+            errors.append(f'第 {i} 行缺少 product_id 或 sku')
+
+    ids = {key for _, field, key, _ in wanted if field == 'id'}
+    skus = {key for _, field, key, _ in wanted if field == 'sku'}
+    by_id, by_sku = {}, {}
+    if ids or skus:
+        conditions = []
+        if ids:
+            conditions.append(Product.id.in_(ids))
+        if skus:
+            conditions.append(Product.sku.in_(skus))
+        for product in Product.query.filter(db.or_(*conditions)):
+            by_id[product.id] = product
+            by_sku[product.sku] = product
+
+    quantities = {}
+    for i, field, key, quantity in wanted:
+        product = by_id.get(key) if field == 'id' else by_sku.get(key)
+        if product is None:
+            errors.append(f'第 {i} 行产品不存在: {key}')
+        elif not product.is_active:
+            errors.append(f'第 {i} 行产品已下架: {product.sku}')
+        else:
+            quantities[product] = quantities.get(product, 0) + quantity
+
+    return list(quantities.items()), errors
+
+
+def place_cart_order(lines, customer_name, customer_phone, notes=None):
+    """一次事务完成多行订单：扣减全部库存、插入订单和明细、写入一条通知
+
+    lines 为 [(产品, 数量)]，产品不重复。成功返回 (订单, None)；
+    某个产品库存不足时回滚全部扣减，返回 (None, 该产品)。
+    """
+    # 按产品ID顺序加锁，避免两个订单交叉锁同一批产品时死锁；
+    # reserve_stock 只锁产品行，其他共享行都在循环结束后才写，加锁顺序始终一致
+    lines = sorted(lines, key=lambda line: line[0].id)
+    for product, quantity in lines:
+        if not reserve_stock(product, quantity):
+            db.session.rollback()
+            return None, product
+
+    items = []
+    for product, quantity in lines:
+        unit_price = unit_price_for(product, quantity)
+        items.append({
+            'product_id': product.id,
+            'quantity': quantity,
+            'unit_price': unit_price,
+            'total_amount': unit_price * quantity,
+        })
+
+    order = Order(
+        product_id=lines[0][0].id,
+        quantity=sum(item['quantity'] for item in items),
+        unit_price=items[0]['unit_price'] if len(items) == 1 else None,
+        customer_name=customer_name,
+        customer_phone=customer_phone,
+        total_amount=sum(item['total_amount'] for item in items),
+        status='pending',
+        notes=notes
+    )
+    db.session.add(order)
+    # 明细用批量 INSERT 写入，flush 时看不到，先按明细累加每日销量汇总
+    record_order(db.session, order, [(item['product_id'], item['quantity'], item['total_amount']) for item in items])
+    db.session.flush()
+
+    for item in items:
+        item['order_id'] = order.id
+    db.session.execute(insert(OrderItem), items)
+
+    enqueue_notifications(order)
+    db.session.commit()
+    return order, None
+
+
+def place_order(product, quantity, customer_name, customer_phone, notes=None):
+    """单产品下单，库存不足时回滚并返回 None"""
+    order, _ = place_cart_order([(product, quantity)], customer_name, customer_phone, notes)
+    return order
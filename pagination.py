@@ -0,0 +1,141 @@
+"""
+游标（keyset）分页
+按 (created_at, id) 倒序翻页，游标记录当前页首/尾行的排序键，
+每一页都是一次索引范围扫描，翻到第N页和第1页开销相同。
+全文检索按相关度排序时改用 (rank, id) 作为排序键。
+"""
+
+import base64
+import json
+from datetime import datetime
+
+from sqlalchemy import and_, or_, tuple_
+
+
+class Cursor:
+    """分页游标：排序键 (created_at, id) 或 (rank, id) 和翻页方向（next 向后，prev 向前）"""
+
+    def __init__(self, created_at, id, direction='next', rank=None):
+        self.created_at = created_at
+        self.id = id
+        self.direction = direction
+        self.rank = rank
+
+    @property
+    def key(self):
+        if self.rank is not None:
+            return (self.rank, self.id)
+        return (self.created_at, self.id)
+
+    def encode(self):
+        data = {'i': self.id, 'd': self.direction}
+        if self.rank is not None:
+            data['r'] = self.rank
+        else:
+            data['t'] = self.created_at.isoformat()
+        raw = json.dumps(data, separators=(',', ':')).encode('utf-8')
+        return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+    @classmethod
+    def decode(cls, token):
+        """解析游标，格式不正确时返回 None（从第一页开始）"""
+        if not token:
+            return None
+        try:
+            raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+            data = json.loads(raw)
+            direction = data.get('d', 'next')
+            if direction not in ('next', 'prev'):
+                return None
+            if 'r' in data:
+                return cls(None, int(data['i']), direction, rank=float(data['r']))
+            return cls(datetime.fromisoformat(data['t']), int(data['i']), direction)
+        except (ValueError, KeyError, TypeError):
+            return None
+
+
+class Page:
+    """一页结果及前后页游标"""
+
+    def __init__(self, items, next_cursor=None, prev_cursor=None):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self):
+        return self.prev_cursor is not None
+
+
+def _time_cursor(row, direction):
+    return Cursor(row.created_at, row.id, direction)
+
+
+def build_page(rows, per_page, cursor=None, make_cursor=_time_cursor):
+    """由按排序键倒序排列、最多 per_page+1 行的结果构造分页
+
+    向前翻页时多取的一行在列表开头，向后翻页时在末尾。
+    make_cursor(row, direction) 由行生成游标，默认取 (created_at, id)。
+    """
+    if cursor is not None and cursor.direction == 'prev':
+        has_more_prev = len(rows) > per_page
+        items = rows[-per_page:] if rows else []
+        has_more_next = True
+    else:
+        items = rows[:per_page]
+        has_more_next = len(rows) > per_page
+        has_more_prev = cursor is not None
+
+    next_cursor = prev_cursor = None
+    if items and has_more_next:
+        next_cursor = make_cursor(items[-1], 'next').encode()
+    if items and has_more_prev:
+        prev_cursor = make_cursor(items[0], 'prev').encode()
+    return Page(items, next_cursor, prev_cursor)
+
+
+def keyset_paginate(query, model, per_page, cursor=None):
+    """对 query 按 model.created_at、model.id 倒序做游标分页"""
+    if cursor is not None and cursor.rank is not None:
+        cursor = None
+    key = tuple_(model.created_at, model.id)
+    if cursor is not None and cursor.direction == 'prev':
+        rows = (query.filter(key > cursor.key)
+                .order_by(model.created_at.asc(), model.id.asc())
+                .limit(per_page + 1).all())
+        rows.reverse()
+    else:
+        if cursor is not None:
+            query = query.filter(key < cursor.key)
+        rows = (query.order_by(model.created_at.desc(), model.id.desc())
+                .limit(per_page + 1).all())
+    return build_page(rows, per_page, cursor)
+
+
+def ranked_paginate(query, model, rank, per_page, cursor=None):
+    """按相关度 rank 倒序、model.id 倒序做游标分页，rank 为可排序的SQL表达式
+
+    返回的 Page.items 只包含模型对象。
+    """
+    if cursor is not None and cursor.rank is None:
+        cursor = None
+    query = query.add_columns(rank)
+    if cursor is not None and cursor.direction == 'prev':
+        rows = (query.filter(or_(rank > cursor.rank, and_(rank == cursor.rank, model.id > cursor.id)))
+                .order_by(rank.asc(), model.id.asc())
+                .limit(per_page + 1).all())
+        rows.reverse()
+    else:
+        if cursor is not None:
+            query = query.filter(or_(rank < cursor.rank, and_(rank == cursor.rank, model.id < cursor.id)))
+        rows = (query.order_by(rank.desc(), model.id.desc())
+                .limit(per_page + 1).all())
+
+    page = build_page(rows, per_page, cursor,
+                      make_cursor=lambda row, direction: Cursor(None, row[0].id, direction, rank=row[1]))
+    page.items = [row[0] for row in page.items]
+    return page
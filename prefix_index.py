@@ -0,0 +1,102 @@
+"""
+输入联想前缀索引
+把上架产品的名称、货号、条码分别规范化后放进有序数组，前缀查询用 bisect 定位起点，
+只扫描命中的前 limit 条，耗时与产品总数基本无关。
+"""
+
+from bisect import bisect_left, insort
+
+from models import Product
+from search_index import ProductIndex, normalize_text
+
+SUGGEST_FIELDS = ('name', 'sku', 'barcode')
+
+
+class _PrefixState:
+    def __init__(self):
+        # 每个字段一个有序数组，元素为 (规范化文本, 产品ID)
+        self.entries = {field: [] for field in SUGGEST_FIELDS}
+        self.docs = {}
+        # 全量构建时先追加、最后统一排序
+        self.bulk = True
+
+
+class PrefixIndex(ProductIndex):
+    """产品名称、货号、条码的有序前缀索引"""
+
+    name = 'prefix_index'
+    label = '输入联想索引'
+    columns = (Product.id, Product.name, Product.sku, Product.barcode, Product.is_active)
+
+    def _new_state(self):
+        return _PrefixState()
+
+    def _add(self, state, row):
+        product_id, name, sku, barcode, is_active = row
+        if not is_active:
+            return
+        values = (name, sku, barcode)
+        state.docs[product_id] = values
+        for field, value in zip(SUGGEST_FIELDS, values):
+            key = normalize_text(value)
+            if not key:
+                continue
+            if state.bulk:
+                state.entries[field].append((key, product_id))
+            else:
+                insort(state.entries[field], (key, product_id))
+
+    def _finalize(self, state):
+        for entries in state.entries.values():
+            entries.sort()
+        state.bulk = False
+
+    def _remove(self, state, product_id):
+        values = state.docs.pop(product_id, None)
+        if values is None:
+            return
+        for field, value in zip(SUGGEST_FIELDS, values):
+            entry = (normalize_text(value), product_id)
+            entries = state.entries[field]
+            i = bisect_left(entries, entry)
+            if i < len(entries) and entries[i] == entry:
+                del entries[i]
+
+    def suggest(self, prefix, field=None, limit=10):
+        """返回以 prefix 开头的上架产品，field 可限定为 name、sku 或 barcode
+
+        不限定字段时依次匹配名称、货号、条码。
+        """
+        prefix = normalize_text(prefix)
+        if not prefix:
+            return []
+        self.refresh()
+        fields = (field,) if field in SUGGEST_FIELDS else SUGGEST_FIELDS
+
+        results = []
+        seen = set()
+        with self._lock:
+            docs = self._state.docs
+            for field_name in fields:
+                entries = self._state.entries[field_name]
+                i = bisect_left(entries, (prefix,))
+                while i < len(entries) and len(results) < limit:
+                    key, product_id = entries[i]
+                    if not key.startswith(prefix):
+                        break
+                    i += 1
+                    if product_id in seen:
+                        continue
+                    seen.add(product_id)
+                    name, sku, barcode = docs[product_id]
+                    results.append({
+                        'id': product_id,
+                        'name': name,
+                        'sku': sku,
+                        'barcode': barcode,
+                        'match': field_name,
+                    })
+        return results
+
+
+prefix_index = PrefixIndex().register()
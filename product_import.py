@@ -0,0 +1,700 @@
+"""
+产品批量导入引擎
+按块（默认 1000 行）处理导入行：每块先用一条 IN 查询解析已有货号、分类和条码占用，
+再用同一条 INSERT ... ON CONFLICT (sku) DO UPDATE 按 executemany 写入（PostgreSQL、SQLite），
+其他数据库退回 executemany 的 UPDATE + INSERT。每块提交一次。
+workers 大于 1 时各块的校验、规范化在进程池中并行，写入仍由当前进程按块顺序执行。
+
+每行规范化后计算指纹（数据行哈希），写入后保存在 product_fingerprint 表。增量模式（delta）
+跳过指纹与上次导入相同的行，没有变化的块只有一条查询、不写入；deactivate_missing
+下架不在文件中的产品，这些产品再次出现在文件中时重新上架。
+CSV 从二进制流逐行读取（iter_csv_rows），Excel 用 openpyxl 只读模式逐行读取（iter_excel_rows），
+配合 ImportCheckpoint 可从中断处继续。
+
+批量写入不触发 ORM 事件，写入后手动同步页面缓存版本号、扫码查询缓存、
+进程内搜索索引和统计页计数器。
+"""
+
+import csv
+import hashlib
+import io
+import json
+import math
+import multiprocessing
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+from sqlalchemy import bindparam, delete, event, inspect, insert, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+
+import dashboard_counters
+from cache_versions import bump
+from lookup_cache import lookup_cache
+from model_events import record_change
+from models import db, Product, Category, ProductFingerprint
+from prefix_index import prefix_index
+from search_index import product_index
+
+try:
+    from openpyxl import load_workbook
+    OPENPYXL_AVAILABLE = True
+except ImportError:
+    OPENPYXL_AVAILABLE = False
+
+# 表头别名 -> 字段名，供 Excel 等中文表头的文件使用
+COLUMN_MAPPING = {
+    '货号': 'sku',
+    '产品名称': 'name',
+    '品名': 'name',
+    '名称': 'name',
+    '条码': 'barcode',
+    '规格': 'spec',
+    '型号': 'model',
+    '零售价': 'retail_price',
+    '零售价格': 'retail_price',
+    '批发价': 'wholesale_price',
+    '批发价格': 'wholesale_price',
+    '库存': 'stock_quantity',
+    '库存数量': 'stock_quantity',
+    '描述': 'description',
+    '分类': 'category',
+}
+
+REQUIRED_FIELDS = ('sku', 'name')
+
+# 导入文件可以提供的字段；已有货号只更新文件中有的列，没有的列保留原值
+IMPORT_FIELDS = ('sku', 'name', 'barcode', 'spec', 'model', 'retail_price', 'wholesale_price',
+                 'stock_quantity', 'description', 'category')
+
+# 导入时写入 product 表的字段（不含分类名，分类解析为 category_id）
+PRODUCT_FIELDS = ('sku', 'name', 'barcode', 'spec', 'model', 'retail_price', 'wholesale_price',
+                  'stock_quantity', 'description', 'category_id')
+
+# 参与指纹计算的字段（分类按名称）；库存会被下单直接扣减（批量 UPDATE，不经过 ORM 事件），
+# 不放进指纹，增量导入时直接与产品当前的库存比较
+FINGERPRINT_FIELDS = ('sku', 'name', 'barcode', 'spec', 'model', 'retail_price', 'wholesale_price',
+                      'description', 'category')
+
+# 同步进程内索引需要的列
+_PUBLISHED_COLUMNS = {column.key: column for index in (product_index, prefix_index) for column in index.columns}
+
+DEFAULT_CHUNK_SIZE = 1000
+
+# 最多保留的错误明细条数
+MAX_ERRORS = 1000
+
+
+class RowError(ValueError):
+    """单行数据校验失败"""
+
+
+def map_header(header):
+    """把表头映射为字段名，未知的列原样保留"""
+    return [COLUMN_MAPPING.get(str(name).strip(), str(name).strip()) if name is not None else ''
+            for name in header]
+
+
+def check_header(fields):
+    """缺少必填列时抛出 ValueError"""
+    missing = [field for field in REQUIRED_FIELDS if field not in fields]
+    if missing:
+        raise ValueError(f"缺少必要的列: {', '.join(missing)}")
+
+
+def _row_dict(fields, values):
+    # 行尾缺少的单元格按空值处理，每行都带表头中的全部列
+    row = dict.fromkeys(fields)
+    row.update(zip(fields, values))
+    return row
+
+
+def iter_csv_rows(stream, start=0, encoding='utf-8-sig'):
+    """从二进制流逐行读取 CSV，产出 (行号, 数据字典)
+
+    按块增量解码，内存占用与文件大小无关。start 为跳过的数据行数（断点续传），
+    跳过的行只解析不组装。空行不计入数据行。
+    """
+    text = io.TextIOWrapper(stream, encoding=encoding, newline='')
+    try:
+        reader = csv.reader(text)
+        header = next(reader, None)
+        if header is None:
+            raise ValueError('文件为空')
+        fields = map_header(header)
+        check_header(fields)
+        index = 0
+        for values in reader:
+            if not any(values):
+                continue
+            index += 1
+            if index <= start:
+                continue
+            yield reader.line_num, _row_dict(fields, values)
+    finally:
+        # 不关闭调用方传入的流（流已被关闭时无需处理）
+        if not stream.closed:
+            text.detach()
+
+
+def iter_excel_rows(source, start=0):
+    """用 openpyxl 只读模式逐行读取第一个工作表（文件名或可 seek 的二进制文件对象），
+    产出 (行号, 数据字典)
+
+    第一个非空行为表头，按 COLUMN_MAPPING 映射中文列名。只读模式按需解析工作表 XML，
+    不把整个表格载入内存。start 为跳过的数据行数。
+    """
+    if not OPENPYXL_AVAILABLE:
+        raise RuntimeError('导入 Excel 需要安装 openpyxl')
+    workbook = load_workbook(source, read_only=True, data_only=True)
+    try:
+        sheet = workbook.worksheets[0]
+        fields = None
+        index = 0
+        for line, values in enumerate(sheet.iter_rows(values_only=True), start=1):
+            if not any(value is not None and value != '' for value in values):
+                continue
+            if fields is None:
+                fields = map_header(values)
+                check_header(fields)
+                continue
+            index += 1
+            if index <= start:
+                continue
+            yield line, _row_dict(fields, values)
+        if fields is None:
+            raise ValueError('文件为空')
+    finally:
+        workbook.close()
+
+
+class ImportCheckpoint:
+    """导入断点：在 JSON 文件中记录源文件已提交的数据行数
+
+    每块提交后保存，中断后从记录的行数继续。源文件大小或修改时间变化时断点作废。
+    """
+
+    def __init__(self, path, source):
+        self.path = path
+        stat = os.stat(source)
+        self.source = {'file': os.path.abspath(source), 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+    def load(self):
+        """返回已提交的数据行数，没有有效断点时返回 0"""
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return 0
+        if data.get('source') != self.source:
+            return 0
+        return int(data.get('rows', 0))
+
+    def save(self, rows):
+        # 先写临时文件再替换，中途崩溃不会留下损坏的断点
+        tmp_path = f'{self.path}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'source': self.source, 'rows': rows}, f)
+        os.replace(tmp_path, self.path)
+
+    def clear(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+def _is_missing(value):
+    if value is None:
+        return True
+    if isinstance(value, float) and math.isnan(value):
+        return True
+    return isinstance(value, str) and not value.strip()
+
+
+def _text(value):
+    if _is_missing(value):
+        return None
+    # Excel 中的数字货号、条码会读成 123.0
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).strip()
+
+
+def _number(value, label, cast):
+    if _is_missing(value):
+        return None
+    try:
+        number = cast(float(str(value).strip().replace(',', '')))
+    except ValueError:
+        raise RowError(f'{label}格式错误: {value}')
+    if number < 0:
+        raise RowError(f'{label}不能为负数: {value}')
+    return number
+
+
+def normalize_row(raw):
+    """校验并规范化一行导入数据，返回产品字段字典（分类为名称），数据有误时抛出 RowError
+
+    返回的字典带 columns：raw 中出现的可导入字段（即文件表头中的列），更新已有产品时只写这些列。
+    """
+    sku = _text(raw.get('sku'))
+    name = _text(raw.get('name'))
+    if not sku:
+        raise RowError('缺少货号')
+    if not name:
+        raise RowError('缺少产品名称')
+    if len(sku) > 120:
+        raise RowError(f'货号过长: {sku[:20]}...')
+    return {
+        'sku': sku,
+        'name': name[:256],
+        # 条码唯一，空条码存 NULL 而不是空字符串
+        'barcode': _text(raw.get('barcode')),
+        'spec': _text(raw.get('spec')) or '',
+        'model': _text(raw.get('model')) or '',
+        'retail_price': _number(raw.get('retail_price'), '零售价', float),
+        'wholesale_price': _number(raw.get('wholesale_price'), '批发价', float),
+        'stock_quantity': _number(raw.get('stock_quantity'), '库存', int) or 0,
+        'description': _text(raw.get('description')) or '',
+        'category': _text(raw.get('category')),
+        'columns': frozenset(field for field in IMPORT_FIELDS if field in raw),
+    }
+
+
+_UPSERT_STATEMENTS = {}
+
+
+def update_columns(columns):
+    """导入文件提供的字段 -> 更新已有产品时写入的列"""
+    return tuple(sorted('category_id' if field == 'category' else field
+                        for field in columns if field != 'sku')) + ('updated_at',)
+
+
+def _upsert_statement(dialect, table, updated):
+    """按货号 INSERT ... ON CONFLICT (sku) DO UPDATE SET updated 中的列，语句按表和列组合缓存
+
+    product 表只覆盖导入文件中有的列，不覆盖创建时间和上架状态。
+    """
+    key = (dialect, table.name, updated)
+    if key not in _UPSERT_STATEMENTS:
+        insert_ = postgresql.insert if dialect == 'postgresql' else sqlite.insert
+        stmt = insert_(table)
+        _UPSERT_STATEMENTS[key] = stmt.on_conflict_do_update(
+            index_elements=[table.c.sku],
+            set_={field: stmt.excluded[field] for field in updated},
+        )
+    return _UPSERT_STATEMENTS[key]
+
+
+def save_fingerprints(rows):
+    """保存指纹 [{'sku', 'digest', 'deactivated'}]，在当前事务内执行"""
+    if not rows:
+        return
+    now = datetime.utcnow()
+    rows = [dict(row, updated_at=now) for row in rows]
+    connection = db.session.connection()
+    dialect = connection.dialect.name
+    if dialect in ('postgresql', 'sqlite'):
+        connection.execute(_upsert_statement(dialect, ProductFingerprint.__table__,
+                                             ('digest', 'deactivated', 'updated_at')), rows)
+        return
+    table = ProductFingerprint.__table__
+    connection.execute(delete(table).where(table.c.sku.in_([row['sku'] for row in rows])))
+    connection.execute(insert(table), rows)
+
+
+@event.listens_for(Product, 'after_update')
+def _forget_fingerprint(mapper, connection, target):
+    """产品在导入之外被修改（如后台编辑）时清空指纹，下次导入一定写入"""
+    state = inspect(target)
+    if not any(state.attrs[field].history.has_changes() for field in PRODUCT_FIELDS):
+        return
+    skus = {target.sku} | set(state.attrs['sku'].history.deleted or ())
+    table = ProductFingerprint.__table__
+    connection.execute(update(table).where(table.c.sku.in_(skus)).values(digest=None))
+
+
+def record_digest(record):
+    """规范化后数据行的指纹"""
+    payload = json.dumps([record[field] for field in FINGERPRINT_FIELDS], ensure_ascii=False)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+
+def normalize_chunk(chunk):
+    """校验一块原始行 [(行号, 数据字典)]，返回 ([(行号, 字段字典)], [(行号, 错误信息)])
+
+    字段字典带 digest 指纹。只依赖行数据本身，可以在子进程中执行。
+    """
+    records, errors = [], []
+    for line, raw in chunk:
+        try:
+            record = normalize_row(raw)
+        except RowError as e:
+            errors.append((line, str(e)))
+            continue
+        record['digest'] = record_digest(record)
+        records.append((line, record))
+    return records, errors
+
+
+def iter_chunks(rows, size):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class ImportStats:
+    """导入统计"""
+
+    def __init__(self):
+        self.read = 0
+        self.inserted = 0
+        self.updated = 0
+        self.unchanged = 0
+        self.skipped = 0
+        self.deactivated = 0
+        self.failed = 0
+        self.errors = []
+        self.started = time.perf_counter()
+        self.elapsed = 0.0
+
+    def add_error(self, line, message):
+        self.failed += 1
+        if len(self.errors) < MAX_ERRORS:
+            self.errors.append((line, message))
+
+    def stop(self):
+        self.elapsed = time.perf_counter() - self.started
+
+    @property
+    def rows_per_second(self):
+        elapsed = self.elapsed or (time.perf_counter() - self.started)
+        return self.read / elapsed if elapsed > 0 else 0.0
+
+    def summary(self):
+        text = f"读取 {self.read} 行，新增 {self.inserted}，更新 {self.updated}，"
+        if self.unchanged:
+            text += f"未变化 {self.unchanged}，"
+        if self.deactivated:
+            text += f"下架 {self.deactivated}，"
+        return text + f"跳过 {self.skipped}，失败 {self.failed}，{self.rows_per_second:.0f} 行/秒"
+
+
+class ProductImporter:
+    """分块批量导入产品
+
+    rows 为 (行号, 原始数据字典) 的可迭代对象，原始数据的键为字段名（见 map_header）。
+    skip_existing 为 True 时已存在的货号跳过，否则更新。
+    progress(stats) 在每块提交后调用。
+    workers 大于 1 时用进程池校验各块，最多 workers * 2 块在途，内存占用仍与文件大小无关。
+    delta 为 True 时跳过指纹与上次导入相同的行。
+    deactivate_missing 为 True 时导入结束后下架文件中没有的产品；需要记住文件中出现过的
+    全部货号，内存占用与文件行数成正比，rows 必须是完整的文件（不能从断点继续）。
+    """
+
+    def __init__(self, chunk_size=DEFAULT_CHUNK_SIZE, skip_existing=False, progress=None, workers=1,
+                 delta=False, deactivate_missing=False):
+        self.chunk_size = chunk_size
+        self.skip_existing = skip_existing
+        self.progress = progress
+        self.workers = workers
+        self.delta = delta
+        self.deactivate_missing = deactivate_missing
+
+    def run(self, rows):
+        stats = ImportStats()
+        chunks = iter_chunks(rows, self.chunk_size)
+        seen = set()
+        if self.deactivate_missing:
+            chunks = self._track_skus(chunks, seen)
+        if self.workers > 1:
+            self._run_parallel(chunks, stats)
+        else:
+            for chunk in chunks:
+                self._write_chunk(len(chunk), normalize_chunk(chunk), stats)
+        if self.deactivate_missing:
+            if seen:
+                self._deactivate_missing(seen, stats)
+            else:
+                print("导入文件没有数据行，不下架任何产品")
+        stats.stop()
+        return stats
+
+    @staticmethod
+    def _track_skus(chunks, seen):
+        # 校验失败的行也算出现过，避免因数据错误误下架
+        for chunk in chunks:
+            for _, raw in chunk:
+                sku = _text(raw.get('sku'))
+                if sku:
+                    seen.add(sku)
+            yield chunk
+
+    def _run_parallel(self, chunks, stats):
+        # spawn 启动的子进程不继承父进程的数据库连接
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(self.workers, mp_context=context) as pool:
+            pending = deque()
+            for chunk in chunks:
+                pending.append((len(chunk), pool.submit(normalize_chunk, chunk)))
+                # 按提交顺序写入，断点记录的行数才是连续的
+                if len(pending) >= self.workers * 2:
+                    count, future = pending.popleft()
+                    self._write_chunk(count, future.result(), stats)
+            while pending:
+                count, future = pending.popleft()
+                self._write_chunk(count, future.result(), stats)
+
+    def _write_chunk(self, count, normalized, stats):
+        records, errors = normalized
+        stats.read += count
+        for line, message in errors:
+            stats.add_error(line, message)
+        self.write_records(records, stats)
+        if self.progress:
+            self.progress(stats)
+
+    def write_records(self, records, stats):
+        """写入一块已校验的记录 [(行号, 字段字典)] 并提交"""
+        # 同一块中重复的货号以最后一行为准
+        by_sku = {}
+        for line, record in records:
+            if record['sku'] in by_sku:
+                stats.skipped += 1
+            by_sku[record['sku']] = (line, record)
+        if not by_sku:
+            return
+
+        try:
+            # 货号 -> (条码, 指纹, 是否因不在文件中被下架, 当前库存)
+            existing = {
+                sku: (barcode, digest, deactivated, stock)
+                for sku, barcode, digest, deactivated, stock in db.session.execute(
+                    select(Product.sku, Product.barcode, ProductFingerprint.digest, ProductFingerprint.deactivated,
+                           Product.stock_quantity)
+                    .outerjoin(ProductFingerprint, ProductFingerprint.sku == Product.sku)
+                    .where(Product.sku.in_(by_sku))
+                )
+            }
+            pending = {}
+            for sku, (line, record) in by_sku.items():
+                if sku in existing:
+                    if self.skip_existing:
+                        stats.skipped += 1
+                        continue
+                    _, digest, deactivated, stock = existing[sku]
+                    stock_unchanged = 'stock_quantity' not in record['columns'] or stock == record['stock_quantity']
+                    if self.delta and not deactivated and digest == record['digest'] and stock_unchanged:
+                        stats.unchanged += 1
+                        continue
+                pending[sku] = (line, record)
+            if not pending:
+                db.session.commit()
+                return
+
+            categories = self._resolve_categories({r['category'] for _, r in pending.values() if r['category']})
+            rows = self._check_barcodes(pending, stats)
+
+            # 按文件提供的列分组（同一文件只有一组）：新产品写入全部字段，
+            # 已有产品只更新文件中有的列，文件没有的列保留原值
+            now = datetime.utcnow()
+            groups = {}
+            for line, record in rows:
+                updated = update_columns(record['columns'])
+                new_rows, changed_rows = groups.setdefault(updated, ([], []))
+                values = {field: record.get(field) for field in PRODUCT_FIELDS if field != 'category_id'}
+                values['category_id'] = categories.get(record['category'])
+                values['updated_at'] = now
+                if values['sku'] in existing:
+                    changed_rows.append((line, {field: values[field] for field in ('sku',) + updated}))
+                else:
+                    values['created_at'] = now
+                    values['is_active'] = True
+                    new_rows.append((line, values))
+
+            written = []
+            for updated, (new_rows, changed_rows) in groups.items():
+                written += self._write(new_rows, changed_rows, stats, updated)
+            save_fingerprints([{'sku': values['sku'], 'digest': pending[values['sku']][1]['digest'],
+                                'deactivated': False} for _, values in written])
+            reactivated = self._reactivate([values['sku'] for op, values in written
+                                            if op == 'update' and existing[values['sku']][2]])
+            inserted = sum(1 for op, _ in written if op == 'insert')
+            self._publish(
+                {values['sku']: op for op, values in written},
+                [existing[values['sku']][0] for op, values in written if op == 'update'],
+                {dashboard_counters.PRODUCTS_TOTAL: inserted,
+                 dashboard_counters.PRODUCTS_ACTIVE: inserted + reactivated},
+            )
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+    @staticmethod
+    def _reactivate(skus):
+        """重新上架因不在导入文件中被下架、这次又出现的产品，返回上架数"""
+        if not skus:
+            return 0
+        result = db.session.execute(
+            update(Product.__table__)
+            .where(Product.__table__.c.sku.in_(skus), Product.__table__.c.is_active == False)
+            .values(is_active=True)
+        )
+        return result.rowcount
+
+    def _deactivate_missing(self, seen, stats):
+        """下架文件中没有出现的上架产品，每块提交一次"""
+        result = db.session.execute(
+            select(Product.sku).where(Product.is_active == True).execution_options(yield_per=5000)
+        )
+        missing = [sku for sku in result.scalars() if sku not in seen]
+        db.session.commit()
+        now = datetime.utcnow()
+        for chunk in iter_chunks(missing, self.chunk_size):
+            try:
+                table = Product.__table__
+                count = db.session.execute(
+                    update(table).where(table.c.sku.in_(chunk), table.c.is_active == True)
+                    .values(is_active=False, updated_at=now)
+                ).rowcount
+                save_fingerprints([{'sku': sku, 'digest': None, 'deactivated': True} for sku in chunk])
+                self._publish({sku: 'update' for sku in chunk}, [],
+                              {dashboard_counters.PRODUCTS_ACTIVE: -count})
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                raise
+            stats.deactivated += count
+
+    @staticmethod
+    def _resolve_categories(names):
+        """分类名 -> ID，不存在的分类新建（走 ORM，分类树和缓存会随事件更新）"""
+        if not names:
+            return {}
+        found = dict(db.session.execute(
+            select(Category.name, Category.id).where(Category.name.in_(names))
+        ).all())
+        missing = [Category(name=name) for name in sorted(names - set(found))]
+        if missing:
+            db.session.add_all(missing)
+            db.session.flush()
+            found.update((category.name, category.id) for category in missing)
+        return found
+
+    @staticmethod
+    def _check_barcodes(by_sku, stats):
+        """条码唯一：已被其他货号占用或同一块内重复的行记为失败"""
+        barcodes = {record['barcode'] for _, record in by_sku.values() if record['barcode']}
+        owners = dict(db.session.execute(
+            select(Product.barcode, Product.sku).where(Product.barcode.in_(barcodes))
+        ).all()) if barcodes else {}
+        rows = []
+        for line, record in sorted(by_sku.values(), key=lambda item: item[0]):
+            barcode = record['barcode']
+            if barcode:
+                owner = owners.get(barcode)
+                if owner is not None and owner != record['sku']:
+                    stats.add_error(line, f'条码 {barcode} 已被货号 {owner} 使用')
+                    continue
+                owners[barcode] = record['sku']
+            rows.append((line, record))
+        return rows
+
+    def _write(self, new_rows, changed_rows, stats, updated):
+        """写入本块，已有货号只更新 updated 中的列，返回成功写入的 [(操作, 字段字典)]"""
+        rows = new_rows + changed_rows
+        if not rows:
+            return []
+        savepoint = db.session.begin_nested()
+        try:
+            self._write_batch([values for _, values in new_rows], [values for _, values in changed_rows], updated)
+            savepoint.commit()
+        except IntegrityError:
+            # 并发导入等少见情况下整块失败，逐行重试找出出错的行
+            savepoint.rollback()
+            return self._write_one_by_one(new_rows, changed_rows, stats, updated)
+        stats.inserted += len(new_rows)
+        stats.updated += len(changed_rows)
+        return [('insert', values) for _, values in new_rows] + [('update', values) for _, values in changed_rows]
+
+    def _write_one_by_one(self, new_rows, changed_rows, stats, updated):
+        written = []
+        for op, group in (('insert', new_rows), ('update', changed_rows)):
+            for line, values in group:
+                savepoint = db.session.begin_nested()
+                try:
+                    if op == 'insert':
+                        self._write_batch([values], [], updated)
+                    else:
+                        self._write_batch([], [values], updated)
+                    savepoint.commit()
+                except IntegrityError as e:
+                    savepoint.rollback()
+                    stats.add_error(line, f'写入失败: {e.orig}')
+                    continue
+                if op == 'insert':
+                    stats.inserted += 1
+                else:
+                    stats.updated += 1
+                written.append((op, values))
+        return written
+
+    def _write_batch(self, new_values, changed_values, updated):
+        connection = db.session.connection()
+        dialect = connection.dialect.name
+        if dialect in ('postgresql', 'sqlite'):
+            # 同一条 upsert 语句按 executemany 执行，编译结果可以缓存复用；
+            # 新增和更新的行字段不同（created_at、is_active、文件中没有的列），分两批执行
+            stmt = _upsert_statement(dialect, Product.__table__, updated)
+            for values in (new_values, changed_values):
+                if values:
+                    connection.execute(stmt, values)
+            return
+        if new_values:
+            connection.execute(insert(Product.__table__), new_values)
+        if changed_values:
+            params = [dict(values, b_sku=values['sku']) for values in changed_values]
+            connection.execute(
+                update(Product.__table__)
+                .where(Product.__table__.c.sku == bindparam('b_sku'))
+                .values({field: bindparam(field) for field in changed_values[0] if field != 'sku'}),
+                params,
+            )
+
+    @staticmethod
+    def _publish(ops, old_barcodes, counter_deltas):
+        """批量写入绕过了 ORM 事件，手动通知缓存、索引和计数器
+
+        ops 为 {货号: 'insert'/'update'}，old_barcodes 为写入前的条码。
+        """
+        if not ops:
+            return
+        session = db.session()
+        bump(session, 'catalog')
+
+        # 进程内搜索索引需要产品ID等完整字段，写入后按货号读回
+        keys = {('barcode', barcode) for barcode in old_barcodes if barcode}
+        columns = list(_PUBLISHED_COLUMNS.values())
+        for row in session.execute(select(*columns).where(Product.sku.in_(ops))):
+            mapping = row._mapping
+            keys.add(('sku', mapping[Product.sku]))
+            if mapping[Product.barcode]:
+                keys.add(('barcode', mapping[Product.barcode]))
+            for index in (product_index, prefix_index):
+                data = tuple(mapping[column] for column in index.columns)
+                record_change(session, index.on_change, ops[mapping[Product.sku]], data)
+        record_change(session, lookup_cache.on_product_change, 'update', keys)
+
+        deltas = {name: delta for name, delta in counter_deltas.items() if delta}
+        if deltas:
+            dashboard_counters.apply_deltas(session.connection(), deltas)
@@ -0,0 +1,58 @@
+"""
+SQL 查询预算
+路由用 @query_budget 声明每个请求最多执行多少条 SQL，防止模板或序列化中的延迟加载
+悄悄变成 N+1 查询。语句数由 metrics 中的 before_cursor_execute 监听按请求计数，
+超出预算时打印警告；test_query_budget.py 对声明了预算的路由逐个断言。
+
+预算针对的是缓存未命中时的最坏情况，且不应随数据量增长。
+"""
+
+from flask import current_app, g, request
+
+from metrics import request_sql_statements
+
+
+def query_budget(default=None, **methods):
+    """声明路由的查询预算，可以按请求方法分别设置，如 @query_budget(1, POST=12)
+
+    放在 @app.route 下面、其他装饰器上面，预算记录在注册的视图函数上。
+    """
+    def decorator(view):
+        view.query_budget = dict(methods, default=default)
+        return view
+    return decorator
+
+
+def budget_for(view, method):
+    """视图在该请求方法下的预算，未声明返回 None"""
+    budgets = getattr(view, 'query_budget', None)
+    if budgets is None:
+        return None
+    return budgets.get(method, budgets['default'])
+
+
+class QueryBudgetMonitor:
+    """请求结束时检查语句数，超出预算打印警告"""
+
+    def init_app(self, app):
+        # 放在最前面，首个请求触发的建表语句不计入
+        app.before_request_funcs.setdefault(None, []).insert(0, self._reset)
+        app.after_request(self._check)
+        app.extensions['query_budget'] = self
+
+    @staticmethod
+    def _reset():
+        g._sql_statements = 0
+
+    @staticmethod
+    def _check(response):
+        view = current_app.view_functions.get(request.endpoint)
+        limit = budget_for(view, request.method)
+        used = request_sql_statements()
+        if limit is not None and used > limit:
+            print(f"SQL 查询超出预算: {request.method} {request.path} ({request.endpoint}) "
+                  f"执行了 {used} 条，预算 {limit} 条")
+        return response
+
+
+query_budget_monitor = QueryBudgetMonitor()
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+统计页计数器校对
+从产品表和订单表重算 dashboard_counter 和每日产品销量汇总，报告与表中值的偏差并写回。
+两者平时随 ORM 写入增量维护，绕过 ORM 的批量写入或手工改库后运行一次。
+
+用法:
+  python reconcile_counters.py            # 报告偏差并修正
+  python reconcile_counters.py --dry-run  # 只报告偏差，不修改
+"""
+
+import argparse
+import os
+import sys
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app import create_app
+import dashboard_counters
+import sales_rollup
+
+
+def main():
+    parser = argparse.ArgumentParser(description='校对统计页计数器和销量汇总')
+    parser.add_argument('--dry-run', action='store_true', help='只报告偏差，不修改')
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        drift = dashboard_counters.reconcile(apply=not args.dry_run)
+        rollup_drift = sales_rollup.reconcile(apply=not args.dry_run)
+
+    for name, stored, actual in drift:
+        stored_text = '缺失' if stored is None else f'{stored:g}'
+        print(f"{name}: 计数器 {stored_text}，实际 {actual:g}")
+    for (day, product_id), stored, actual in rollup_drift:
+        stored_text = '缺失' if stored is None else f'销量 {stored[0]} 金额 {stored[1]:g} 订单 {stored[2]}'
+        print(f"{day} 产品 {product_id}: 汇总 {stored_text}，实际 销量 {actual[0]} 金额 {actual[1]:g} 订单 {actual[2]}")
+
+    total = len(drift) + len(rollup_drift)
+    if not total:
+        print("计数器、销量汇总与数据一致")
+        return
+    if args.dry_run:
+        print(f"发现 {total} 项偏差（未修改）")
+        sys.exit(1)
+    print(f"已修正 {total} 项偏差")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+"""
+页面响应缓存
+按规范化后的查询参数和数据版本号缓存渲染好的页面，并返回强 ETag，
+浏览器和 nginx 带 If-None-Match 重新验证时直接返回 304。
+下单扣减库存不改变版本号（避免所有订单争用同一行），页面上的库存数量
+按 RESPONSE_CACHE_TTL 秒的时间段失效。
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import current_app, request, session
+
+from cache_versions import cache_versions
+
+
+class ResponseCache:
+    """进程内有界 LRU 页面缓存"""
+
+    def __init__(self, maxsize=1000, ttl=30):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def init_app(self, app):
+        self.maxsize = app.config.get('RESPONSE_CACHE_SIZE', self.maxsize)
+        self.ttl = app.config.get('RESPONSE_CACHE_TTL', self.ttl)
+        self.clear()
+        app.extensions['response_cache'] = self
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def _put(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    @staticmethod
+    def request_key():
+        """路径加上去掉空值、排序后的查询参数"""
+        args = sorted((k, v.strip()) for k, v in request.args.items(multi=True) if v.strip())
+        return request.path, tuple(args)
+
+    def period(self):
+        """当前时间段编号，ttl 为 0 时页面只随版本号失效"""
+        return int(time.time() // self.ttl) if self.ttl else 0
+
+    def cached(self, version_name):
+        """缓存 GET 请求的页面，version_name 对应的版本号变化或进入下一个时间段后失效"""
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                # 有待显示的提示消息时页面因人而异，不走缓存
+                if request.method != 'GET' or '_flashes' in session:
+                    return view(*args, **kwargs)
+
+                version = cache_versions.current(version_name)
+                # 时间段放进缓存键和 ETag，各进程同时过期
+                key = (version, self.period(), self.request_key())
+                etag = hashlib.sha1(repr(key).encode('utf-8')).hexdigest()
+                if etag in request.if_none_match:
+                    response = current_app.response_class(status=304)
+                    response.set_etag(etag)
+                    return response
+
+                entry = self._get(key)
+                if entry is not None:
+                    body, mimetype = entry
+                    response = current_app.response_class(body, mimetype=mimetype)
+                else:
+                    response = current_app.make_response(view(*args, **kwargs))
+                    if response.status_code != 200 or response.direct_passthrough:
+                        return response
+                    self._put(key, (response.get_data(), response.mimetype))
+                response.set_etag(etag)
+                # 允许缓存但每次都要重新验证
+                response.headers['Cache-Control'] = 'no-cache'
+                return response
+            return wrapper
+        return decorator
+
+
+response_cache = ResponseCache()
@@ -0,0 +1,248 @@
+"""
+每日产品销量汇总
+product_sales_daily 按 (日期, 产品) 保存销量、销售额和订单数，
+订单新增、删除以及进出“已取消”状态时在 flush 前按差值累加，与订单在同一事务内提交。
+热销排行只按日期范围读取汇总表，不扫描订单表。
+
+日期按订单 created_at 的 UTC 日期计算。
+"""
+
+from collections import defaultdict, namedtuple
+from datetime import date, datetime, timedelta
+from itertools import chain
+
+from sqlalchemy import event, func, insert, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from models import db, Product, Order, OrderItem, ProductSalesDaily
+# dashboard_counters 已为 Order.status 开启 active_history，直接赋值时也能取到旧值
+from dashboard_counters import old_value
+
+# 排行榜时间范围 -> 天数（含今天）
+RANGES = {'today': 1, '7d': 7, '30d': 30}
+
+TopProduct = namedtuple('TopProduct', 'product units revenue order_count')
+
+_RECORDED_KEY = '_sales_rollup_recorded_orders'
+
+
+def _order_lines(order):
+    """订单按产品合并后的 {产品ID: (数量, 金额)}，没有明细的旧订单按订单头计算"""
+    lines = defaultdict(lambda: [0, 0.0])
+    if order.items:
+        for item in order.items:
+            lines[item.product_id][0] += item.quantity or 0
+            lines[item.product_id][1] += item.total_amount or 0
+    elif order.product_id is not None:
+        lines[order.product_id] = [order.quantity or 0, order.total_amount or 0]
+    return lines
+
+
+def _order_day(order):
+    # 新订单的 created_at 在插入时才由默认值填充
+    return (order.created_at or datetime.utcnow()).date()
+
+
+def _add_order(deltas, order, sign, lines=None):
+    day = _order_day(order)
+    lines = _order_lines(order) if lines is None else lines
+    for product_id, (units, revenue) in lines.items():
+        delta = deltas[(day, product_id)]
+        delta[0] += sign * units
+        delta[1] += sign * revenue
+        delta[2] += sign
+
+
+def _collect_deltas(session):
+    deltas = defaultdict(lambda: [0, 0.0, 0])
+    recorded = session.info.get(_RECORDED_KEY, ())
+    for obj in session.new:
+        if isinstance(obj, Order) and obj.status != 'cancelled' and obj not in recorded:
+            _add_order(deltas, obj, 1)
+    for obj in session.deleted:
+        if isinstance(obj, Order) and old_value(obj, 'status') != 'cancelled':
+            _add_order(deltas, obj, -1)
+    for obj in session.dirty:
+        if isinstance(obj, Order):
+            was_counted = old_value(obj, 'status') != 'cancelled'
+            is_counted = obj.status != 'cancelled'
+            if was_counted != is_counted:
+                _add_order(deltas, obj, 1 if is_counted else -1)
+    return {key: delta for key, delta in deltas.items() if any(delta)}
+
+
+def apply_deltas(connection, deltas):
+    """把 {(日期, 产品ID): [销量, 销售额, 订单数]} 累加到汇总表"""
+    now = datetime.utcnow()
+    rows = [{'day': day, 'product_id': product_id, 'units': units, 'revenue': revenue,
+             'order_count': orders, 'updated_at': now}
+            for (day, product_id), (units, revenue, orders) in sorted(deltas.items())]
+    if not rows:
+        return
+    dialect = connection.dialect.name
+    if dialect in ('postgresql', 'sqlite'):
+        insert_ = postgresql.insert if dialect == 'postgresql' else sqlite.insert
+        stmt = insert_(ProductSalesDaily).values(rows)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[ProductSalesDaily.day, ProductSalesDaily.product_id],
+            set_={
+                'units': ProductSalesDaily.units + stmt.excluded.units,
+                'revenue': ProductSalesDaily.revenue + stmt.excluded.revenue,
+                'order_count': ProductSalesDaily.order_count + stmt.excluded.order_count,
+                'updated_at': stmt.excluded.updated_at,
+            },
+        )
+        connection.execute(stmt)
+        return
+    for row in rows:
+        result = connection.execute(
+            update(ProductSalesDaily)
+            .where(ProductSalesDaily.day == row['day'], ProductSalesDaily.product_id == row['product_id'])
+            .values(units=ProductSalesDaily.units + row['units'],
+                    revenue=ProductSalesDaily.revenue + row['revenue'],
+                    order_count=ProductSalesDaily.order_count + row['order_count'],
+                    updated_at=now)
+        )
+        if result.rowcount == 0:
+            connection.execute(insert(ProductSalesDaily).values(**row))
+
+
+def record_order(session, order, lines):
+    """在当前事务内累加订单的销量汇总
+
+    明细用批量 INSERT 写入的订单需要手动调用，lines 为 [(产品ID, 数量, 金额)]。
+    订单本身之后 flush 时不再重复累加。
+    """
+    merged = defaultdict(lambda: [0, 0.0])
+    for product_id, units, revenue in lines:
+        merged[product_id][0] += units or 0
+        merged[product_id][1] += revenue or 0
+    session.info.setdefault(_RECORDED_KEY, set()).add(order)
+    if order.status == 'cancelled':
+        return
+    deltas = defaultdict(lambda: [0, 0.0, 0])
+    _add_order(deltas, order, 1, merged)
+    apply_deltas(session.connection(), deltas)
+
+
+@event.listens_for(Session, 'after_commit')
+@event.listens_for(Session, 'after_rollback')
+def _forget_recorded_orders(session):
+    session.info.pop(_RECORDED_KEY, None)
+
+
+@event.listens_for(Session, 'before_flush')
+def _update_rollup(session, flush_context, instances):
+    if not any(isinstance(obj, Order) for obj in chain(session.new, session.dirty, session.deleted)):
+        return
+    deltas = _collect_deltas(session)
+    if deltas:
+        apply_deltas(session.connection(), deltas)
+
+
+def range_start(days, today=None):
+    today = today or datetime.utcnow().date()
+    return today - timedelta(days=days - 1)
+
+
+def top_products(days=7, limit=10, today=None):
+    """最近 days 天（含今天）销量最高的产品，返回 [TopProduct]，只读汇总表"""
+    totals = (
+        select(ProductSalesDaily.product_id,
+               func.sum(ProductSalesDaily.units).label('units'),
+               func.sum(ProductSalesDaily.revenue).label('revenue'),
+               func.sum(ProductSalesDaily.order_count).label('order_count'))
+        .where(ProductSalesDaily.day >= range_start(days, today))
+        .group_by(ProductSalesDaily.product_id)
+        .having(func.sum(ProductSalesDaily.units) > 0)
+        .order_by(func.sum(ProductSalesDaily.units).desc(), ProductSalesDaily.product_id)
+        .limit(limit)
+        .subquery()
+    )
+    rows = db.session.execute(
+        select(Product, totals.c.units, totals.c.revenue, totals.c.order_count)
+        .join(totals, Product.id == totals.c.product_id)
+        .order_by(totals.c.units.desc(), Product.id)
+    ).all()
+    return [TopProduct(product, int(units), revenue or 0, int(orders)) for product, units, revenue, orders in rows]
+
+
+def _as_date(value):
+    if isinstance(value, date):
+        return value
+    return datetime.strptime(str(value)[:10], '%Y-%m-%d').date()
+
+
+def compute_rollup():
+    """从订单和明细从头计算汇总，返回 {(日期, 产品ID): (销量, 销售额, 订单数)}"""
+    day = func.date(Order.created_at)
+    counted = db.or_(Order.status.is_(None), Order.status != 'cancelled')
+    actual = defaultdict(lambda: [0, 0.0, 0])
+
+    item_rows = db.session.execute(
+        select(day, OrderItem.product_id, func.sum(OrderItem.quantity),
+               func.coalesce(func.sum(OrderItem.total_amount), 0),
+               func.count(func.distinct(Order.id)))
+        .join(Order, OrderItem.order_id == Order.id)
+        .where(counted)
+        .group_by(day, OrderItem.product_id)
+    )
+    # 没有明细的旧订单按订单头计算
+    has_items = select(OrderItem.id).where(OrderItem.order_id == Order.id).exists()
+    header_rows = db.session.execute(
+        select(day, Order.product_id, func.sum(Order.quantity),
+               func.coalesce(func.sum(Order.total_amount), 0), func.count(Order.id))
+        .where(counted, ~has_items)
+        .group_by(day, Order.product_id)
+    )
+    for order_day, product_id, units, revenue, orders in list(item_rows) + list(header_rows):
+        totals = actual[(_as_date(order_day), product_id)]
+        totals[0] += units or 0
+        totals[1] += revenue or 0
+        totals[2] += orders
+    return {key: tuple(value) for key, value in actual.items()}
+
+
+def reconcile(apply=True):
+    """重算汇总并与表中数据比较，返回偏差列表 [((日期, 产品ID), 表中值, 真实值)]
+
+    apply 为 True 时用重算结果替换有偏差的行。
+    """
+    stored = {
+        (_as_date(row.day), row.product_id): (row.units, row.revenue, row.order_count)
+        for row in db.session.execute(
+            select(ProductSalesDaily.day, ProductSalesDaily.product_id, ProductSalesDaily.units,
+                   ProductSalesDaily.revenue, ProductSalesDaily.order_count).with_for_update()
+        )
+    }
+    actual = compute_rollup()
+
+    empty = (0, 0.0, 0)
+    drift = []
+    for key in sorted(set(stored) | set(actual)):
+        stored_value = stored.get(key)
+        actual_value = actual.get(key, empty)
+        current = stored_value or empty
+        if current[0] != actual_value[0] or current[2] != actual_value[2] or \
+                abs(current[1] - actual_value[1]) > 1e-6:
+            drift.append((key, stored_value, actual_value))
+
+    if apply and drift:
+        now = datetime.utcnow()
+        for (day, product_id), stored_value, (units, revenue, orders) in drift:
+            if stored_value is None:
+                db.session.execute(insert(ProductSalesDaily).values(
+                    day=day, product_id=product_id, units=units, revenue=revenue,
+                    order_count=orders, updated_at=now))
+            else:
+                db.session.execute(
+                    update(ProductSalesDaily)
+                    .where(ProductSalesDaily.day == day, ProductSalesDaily.product_id == product_id)
+                    .values(units=units, revenue=revenue, order_count=orders, updated_at=now)
+                )
+    if apply:
+        db.session.commit()
+    else:
+        db.session.rollback()
+    return drift
@@ -0,0 +1,174 @@
+"""
+产品搜索后端
+search() 和 /api/products 通过统一接口做名称/货号匹配，由 SEARCH_BACKEND 选择实现：
+  ngram     进程内 n-gram 倒排索引（默认）
+  ilike     ilike '%关键词%' 模糊查询，用于对比延迟
+  fulltext  PostgreSQL 使用 pg_trgm GIN 索引并按相似度排序，SQLite 使用 FTS5 影子表并按 bm25 排序
+"""
+
+from sqlalchemy import column, func, literal_column, select, table, text
+from sqlalchemy.engine import make_url
+
+from models import Product
+from pagination import build_page, keyset_paginate, ranked_paginate
+from search_index import product_index
+
+
+class IlikeBackend:
+    """ilike 模糊查询，名称和货号无法使用B树索引"""
+
+    name = 'ilike'
+
+    def install(self, engine):
+        """创建后端需要的索引、表和触发器，启动时调用，可重复执行"""
+
+    def filter(self, query, q, sku):
+        if q:
+            query = query.filter(Product.name.ilike(f"%{q}%"))
+        if sku:
+            query = query.filter(Product.sku.ilike(f"%{sku}%"))
+        return query
+
+    def paginate(self, query, q, sku, per_page, cursor=None):
+        """返回一页匹配的产品"""
+        return keyset_paginate(self.filter(query, q, sku), Product, per_page, cursor)
+
+    def iter_rows(self, query, q, sku, batch_size=1000):
+        """逐行产出全部匹配的产品，用于流式接口"""
+        return self.filter(query, q, sku).order_by(Product.id).yield_per(batch_size)
+
+
+class NgramBackend(IlikeBackend):
+    """进程内 n-gram 倒排索引解析候选ID，再按主键回表"""
+
+    name = 'ngram'
+
+    def paginate(self, query, q, sku, per_page, cursor=None):
+        if not (q or sku):
+            return super().paginate(query, q, sku, per_page, cursor)
+        if cursor is not None and cursor.rank is not None:
+            cursor = None
+        rows = product_index.fetch(query, q=q, sku=sku, limit=per_page + 1, cursor=cursor)
+        return build_page(rows, per_page, cursor)
+
+    def iter_rows(self, query, q, sku, batch_size=1000):
+        if not (q or sku):
+            return super().iter_rows(query, q, sku, batch_size)
+        return product_index.iter_rows(query, q=q, sku=sku)
+
+
+class PgTrigramBackend(IlikeBackend):
+    """PostgreSQL pg_trgm：GIN 三元组索引加速 ilike，结果按相似度排序
+
+    少于3个字符的关键词提取不出三元组，索引帮不上忙。
+    """
+
+    name = 'pg_trgm'
+    INDEXES = (('ix_product_name_trgm', 'name'), ('ix_product_sku_trgm', 'sku'))
+
+    def install(self, engine):
+        with engine.begin() as conn:
+            conn.execute(text('CREATE EXTENSION IF NOT EXISTS pg_trgm'))
+            for index_name, column_name in self.INDEXES:
+                conn.execute(text(
+                    f'CREATE INDEX IF NOT EXISTS {index_name} ON product USING gin ({column_name} gin_trgm_ops)'
+                ))
+
+    def rank(self, q, sku):
+        if q:
+            return func.similarity(Product.name, q)
+        return func.similarity(Product.sku, sku)
+
+    def paginate(self, query, q, sku, per_page, cursor=None):
+        if not (q or sku):
+            return super().paginate(query, q, sku, per_page, cursor)
+        return ranked_paginate(self.filter(query, q, sku), Product, self.rank(q, sku), per_page, cursor)
+
+
+product_fts = table('product_fts', column('rowid'), column('name'), column('sku'))
+
+
+class SqliteFts5Backend(IlikeBackend):
+    """SQLite FTS5：trigram 分词的外部内容影子表，由触发器与 product 表同步，结果按 bm25 排序
+
+    trigram 分词最短匹配3个字符，更短的关键词退回 ilike。
+    """
+
+    name = 'fts5'
+    MIN_TERM_LENGTH = 3
+
+    DDL = (
+        "CREATE VIRTUAL TABLE IF NOT EXISTS product_fts USING fts5("
+        "name, sku, content='product', content_rowid='id', tokenize='trigram')",
+        "CREATE TRIGGER IF NOT EXISTS product_fts_ai AFTER INSERT ON product BEGIN "
+        "INSERT INTO product_fts(rowid, name, sku) VALUES (new.id, new.name, new.sku); END",
+        "CREATE TRIGGER IF NOT EXISTS product_fts_ad AFTER DELETE ON product BEGIN "
+        "INSERT INTO product_fts(product_fts, rowid, name, sku) VALUES ('delete', old.id, old.name, old.sku); END",
+        "CREATE TRIGGER IF NOT EXISTS product_fts_au AFTER UPDATE OF name, sku ON product BEGIN "
+        "INSERT INTO product_fts(product_fts, rowid, name, sku) VALUES ('delete', old.id, old.name, old.sku); "
+        "INSERT INTO product_fts(rowid, name, sku) VALUES (new.id, new.name, new.sku); END",
+    )
+
+    def install(self, engine):
+        with engine.begin() as conn:
+            exists = conn.execute(text(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'product_fts'"
+            )).first()
+            for statement in self.DDL:
+                conn.execute(text(statement))
+            if not exists:
+                # 新建影子表时从 product 表回填
+                conn.execute(text("INSERT INTO product_fts(product_fts) VALUES ('rebuild')"))
+
+    def _split_terms(self, q, sku):
+        """拆分为 FTS5 MATCH 表达式和需要退回 ilike 的短关键词"""
+        phrases = []
+        short_q = short_sku = ''
+        for column_name, term in (('name', q), ('sku', sku)):
+            if len(term) >= self.MIN_TERM_LENGTH:
+                phrases.append(f'{column_name} : "{term.replace(chr(34), chr(34) * 2)}"')
+            elif column_name == 'name':
+                short_q = term
+            else:
+                short_sku = term
+        return ' AND '.join(phrases), short_q, short_sku
+
+    def _match(self, query, q, sku):
+        """返回加上全文匹配的查询和排序表达式，没有可用的长关键词时排序表达式为 None"""
+        expression, short_q, short_sku = self._split_terms(q, sku)
+        query = super().filter(query, short_q, short_sku)
+        if not expression:
+            return query, None
+        matches = (select(product_fts.c.rowid.label('id'),
+                          (-func.bm25(literal_column('product_fts'))).label('rank'))
+                   .where(literal_column('product_fts').op('MATCH')(expression))
+                   .subquery())
+        return query.join(matches, Product.id == matches.c.id), matches.c.rank
+
+    def filter(self, query, q, sku):
+        return self._match(query, q, sku)[0]
+
+    def paginate(self, query, q, sku, per_page, cursor=None):
+        query, rank = self._match(query, q, sku)
+        if rank is None:
+            return keyset_paginate(query, Product, per_page, cursor)
+        return ranked_paginate(query, Product, rank, per_page, cursor)
+
+
+BACKENDS = {backend.name: backend for backend in (IlikeBackend, NgramBackend, PgTrigramBackend, SqliteFts5Backend)}
+
+
+def create_search_backend(name, database_uri):
+    """按名称创建搜索后端，fulltext 根据数据库类型选择 pg_trgm 或 FTS5"""
+    if name == 'fulltext':
+        dialect = make_url(database_uri).get_backend_name()
+        if dialect == 'postgresql':
+            return PgTrigramBackend()
+        if dialect == 'sqlite':
+            return SqliteFts5Backend()
+        print(f"数据库 {dialect} 不支持全文检索后端，使用 ilike")
+        return IlikeBackend()
+    if name not in BACKENDS:
+        print(f"未知的搜索后端 {name}，使用 ngram")
+        name = 'ngram'
+    return BACKENDS[name]()
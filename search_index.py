@@ -0,0 +1,326 @@
+"""
+产品名称/货号 n-gram 倒排索引
+进程内按字符切分单字和二元组（中文名称没有空格分词），查询时先求候选ID交集，
+再按主键回表，避免 ilike '%关键词%' 造成的全表扫描。
+其他进程提交的产品变更通过 catalog 版本号发现，查询前按 updated_at 补齐。
+"""
+
+import heapq
+import threading
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta
+from itertools import islice
+
+from sqlalchemy import func, select
+
+from cache_versions import cache_versions
+from model_events import on_committed_change
+from models import db, Product
+
+# 每次回表的主键数量，避免 IN 列表超过数据库参数上限
+FETCH_CHUNK_SIZE = 500
+
+
+def normalize_text(text):
+    """规范化用于匹配的文本：去掉首尾空白并转小写"""
+    return (text or '').strip().lower()
+
+
+def _grams(text):
+    """切分查询需要的 n-gram：单字查询用单字，其余用二元组"""
+    if len(text) < 2:
+        return {text} if text else set()
+    return {text[i:i + 2] for i in range(len(text) - 1)}
+
+
+def _all_grams(text):
+    """切分建索引需要的 n-gram：单字和二元组都要收录"""
+    return set(text) | _grams(text)
+
+
+class ProductIndex(ABC):
+    """进程内产品索引基类：首次使用时从 Product 表全量构建，之后随产品变更增量同步
+
+    本进程提交的变更由 on_change 同步；命令行导入、导入 worker、其他 gunicorn worker
+    提交的变更只会让 catalog 版本号加一，refresh() 发现版本号比构建时新时按 updated_at
+    重读最近变更的产品，产品数对不上时再按主键补齐新增和删除。
+
+    子类声明 columns（构建时读取的列，第一列为主键），实现 _new_state()、
+    _add(state, row) 和 _remove(state, product_id)；全量加载完成后调用 _finalize(state)。
+    """
+
+    name = 'product_index'
+    label = '产品索引'
+    columns = ()
+    # 按 updated_at 增量同步时向前多读的时间，覆盖服务器之间的时钟偏差和 flush 后迟迟提交的事务
+    SYNC_MARGIN = timedelta(minutes=1)
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._build_lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._built = False
+        self._building = False
+        self._backlog = []
+        self._state = self._new_state()
+        # 已收录的全部产品ID（含子类不收录的下架产品），用于发现其他进程的新增和删除
+        self._ids = set()
+        # 索引对应的 catalog 版本号和同步开始时间
+        self._version = 0
+        self._synced_at = None
+
+    @abstractmethod
+    def _new_state(self):
+        """返回空的索引状态"""
+
+    @abstractmethod
+    def _add(self, state, row):
+        """把一行 columns 数据加入索引状态"""
+
+    @abstractmethod
+    def _remove(self, state, product_id):
+        """从索引状态中移除产品，产品不存在时忽略"""
+
+    def _finalize(self, state):
+        pass
+
+    def init_app(self, app):
+        """绑定应用，丢弃之前构建的索引（测试或切换数据库时）"""
+        with self._lock:
+            self._reset()
+        app.extensions[self.name] = self
+
+    @property
+    def built(self):
+        return self._built
+
+    def build(self):
+        """从 Product 表全量构建索引，需要在应用上下文中调用"""
+        with self._build_lock:
+            if self._built:
+                return
+            with self._lock:
+                self._building = True
+
+            # 先读版本号：读取期间其他进程提交的变更会让下次 refresh() 再同步一次
+            version = cache_versions.current('catalog')
+            synced_at = datetime.utcnow()
+            state = self._new_state()
+            ids = set()
+            try:
+                for row in db.session.query(*self.columns).yield_per(5000):
+                    self._add(state, row)
+                    ids.add(row[0])
+                self._finalize(state)
+            except Exception:
+                with self._lock:
+                    self._building = False
+                    self._backlog = []
+                raise
+
+            # 构建期间提交的变更在替换后重放
+            with self._lock:
+                self._state = state
+                self._ids = ids
+                self._version, self._synced_at = version, synced_at
+                backlog, self._backlog = self._backlog, []
+                for op, data in backlog:
+                    self._apply(op, data)
+                self._built = True
+                self._building = False
+        print(f"{self.label}构建完成: {len(ids)} 个产品")
+
+    def refresh(self):
+        """确保索引已构建且不落后于 catalog 版本号，需要在应用上下文中调用"""
+        if not self._built:
+            self.build()
+        elif cache_versions.current('catalog') > self._version:
+            self._sync()
+
+    def _sync(self):
+        """补齐其他进程提交的产品变更"""
+        with self._build_lock:
+            if not self._built:
+                return
+            version = cache_versions.current('catalog')
+            if version <= self._version:
+                return
+            synced_at = datetime.utcnow()
+            with self._lock:
+                self._building = True
+
+            deleted = set()
+            try:
+                rows = (db.session.query(*self.columns)
+                        .filter(Product.updated_at >= self._synced_at - self.SYNC_MARGIN).all())
+                known = self._ids | {row[0] for row in rows}
+                if db.session.execute(select(func.count(Product.id))).scalar() != len(known):
+                    ids = set(db.session.execute(select(Product.id)).scalars())
+                    deleted = known - ids
+                    missing = list(ids - known)
+                    for start in range(0, len(missing), FETCH_CHUNK_SIZE):
+                        chunk = missing[start:start + FETCH_CHUNK_SIZE]
+                        rows += db.session.query(*self.columns).filter(Product.id.in_(chunk)).all()
+            except Exception:
+                with self._lock:
+                    self._building = False
+                    self._backlog = []
+                raise
+
+            with self._lock:
+                for row in rows:
+                    self._apply('update', row)
+                for product_id in deleted:
+                    self._apply('delete', (product_id,))
+                backlog, self._backlog = self._backlog, []
+                for op, data in backlog:
+                    self._apply(op, data)
+                self._version, self._synced_at = version, synced_at
+                self._building = False
+
+    def _apply(self, op, data):
+        self._remove(self._state, data[0])
+        if op == 'delete':
+            self._ids.discard(data[0])
+        else:
+            self._add(self._state, data)
+            self._ids.add(data[0])
+
+    def on_change(self, op, data):
+        """事务提交后同步单个产品的变更"""
+        with self._lock:
+            if self._building:
+                self._backlog.append((op, data))
+            elif self._built:
+                self._apply(op, data)
+
+    def snapshot(self, product):
+        """flush 时按 columns 的顺序取出产品字段"""
+        return tuple(getattr(product, column.key) for column in self.columns)
+
+    def register(self):
+        """订阅 Product 的变更事件"""
+        on_committed_change(Product, self.on_change, snapshot=self.snapshot)
+        return self
+
+
+class _NgramState:
+    def __init__(self):
+        self.postings = {'name': {}, 'sku': {}}
+        self.docs = {}
+
+
+class NgramIndex(ProductIndex):
+    """产品名称和货号的字符 n-gram 倒排索引"""
+
+    name = 'search_index'
+    label = '产品搜索索引'
+    columns = (Product.id, Product.name, Product.sku, Product.created_at)
+
+    def _new_state(self):
+        return _NgramState()
+
+    def _add(self, state, row):
+        product_id, name, sku, created_at = row
+        name, sku = normalize_text(name), normalize_text(sku)
+        state.docs[product_id] = (name, sku, created_at or datetime.min)
+        for field, text in (('name', name), ('sku', sku)):
+            for gram in _all_grams(text):
+                state.postings[field].setdefault(gram, set()).add(product_id)
+
+    def _remove(self, state, product_id):
+        doc = state.docs.pop(product_id, None)
+        if doc is None:
+            return
+        for field, text in (('name', doc[0]), ('sku', doc[1])):
+            for gram in _all_grams(text):
+                ids = state.postings[field].get(gram)
+                if ids is not None:
+                    ids.discard(product_id)
+                    if not ids:
+                        del state.postings[field][gram]
+
+    def _match_field(self, field, term):
+        grams = _grams(term)
+        if not grams:
+            return None
+        postings = self._state.postings[field]
+        sets = sorted((postings.get(g, set()) for g in grams), key=len)
+        candidates = set(sets[0])
+        for ids in sets[1:]:
+            candidates &= ids
+            if not candidates:
+                break
+        # 二元组交集只是候选集，需要再做一次子串校验
+        pos = 0 if field == 'name' else 1
+        docs = self._state.docs
+        return {pid for pid in candidates if term in docs[pid][pos]}
+
+    def match(self, q='', sku='', cursor=None, limit=None):
+        """返回名称包含 q 且货号包含 sku 的产品ID
+
+        默认按创建时间、ID倒序；传入 prev 方向的游标时按正序返回游标之前的产品。
+        指定 limit 时只取排在最前的 limit 个，避免对全部候选排序。
+        """
+        self.refresh()
+        with self._lock:
+            result = None
+            for field, term in (('name', normalize_text(q)), ('sku', normalize_text(sku))):
+                ids = self._match_field(field, term)
+                if ids is None:
+                    continue
+                result = ids if result is None else result & ids
+            if not result:
+                return []
+            docs = self._state.docs
+
+            def sort_key(pid):
+                return (docs[pid][2], pid)
+
+            backward = cursor is not None and cursor.direction == 'prev'
+            if cursor is not None:
+                if backward:
+                    result = [pid for pid in result if sort_key(pid) > cursor.key]
+                else:
+                    result = [pid for pid in result if sort_key(pid) < cursor.key]
+            if limit is not None and limit < len(result):
+                pick = heapq.nsmallest if backward else heapq.nlargest
+                return pick(limit, result, key=sort_key)
+            return sorted(result, key=sort_key, reverse=not backward)
+
+    @staticmethod
+    def _load(query, ids, chunk_size):
+        """按 ids 的顺序分批回表，批大小从 chunk_size 逐步翻倍到 FETCH_CHUNK_SIZE"""
+        start = 0
+        while start < len(ids):
+            chunk = ids[start:start + chunk_size]
+            start += len(chunk)
+            rank = {pid: i for i, pid in enumerate(chunk)}
+            rows = query.filter(Product.id.in_(chunk)).all()
+            yield from sorted(rows, key=lambda p: rank[p.id])
+            chunk_size = min(chunk_size * 2, FETCH_CHUNK_SIZE)
+
+    def iter_rows(self, query, q='', sku='', cursor=None):
+        """用索引命中的ID分批回表，按 match() 的顺序逐行产出
+
+        query 上的其他过滤条件（分类、条码等）和加载选项照常生效。
+        """
+        return self._load(query, self.match(q, sku, cursor), FETCH_CHUNK_SIZE)
+
+    def fetch(self, query, q='', sku='', limit=100, cursor=None):
+        """取索引命中的前 limit 个产品，结果按创建时间、ID倒序"""
+        chunk_size = min(limit, FETCH_CHUNK_SIZE)
+        ids = self.match(q, sku, cursor, limit=limit)
+        products = list(islice(self._load(query, ids, chunk_size), limit))
+        if len(products) < limit and len(ids) == limit:
+            # 分类、条码等条件淘汰了部分候选，改用完整的候选列表
+            ids = self.match(q, sku, cursor)
+            products = list(islice(self._load(query, ids, chunk_size), limit))
+        if cursor is not None and cursor.direction == 'prev':
+            products.reverse()
+        return products
+
+
+product_index = NgramIndex().register()
@@ -0,0 +1,117 @@
+"""
+系统设置缓存
+一次读出全部 SystemSetting 缓存在进程内，settings 版本号变化时重新加载，
+在一个 worker 中保存的设置其他 worker 最多 CACHE_VERSION_CHECK_INTERVAL 秒后生效。
+设置页面保存时用一条 INSERT ... ON CONFLICT DO UPDATE 批量写入。
+"""
+
+import threading
+from collections.abc import Mapping
+from datetime import datetime
+
+from sqlalchemy.dialects import postgresql, sqlite
+
+from cache_versions import bump, cache_versions
+from models import db, SystemSetting
+
+# 开关类设置，复选框不勾选时表单不会提交该字段，保存时按 false 处理
+BOOLEAN_SETTINGS = (
+    'enable_email', 'enable_sms',
+    'notify_new_order', 'notify_order_confirmed', 'notify_low_stock', 'enable_system_alerts',
+)
+
+# 留空表示不修改的密码类设置
+SECRET_SETTINGS = ('smtp_password', 'sms_secret_key')
+
+TRUE_VALUES = ('true', 'on', '1', 'yes')
+
+
+class Settings(Mapping):
+    """只读的设置快照，值为字符串，另提供按类型读取的方法"""
+
+    def __init__(self, values):
+        self._values = dict(values)
+
+    def __getitem__(self, key):
+        return self._values[key]
+
+    def __iter__(self):
+        return iter(self._values)
+
+    def __len__(self):
+        return len(self._values)
+
+    def get_bool(self, key, default=False):
+        value = self._values.get(key)
+        if value is None or value == '':
+            return default
+        return value.strip().lower() in TRUE_VALUES
+
+    def get_int(self, key, default=0):
+        try:
+            return int(self._values[key])
+        except (KeyError, TypeError, ValueError):
+            return default
+
+    def get_float(self, key, default=0.0):
+        try:
+            return float(self._values[key])
+        except (KeyError, TypeError, ValueError):
+            return default
+
+
+class SettingsCache:
+    """按 settings 版本号失效的系统设置缓存"""
+
+    VERSION_NAME = 'settings'
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._loaded_version = None
+        self._settings = Settings({})
+
+    def init_app(self, app):
+        with self._lock:
+            self._loaded_version = None
+        app.extensions['settings_cache'] = self
+
+    def snapshot(self):
+        """返回当前设置，需要在应用上下文中调用"""
+        version = cache_versions.current(self.VERSION_NAME)
+        if self._loaded_version != version:
+            with self._lock:
+                if self._loaded_version != version:
+                    rows = db.session.query(SystemSetting.key, SystemSetting.value).all()
+                    self._settings = Settings(rows)
+                    self._loaded_version = version
+        return self._settings
+
+    def save(self, values):
+        """批量写入设置并提交，已有的键更新，新键插入"""
+        if not values:
+            return
+        now = datetime.utcnow()
+        rows = [{'key': key, 'value': value, 'created_at': now, 'updated_at': now}
+                for key, value in values.items()]
+        dialect = db.session.get_bind().dialect.name
+        if dialect in ('postgresql', 'sqlite'):
+            insert = postgresql.insert if dialect == 'postgresql' else sqlite.insert
+            stmt = insert(SystemSetting).values(rows)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[SystemSetting.key],
+                set_={'value': stmt.excluded.value, 'updated_at': stmt.excluded.updated_at},
+            )
+            db.session.execute(stmt)
+        else:
+            existing = {s.key: s for s in SystemSetting.query.filter(SystemSetting.key.in_(values))}
+            for key, value in values.items():
+                if key in existing:
+                    existing[key].value = value
+                else:
+                    db.session.add(SystemSetting(key=key, value=value))
+        # 批量 INSERT 不触发模型事件，手动让各进程的缓存失效
+        bump(db.session, self.VERSION_NAME)
+        db.session.commit()
+
+
+settings_cache = SettingsCache()
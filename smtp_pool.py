@@ -0,0 +1,128 @@
+"""
+SMTP 连接池
+复用已登录的 SMTP 会话，避免每封邮件都重新建立连接、STARTTLS 和登录。
+空闲超过 noop_interval 的连接取出时先发 NOOP 检查，空闲超过 idle_timeout 的直接关闭；
+发送时连接已断开则重新连接再发一次。
+"""
+
+import smtplib
+import threading
+import time
+
+
+class SMTPPool:
+    """按服务器、账号区分的 SMTP 连接池，线程安全"""
+
+    def __init__(self, max_idle=4, idle_timeout=60.0, noop_interval=10.0, timeout=30.0):
+        self.max_idle = max_idle
+        self.idle_timeout = idle_timeout
+        self.noop_interval = noop_interval
+        self.timeout = timeout
+        self.connects = 0
+        self._lock = threading.Lock()
+        # key -> [(连接, 归还时间)]，后进先出
+        self._idle = {}
+
+    def init_app(self, app):
+        self.max_idle = app.config.get('SMTP_POOL_SIZE', self.max_idle)
+        self.idle_timeout = app.config.get('SMTP_POOL_IDLE_TIMEOUT', self.idle_timeout)
+        self.noop_interval = app.config.get('SMTP_NOOP_INTERVAL', self.noop_interval)
+        self.close_all()
+        app.extensions['smtp_pool'] = self
+
+    @staticmethod
+    def settings_key(settings):
+        return (
+            settings.get('smtp_server', 'smtp.example.com'),
+            int(settings.get('smtp_port', '587')),
+            settings.get('smtp_username', ''),
+            settings.get('smtp_password', ''),
+            settings.get('smtp_use_tls', 'true').lower() == 'true',
+        )
+
+    def _connect(self, key):
+        host, port, username, password, use_tls = key
+        server = smtplib.SMTP(host, port, timeout=self.timeout)
+        try:
+            if use_tls:
+                server.starttls()
+            server.login(username, password)
+        except Exception:
+            self._close(server)
+            raise
+        self.connects += 1
+        return server
+
+    @staticmethod
+    def _close(server):
+        try:
+            server.quit()
+        except Exception:
+            server.close()
+
+    def _checkout(self, key):
+        now = time.monotonic()
+        expired = []
+        with self._lock:
+            # 顺带清理所有账号下空闲太久的连接（包括设置修改前的旧账号）
+            for idle in self._idle.values():
+                expired.extend(server for server, returned in idle if now - returned > self.idle_timeout)
+                idle[:] = [(server, returned) for server, returned in idle if now - returned <= self.idle_timeout]
+            idle = self._idle.get(key, [])
+            entry = idle.pop() if idle else None
+        for server in expired:
+            self._close(server)
+
+        if entry is not None:
+            server, returned = entry
+            if now - returned <= self.noop_interval:
+                return server
+            try:
+                if server.noop()[0] == 250:
+                    return server
+            except OSError:
+                # SMTPException 也是 OSError 的子类
+                pass
+            self._close(server)
+        return self._connect(key)
+
+    def _checkin(self, key, server):
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < self.max_idle:
+                idle.append((server, time.monotonic()))
+                return
+        self._close(server)
+
+    def send(self, settings, msg):
+        """用池中的连接发送邮件，连接断开时重连重发一次"""
+        key = self.settings_key(settings)
+        for attempt in (1, 2):
+            server = self._checkout(key)
+            try:
+                server.send_message(msg)
+            except smtplib.SMTPServerDisconnected as e:
+                error = e
+            except smtplib.SMTPException:
+                # 服务器拒收（如 4xx/5xx），smtplib 已发送 RSET，连接仍可复用
+                self._checkin(key, server)
+                raise
+            except OSError as e:
+                error = e
+            else:
+                self._checkin(key, server)
+                return
+            # 连接已断开，换一个新连接重发
+            server.close()
+            if attempt == 2:
+                raise error
+
+    def close_all(self):
+        with self._lock:
+            servers = [server for idle in self._idle.values() for server, _ in idle]
+            self._idle.clear()
+        for server in servers:
+            self._close(server)
+
+
+smtp_pool = SMTPPool()
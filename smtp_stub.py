@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+本地 SMTP 桩服务
+只实现发信需要的最少命令，收到的邮件保存在内存里并打印，用于本地调试和测试通知投递。
+可以模拟慢速服务器（delay）、临时故障（fail_first，前 N 封返回 451）
+和服务器主动断开空闲连接（close_after，每个连接收满 N 封后断开）。
+
+用法: python smtp_stub.py [--port 1025] [--delay 0]
+然后把系统设置中的 smtp_server 设为 127.0.0.1、smtp_port 设为 1025、smtp_use_tls 设为 false。
+"""
+
+import argparse
+import socketserver
+import threading
+import time
+from email import message_from_bytes, policy
+
+
+class _SMTPHandler(socketserver.StreamRequestHandler):
+    def reply(self, line):
+        self.wfile.write(f'{line}\r\n'.encode('utf-8'))
+
+    def handle(self):
+        stub = self.server.stub
+        stub.connections += 1
+        received = 0
+        self.reply('220 smtp-stub ready')
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode('utf-8', 'replace').strip()
+            verb = command.split(' ', 1)[0].upper()
+            stub.commands.append(verb)
+            if verb in ('EHLO', 'HELO'):
+                self.wfile.write(b'250-smtp-stub\r\n250 AUTH PLAIN LOGIN\r\n')
+            elif verb == 'AUTH':
+                self.reply('235 2.7.0 Authentication successful')
+            elif verb in ('MAIL', 'RCPT', 'RSET', 'NOOP'):
+                self.reply('250 OK')
+            elif verb == 'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                data = []
+                while True:
+                    chunk = self.rfile.readline()
+                    if not chunk or chunk in (b'.\r\n', b'.\n'):
+                        break
+                    data.append(chunk[1:] if chunk.startswith(b'..') else chunk)
+                if stub.delay:
+                    time.sleep(stub.delay)
+                with stub.lock:
+                    failing = stub.fail_first > 0
+                    if failing:
+                        stub.fail_first -= 1
+                    else:
+                        stub.messages.append(message_from_bytes(b''.join(data), policy=policy.default))
+                if failing:
+                    self.reply('451 4.3.0 Temporary failure')
+                else:
+                    self.reply('250 OK queued')
+                    if stub.verbose:
+                        print(f"收到邮件: {stub.messages[-1]['Subject']}")
+                    received += 1
+                    if stub.close_after and received >= stub.close_after:
+                        return
+            elif verb == 'QUIT':
+                self.reply('221 Bye')
+                return
+            else:
+                self.reply('502 Command not implemented')
+
+
+class _Server(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class SMTPStub:
+    """在后台线程运行的 SMTP 桩，port=0 时自动分配端口"""
+
+    def __init__(self, host='127.0.0.1', port=0, delay=0.0, fail_first=0, close_after=0, verbose=False):
+        self.delay = delay
+        self.fail_first = fail_first
+        self.close_after = close_after
+        self.verbose = verbose
+        self.messages = []
+        self.commands = []
+        self.connections = 0
+        self.lock = threading.Lock()
+        self._server = _Server((host, port), _SMTPHandler)
+        self._server.stub = self
+        self.host, self.port = self._server.server_address[:2]
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='本地 SMTP 桩服务')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=1025)
+    parser.add_argument('--delay', type=float, default=0.0, help='每封邮件的处理延迟（秒）')
+    args = parser.parse_args()
+
+    stub = SMTPStub(args.host, args.port, delay=args.delay, verbose=True)
+    print(f"SMTP 桩服务监听 {stub.host}:{stub.port}，Ctrl+C 退出")
+    try:
+        stub._server.serve_forever()
+    except KeyboardInterrupt:
+        stub.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+多行订单测试
+验证整单校验、一次事务扣减全部库存、明细批量插入、每个订单一条通知，以及并发下单不超卖。
+"""
+
+import os
+import sys
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import pytest
+from sqlalchemy import event
+
+from models import db, Product, Order, OrderItem, SystemSetting, NotificationOutbox
+from orders import place_cart_order
+
+
+def make_cart_app(make_app, threads=4):
+    """每个线程一个连接的应用，带三个库存 50 的产品"""
+    app = make_app(SQLALCHEMY_ENGINE_OPTIONS={'pool_size': threads, 'max_overflow': 0,
+                                              'connect_args': {'timeout': 30}})
+    with app.app_context():
+        db.session.add(SystemSetting(key='enable_email', value='true'))
+        for i in range(1, 4):
+            db.session.add(Product(sku=f'CART-{i}', name=f'购物车产品{i}', retail_price=10.0 * i,
+                                   wholesale_price=8.0 * i, stock_quantity=50, is_active=True))
+        db.session.commit()
+    return app
+
+
+def stock_levels():
+    return {p.sku: p.stock_quantity for p in Product.query.order_by(Product.sku)}
+
+
+def test_cart_order_single_transaction(make_app):
+    app = make_cart_app(make_app)
+    client = app.test_client()
+    with app.app_context():
+        p1 = Product.query.filter_by(sku='CART-1').one()
+
+    # 首个请求会建表和默认数据，先跑掉再记录语句
+    client.get('/')
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+    response = client.post('/api/orders', json={
+        'customer_name': '批发客户',
+        'customer_phone': '13800000000',
+        'items': [
+            {'product_id': p1.id, 'quantity': 2},
+            {'sku': 'CART-3', 'quantity': 10},
+            {'sku': 'CART-2', 'quantity': 1},
+            {'product_id': p1.id, 'quantity': 3},
+        ],
+    })
+    with app.app_context():
+        event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+
+    assert response.status_code == 201
+    data = response.get_json()
+    assert [(item['sku'], item['quantity']) for item in data['items']] == [('CART-1', 5), ('CART-2', 1), ('CART-3', 10)]
+    # CART-3 达到批发数量，按批发价 24 计算
+    assert data['total_amount'] == 5 * 10.0 + 1 * 20.0 + 10 * 24.0
+    assert data['quantity'] == 16
+    assert sum(s.startswith('INSERT INTO order_item') for s in statements) == 1
+    # 下单不更新全局缓存版本号，并发订单不争用同一行
+    assert not [s for s in statements if 'cache_version' in s and not s.startswith('SELECT')]
+    # 先锁完全部产品行，再写其他共享行，加锁顺序与订单内容无关
+    writes = [s.split()[:3] for s in statements if s.startswith(('INSERT', 'UPDATE', 'DELETE'))]
+    assert writes[:3] == [['UPDATE', 'product', 'SET']] * 3
+    assert ['UPDATE', 'product', 'SET'] not in writes[3:]
+
+    with app.app_context():
+        assert stock_levels() == {'CART-1': 45, 'CART-2': 49, 'CART-3': 40}
+        assert NotificationOutbox.query.count() == 1
+
+
+def test_cart_order_all_or_nothing(make_app):
+    app = make_cart_app(make_app)
+    client = app.test_client()
+
+    response = client.post('/api/orders', json={
+        'customer_name': '批发客户', 'customer_phone': '13800000000',
+        'items': [{'sku': 'CART-1', 'quantity': 5}, {'sku': 'CART-2', 'quantity': 51}],
+    })
+    assert response.status_code == 409
+    assert response.get_json()['sku'] == 'CART-2'
+
+    response = client.post('/api/orders', json={
+        'customer_name': '批发客户', 'customer_phone': '13800000000',
+        'items': [{'sku': 'CART-1', 'quantity': 0}, {'sku': 'NOPE'}],
+    })
+    assert response.status_code == 400
+    assert len(response.get_json()['details']) == 2
+
+    response = client.post('/api/orders', json={
+        'customer_name': '批发客户', 'customer_phone': '13800000000',
+        'items': [{'product_id': [1]}, {'product_id': {}}, {'product_id': '1'}, {'product_id': True}],
+    })
+    assert response.status_code == 400
+    assert response.get_json()['details'] == [f'第 {i} 行 product_id 必须是整数' for i in range(1, 5)]
+
+    with app.app_context():
+        assert stock_levels() == {'CART-1': 50, 'CART-2': 50, 'CART-3': 50}
+        assert Order.query.count() == 0
+        assert OrderItem.query.count() == 0
+        assert NotificationOutbox.query.count() == 0
+
+
+def test_concurrent_carts_do_not_oversell(make_app):
+    """并发订单以不同顺序包含相同产品，库存正好用完"""
+    threads = 4
+    app = make_cart_app(make_app, threads)
+    placed = []
+    errors = []
+
+    def worker(reverse):
+        with app.app_context():
+            products = Product.query.order_by(Product.id).all()
+            if reverse:
+                products.reverse()
+            for _ in range(20):
+                try:
+                    order, _ = place_cart_order([(p, 1) for p in products], '并发客户', '13800000000')
+                except Exception as e:
+                    db.session.rollback()
+                    errors.append(e)
+                    continue
+                if order is not None:
+                    placed.append(order.id)
+
+    workers = [threading.Thread(target=worker, args=(i % 2 == 1,)) for i in range(threads)]
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+
+    assert not errors
+    assert len(placed) == 50
+    with app.app_context():
+        assert stock_levels() == {'CART-1': 0, 'CART-2': 0, 'CART-3': 0}
+        assert OrderItem.query.count() == 150
+
+
+if __name__ == '__main__':
+    sys.exit(pytest.main([__file__, '-q']))
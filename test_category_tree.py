@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+分类树测试
+验证后代ID集合、按父分类筛选包含全部子孙分类的产品、停用分类隐藏子树，
+成环的数据不会死循环，以及分类变更后树随 category 版本号重建。
+"""
+
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import pytest
+
+from models import db, Product, Category
+from category_tree import category_tree
+
+
+@pytest.fixture
+def app(make_app):
+    app = make_app(CACHE_VERSION_CHECK_INTERVAL=0)
+    with app.app_context():
+        food = Category(name='食品', sort_order=1)
+        daily = Category(name='日用', sort_order=2)
+        db.session.add_all([food, daily])
+        db.session.flush()
+        drink = Category(name='饮料', parent_id=food.id, sort_order=2)
+        snack = Category(name='零食', parent_id=food.id, sort_order=1)
+        db.session.add_all([drink, snack])
+        db.session.flush()
+        tea = Category(name='茶', parent_id=drink.id)
+        db.session.add(tea)
+        db.session.flush()
+        for sku, category in (('T-1', tea), ('D-1', drink), ('S-1', snack), ('F-1', food), ('H-1', daily)):
+            db.session.add(Product(sku=sku, name=f'分类产品{sku}', category_id=category.id))
+        db.session.commit()
+    return app
+
+
+def category_id(name):
+    return Category.query.filter_by(name=name).one().id
+
+
+def api_skus(client, **args):
+    response = client.get('/api/products', query_string=args)
+    return sorted(json.loads(line)['sku'] for line in response.get_data(as_text=True).splitlines())
+
+
+def test_subtree_ids(app):
+    with app.app_context():
+        ids = {name: category_id(name) for name in ('食品', '饮料', '零食', '茶', '日用')}
+        assert category_tree.subtree_ids(ids['食品']) == {ids['食品'], ids['饮料'], ids['零食'], ids['茶']}
+        assert category_tree.subtree_ids(ids['饮料']) == {ids['饮料'], ids['茶']}
+        assert category_tree.subtree_ids(ids['茶']) == {ids['茶']}
+        assert category_tree.subtree_ids(9999) == {9999}
+
+        # 按 sort_order 先序排列，depth 为层级
+        assert [(n.name, n.depth) for n in category_tree.active_categories()] == [
+            ('食品', 0), ('零食', 1), ('饮料', 1), ('茶', 2), ('日用', 0)]
+
+
+def test_filter_includes_descendants(app):
+    client = app.test_client()
+    with app.app_context():
+        food, drink, tea = category_id('食品'), category_id('饮料'), category_id('茶')
+    assert api_skus(client, category=food) == ['D-1', 'F-1', 'S-1', 'T-1']
+    assert api_skus(client, category=drink) == ['D-1', 'T-1']
+    assert api_skus(client, category=tea) == ['T-1']
+    assert api_skus(client, category='abc') == []
+
+    html = client.get('/search', query_string={'category': drink}).get_data(as_text=True)
+    assert 'T-1' in html and 'D-1' in html and 'S-1' not in html
+
+
+def test_changes_rebuild_tree(app):
+    with app.app_context():
+        food, drink = category_id('食品'), category_id('饮料')
+        assert category_tree.subtree_ids(food) == {food, drink, category_id('零食'), category_id('茶')}
+
+        # 把饮料移到日用下面，食品的子树随之变化
+        db.session.get(Category, drink).parent_id = category_id('日用')
+        db.session.commit()
+        assert category_tree.subtree_ids(food) == {food, category_id('零食')}
+
+        # 停用父分类时整棵子树都不展示
+        db.session.get(Category, category_id('日用')).is_active = False
+        db.session.commit()
+        assert [n.name for n in category_tree.active_categories()] == ['食品', '零食']
+
+        # 成环的分类仍能构建，子树包含环上的节点
+        db.session.get(Category, category_id('茶')).parent_id = category_id('饮料')
+        db.session.get(Category, drink).parent_id = category_id('茶')
+        db.session.commit()
+        assert category_tree.subtree_ids(drink) == {drink, category_id('茶')}
+
+
+if __name__ == '__main__':
+    sys.exit(pytest.main([__file__, '-q']))
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+统计页计数器测试
+验证产品、订单的新增、状态变更、删除都在同一事务内更新计数器，校对能发现并修正偏差。
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import pytest
+
+from models import db, Product, Order, DashboardCounter
+from orders import place_order
+import dashboard_counters
+
+
+@pytest.fixture
+def app(make_app):
+    return make_app()
+
+
+def test_counters_follow_changes(app):
+    with app.app_context():
+        products = [Product(sku=f'CNT-{i}', name=f'计数产品{i}', retail_price=10.0,
+                            wholesale_price=8.0, stock_quantity=100) for i in range(3)]
+        products[2].is_active = False
+        db.session.add_all(products)
+        db.session.commit()
+
+        first = place_order(products[0], 2, '张三', '13800000000')
+        second = place_order(products[1], 12, '李四', '13900000000')
+        counters = dashboard_counters.read_counters()
+        assert counters['products.total'] == 3
+        assert counters['products.active'] == 2
+        assert counters['orders.total'] == 2
+        assert counters['orders.pending'] == 2
+        assert counters['sales.total'] == 20.0 + 96.0
+
+        # 属性过期后直接赋值也要按旧状态扣减
+        db.session.expire_all()
+        first.status = 'confirmed'
+        second.status = 'cancelled'
+        products[0].is_active = False
+        db.session.commit()
+        counters = dashboard_counters.read_counters()
+        assert counters['orders.pending'] == 0
+        assert counters['orders.confirmed'] == 1
+        assert counters['orders.cancelled'] == 1
+        assert counters['sales.total'] == 20.0
+        assert counters['products.active'] == 1
+
+        db.session.delete(first)
+        db.session.delete(products[2])
+        db.session.commit()
+        counters = dashboard_counters.read_counters()
+        assert counters['orders.total'] == 1
+        assert counters['orders.confirmed'] == 0
+        assert counters['sales.total'] == 0
+        assert counters['products.total'] == 2
+
+        assert dashboard_counters.reconcile(apply=False) == []
+
+        # 回滚的事务不会留下计数
+        db.session.add(Product(sku='CNT-X', name='回滚产品'))
+        db.session.flush()
+        db.session.rollback()
+        assert dashboard_counters.read_counters()['products.total'] == 2
+
+
+def test_reconcile_reports_and_fixes_drift(app):
+    with app.app_context():
+        product = Product(sku='CNT-D', name='偏差产品', retail_price=5.0, stock_quantity=10)
+        db.session.add(product)
+        db.session.commit()
+        place_order(product, 1, '王五', '13700000000')
+
+        # 绕过 ORM 的写入不会更新计数器
+        db.session.execute(db.update(DashboardCounter)
+                           .where(DashboardCounter.name == 'orders.total').values(value=7))
+        db.session.execute(db.delete(DashboardCounter).where(DashboardCounter.name == 'sales.total'))
+        db.session.commit()
+
+        drift = dashboard_counters.reconcile(apply=False)
+        assert ('orders.total', 7, 1) in drift
+        assert ('sales.total', None, 5.0) in drift
+        assert dashboard_counters.read_counters()['orders.total'] == 7
+
+        assert dashboard_counters.reconcile() == drift
+        assert dashboard_counters.reconcile(apply=False) == []
+        assert dashboard_counters.read_counters()['sales.total'] == 5.0
+
+
+if __name__ == '__main__':
+    sys.exit(pytest.main([__file__, '-q']))
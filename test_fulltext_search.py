@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+SQLite FTS5 全文检索测试
+验证影子表在已有数据时回填，触发器在产品新增、改名、删除和批量 UPDATE 后保持同步，
+以及短关键词退回 ilike、结果按相关度排序。
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import pytest
+from sqlalchemy import text, update
+
+from models import db, Product
+from search_backends import SqliteFts5Backend, create_search_backend
+
+backend = SqliteFts5Backend()
+
+
+@pytest.fixture
+def app(make_app):
+    app = make_app(SEARCH_BACKEND='fulltext')
+    with app.app_context():
+        # 安装前已有的产品由 rebuild 回填
+        db.session.add_all([
+            Product(sku='FTS-001', name='不锈钢保温杯'),
+            Product(sku='FTS-002', name='陶瓷马克杯'),
+        ])
+        db.session.commit()
+    app.test_client().get('/')
+    return app
+
+
+def matches(q='', sku=''):
+    return sorted(p.sku for p in backend.filter(Product.query, q, sku))
+
+
+def check_integrity():
+    """FTS5 自检：影子表与 product 表不一致时抛出异常"""
+    db.session.execute(text("INSERT INTO product_fts(product_fts) VALUES ('integrity-check')"))
+
+
+def test_backend_selection():
+    assert isinstance(create_search_backend('fulltext', 'sqlite:///x.db'), SqliteFts5Backend)
+    assert create_search_backend('fulltext', 'mysql://u@h/db').name == 'ilike'
+    assert create_search_backend('unknown', 'sqlite:///x.db').name == 'ngram'
+
+
+def test_triggers_follow_writes(app):
+    with app.app_context():
+        assert matches('保温杯') == ['FTS-001']
+        check_integrity()
+
+        db.session.add(Product(sku='FTS-003', name='玻璃保温杯'))
+        db.session.commit()
+        assert matches('保温杯') == ['FTS-001', 'FTS-003']
+
+        # 改名后旧名称不再命中
+        Product.query.filter_by(sku='FTS-001').one().name = '不锈钢水壶'
+        db.session.commit()
+        assert matches('保温杯') == ['FTS-003']
+        assert matches('钢水壶') == ['FTS-001']
+
+        db.session.delete(Product.query.filter_by(sku='FTS-003').one())
+        db.session.commit()
+        assert matches('保温杯') == []
+
+        # 绕过 ORM 的批量 UPDATE 同样由触发器同步，只改价格时影子表不受影响
+        db.session.execute(update(Product).where(Product.sku == 'FTS-002')
+                           .values(name='陶瓷保温杯', sku='FTS-102'))
+        db.session.execute(update(Product).values(retail_price=9.9))
+        db.session.commit()
+        assert matches('保温杯') == ['FTS-102']
+        assert matches(sku='FTS-10') == ['FTS-102']
+        check_integrity()
+
+
+def test_short_terms_and_ranking(app):
+    with app.app_context():
+        db.session.add_all([
+            Product(sku='FTS-004', name='杯子'),
+            Product(sku='FTS-005', name='马克杯 马克杯 礼盒'),
+        ])
+        db.session.commit()
+        # 少于3个字符退回 ilike
+        assert matches('杯子') == ['FTS-004']
+        assert matches('杯') == ['FTS-001', 'FTS-002', 'FTS-004', 'FTS-005']
+
+        page = backend.paginate(Product.query, '马克杯', '', per_page=10)
+        assert [p.sku for p in page.items] == ['FTS-005', 'FTS-002']
+
+    html = app.test_client().get('/search?q=保温杯').get_data(as_text=True)
+    assert '不锈钢保温杯' in html and '陶瓷马克杯' not in html
+
+
+if __name__ == '__main__':
+    sys.exit(pytest.main([__file__, '-q']))
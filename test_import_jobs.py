@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+导入任务测试
+验证上传请求只暂存文件并创建任务，后台线程导入时进度和错误明细写回任务表，
+租约过期的任务从已提交的行继续，失败的任务保留暂存文件。
+"""
+
+import io
+import os
+import re
+import sys
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import pytest
+from openpyxl import Workbook
+
+from models import db, Product, ImportJob
+from import_jobs import import_job_runner
+
+
+def upload(client, data, filename, **form):
+    return client.post('/upload_product', data={'file': (io.BytesIO(data), filename), **form},
+                       content_type='multipart/form-data', headers={'Accept': 'application/json'})
+
+
+def test_upload_queues_job_and_reports_progress(make_app):
+    app = make_app()
+    client = app.test_client()
+    data = 'sku,name,barcode,retail_price\nJOB-1,任务产品,,5\nJOB-2,,,\nJOB-3,任务产品3,,abc\n'.encode('utf-8')
+    response = upload(client, data, 'products.csv')
+    assert response.status_code == 202
+    job = response.get_json()
+    assert job['status'] == 'pending'
+
+    # 请求返回时还没有导入，文件暂存在 UPLOAD_FOLDER/temp
+    with app.app_context():
+        path = db.session.get(ImportJob, job['id']).path
+        assert os.path.dirname(path) == os.path.join(app.config['UPLOAD_FOLDER'], 'temp')
+        assert os.path.exists(path)
+        assert Product.query.count() == 0
+        assert import_job_runner.run_pending() == 1
+        assert import_job_runner.run_pending() == 0
+        assert Product.query.filter_by(sku='JOB-1').one().retail_price == 5.0
+    assert not os.path.exists(path)
+
+    status = client.get(f"/api/import-jobs/{job['id']}").get_json()
+    assert status['status'] == 'done'
+    assert (status['rows_read'], status['inserted'], status['failed']) == (3, 1, 2)
+    assert [error['line'] for error in status['errors']] == [3, 4]
+    assert client.get('/api/import-jobs/999').status_code == 404
+
+    # 不带 Accept: application/json 的表单提交跳转回上传页显示进度
+    response = client.post('/upload_product', data={'file': (io.BytesIO(data), 'again.csv'), 'skip_existing': 'y'},
+                           content_type='multipart/form-data')
+    assert response.status_code == 302
+    assert 'job=' in response.headers['Location']
+    assert client.get(response.headers['Location']).status_code == 200
+    with app.app_context():
+        job = ImportJob.query.order_by(ImportJob.id.desc()).first()
+        assert job.skip_existing
+        import_job_runner.run_pending()
+        assert db.session.get(ImportJob, job.id).skipped == 1
+
+
+def test_upload_form_carries_csrf_token(make_app):
+    """默认开启 CSRF 保护，上传页面的表单（由 fetch 提交）需要带上令牌"""
+    app = make_app(WTF_CSRF_ENABLED=True)
+    client = app.test_client()
+    page = client.get('/upload_product').get_data(as_text=True)
+    token = re.search(r'name="csrf_token" value="([^"]+)"', page).group(1)
+    data = 'sku,name\nCSRF-1,令牌产品\n'.encode('utf-8')
+    assert upload(client, data, 'products.csv').status_code == 400
+    assert upload(client, data, 'products.csv', csrf_token=token).status_code == 202
+
+
+def test_excel_upload(make_app):
+    app = make_app()
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet('产品')
+    sheet.append(['货号', '品名', '零售价', '分类'])
+    sheet.append(['XL-1', '表格产品', 15, '分类A'])
+    buffer = io.BytesIO()
+    workbook.save(buffer)
+    response = upload(app.test_client(), buffer.getvalue(), 'products.xlsx')
+    assert response.status_code == 202
+    with app.app_context():
+        import_job_runner.run_pending()
+        product = Product.query.filter_by(sku='XL-1').one()
+        assert product.category.name == '分类A' and product.retail_price == 15.0
+
+
+def test_expired_lease_resumes_from_committed_rows(make_app):
+    app = make_app()
+    client = app.test_client()
+    data = 'sku,name\nRES-1,第一行\nRES-2,第二行\nRES-3,第三行\n'.encode('utf-8')
+    job_id = upload(client, data, 'resume.csv').get_json()['id']
+    with app.app_context():
+        # 模拟导入两行后进程崩溃
+        job = db.session.get(ImportJob, job_id)
+        job.status = 'running'
+        job.rows_read = 2
+        job.inserted = 2
+        job.lease_expires_at = datetime.utcnow() + timedelta(minutes=5)
+        db.session.commit()
+        assert import_job_runner.run_pending() == 0
+
+        job.lease_expires_at = datetime.utcnow() - timedelta(seconds=1)
+        db.session.commit()
+        assert import_job_runner.run_pending() == 1
+        assert [p.sku for p in Product.query.all()] == ['RES-3']
+        job = db.session.get(ImportJob, job_id)
+        assert (job.status, job.rows_read, job.inserted) == ('done', 3, 3)
+
+
+def test_reclaimed_job_stops_previous_runner(make_app):
+    """某一块超过租约、任务被其他线程重新认领后，原线程不再写回进度并停止导入"""
+    app = make_app(IMPORT_CHUNK_SIZE=1)
+    data = 'sku,name\nCLM-1,第一行\nCLM-2,第二行\nCLM-3,第三行\n'.encode('utf-8')
+    job_id = upload(app.test_client(), data, 'claim.csv').get_json()['id']
+    with app.app_context():
+        now = datetime.utcnow()
+        stale = import_job_runner._claim(job_id, now)
+        assert import_job_runner._claim(job_id, now) is None
+        fresh = import_job_runner._claim(job_id, now + timedelta(seconds=import_job_runner.lease + 1))
+        assert fresh not in (None, stale)
+
+        import_job_runner.run_job(job_id, stale)
+        job = db.session.get(ImportJob, job_id)
+        assert (job.status, job.rows_read, job.claim_token) == ('running', 0, fresh)
+        assert Product.query.count() == 1
+        assert os.path.exists(job.path)
+
+        import_job_runner.run_job(job_id, fresh)
+        db.session.expire_all()
+        job = db.session.get(ImportJob, job_id)
+        assert (job.status, job.rows_read) == ('done', 3)
+        assert Product.query.count() == 3
+
+
+def test_failed_job_keeps_spooled_file(make_app):
+    app = make_app()
+    job_id = upload(app.test_client(), 'name\n没有货号列\n'.encode('utf-8'), 'bad.csv').get_json()['id']
+    with app.app_context():
+        import_job_runner.run_pending()
+        job = db.session.get(ImportJob, job_id)
+        assert job.status == 'failed'
+        assert 'sku' in job.message
+        assert os.path.exists(job.path)
+
+
+if __name__ == '__main__':
+    sys.exit(pytest.main([__file__, '-q']))
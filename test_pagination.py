@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+游标分页测试
+验证游标编解码，以及数据库分页和 n-gram 索引分页向后、向前翻页时
+不重复、不遗漏，创建时间相同的产品按 ID 稳定排序。
+"""
+
+import os
+import sys
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import pytest
+
+from models import db, Product
+from pagination import Cursor, keyset_paginate
+from search_backends import IlikeBackend, NgramBackend
+
+PER_PAGE = 3
+
+
+@pytest.fixture
+def app(make_app):
+    app = make_app()
+    now = datetime.utcnow().replace(microsecond=0)
+    with app.app_context():
+        # 前 5 个产品创建时间相同，排序只能靠 ID 区分
+        db.session.add_all(Product(sku=f'PAGE-{i}', name=f'分页产品{i}',
+                                   created_at=now if i < 5 else now - timedelta(minutes=i))
+                           for i in range(8))
+        db.session.commit()
+    return app
+
+
+def expected_order():
+    products = Product.query.all()
+    products.sort(key=lambda p: (p.created_at, p.id), reverse=True)
+    return [p.id for p in products]
+
+
+def walk(paginate):
+    """从第一页一直向后翻到最后一页，再从最后一页向前翻回第一页"""
+    pages = [paginate(None)]
+    while pages[-1].has_next:
+        pages.append(paginate(Cursor.decode(pages[-1].next_cursor)))
+    forward = [[p.id for p in page.items] for page in pages]
+    assert not pages[0].has_prev
+
+    backward = [forward[-1]]
+    page = pages[-1]
+    while page.has_prev:
+        page = paginate(Cursor.decode(page.prev_cursor))
+        backward.insert(0, [p.id for p in page.items])
+    return forward, backward
+
+
+def test_cursor_round_trip():
+    cursor = Cursor(datetime(2024, 5, 1, 8, 30, 15, 123456), 42, 'prev')
+    decoded = Cursor.decode(cursor.encode())
+    assert (decoded.created_at, decoded.id, decoded.direction, decoded.rank) == (cursor.created_at, 42, 'prev', None)
+    ranked = Cursor.decode(Cursor(None, 7, rank=0.25).encode())
+    assert (ranked.key, ranked.direction) == ((0.25, 7), 'next')
+
+    for token in ('', 'not-base64!', Cursor(None, 1, 'sideways', rank=1.0).encode()):
+        assert Cursor.decode(token) is None
+
+
+@pytest.mark.parametrize('backend, q', [(IlikeBackend(), '分页'), (NgramBackend(), '分页'), (NgramBackend(), '')])
+def test_walk_pages(app, backend, q):
+    with app.app_context():
+        order = expected_order()
+        forward, backward = walk(lambda cursor: backend.paginate(Product.query, q, '', PER_PAGE, cursor))
+        assert [pid for page in forward for pid in page] == order
+        assert [len(page) for page in forward] == [3, 3, 2]
+        assert backward == forward
+
+
+def test_stable_when_rows_are_added(app):
+    with app.app_context():
+        first = keyset_paginate(Product.query, Product, PER_PAGE)
+        # 翻页期间新增的产品排在最前，不会把已看过的产品挤到下一页
+        db.session.add(Product(sku='PAGE-NEW', name='新产品', created_at=datetime.utcnow() + timedelta(hours=1)))
+        db.session.commit()
+        second = keyset_paginate(Product.query, Product, PER_PAGE, Cursor.decode(first.next_cursor))
+        assert not {p.id for p in first.items} & {p.id for p in second.items}
+        assert [p.id for p in first.items + second.items] == expected_order()[1:7]
+
+
+if __name__ == '__main__':
+    sys.exit(pytest.main([__file__, '-q']))
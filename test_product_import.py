@@ -0,0 +1,363 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+产品批量导入测试
+验证按块导入时每块的查询数固定、已有货号按 ON CONFLICT 更新、条码冲突按行报错，
+并且缓存、计数器与批量写入保持一致；CSV 流式读取内存占用不随文件增大，中断后可从断点继续；
+多进程校验与单进程结果一致；增量导入跳过没有变化的行，下架文件中缺失的产品。
+"""
+
+import io
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import pytest
+from sqlalchemy import event
+
+from models import db, Product, Category, ProductFingerprint
+from openpyxl import Workbook
+
+from product_import import (ImportCheckpoint, ProductImporter, RowError, iter_csv_rows,
+                            iter_excel_rows, map_header, normalize_row)
+import dashboard_counters
+from orders import place_order
+
+
+def make_rows(count, start=0, **extra):
+    rows = []
+    for i in range(start, start + count):
+        row = {'sku': f'IMP-{i:05d}', 'name': f'导入产品{i}', 'barcode': f'69{i:011d}',
+               'retail_price': '12.5', 'wholesale_price': '10', 'stock_quantity': '7',
+               'category': f'分类{i % 3}'}
+        row.update(extra)
+        rows.append((i + 2, row))
+    return rows
+
+
+def test_normalize_row():
+    assert map_header(['货号', '品名', '零售价格', 'extra']) == ['sku', 'name', 'retail_price', 'extra']
+    record = normalize_row({'sku': 1001.0, 'name': ' 毛巾 ', 'barcode': '', 'stock_quantity': '3.0'})
+    assert record['sku'] == '1001'
+    assert record['name'] == '毛巾'
+    assert record['barcode'] is None
+    assert record['stock_quantity'] == 3
+    assert record['spec'] == '' and record['retail_price'] is None
+    for raw in ({'sku': '', 'name': 'x'}, {'sku': 'A', 'name': 'x', 'retail_price': '-1'},
+                {'sku': 'A', 'name': 'x', 'stock_quantity': 'abc'}):
+        try:
+            normalize_row(raw)
+        except RowError:
+            continue
+        raise AssertionError(f'应当校验失败: {raw}')
+
+
+def test_chunked_upsert(make_app):
+    app = make_app()
+    with app.app_context():
+        statements = []
+        listener = lambda *args: statements.append(args[2])
+        event.listen(db.engine, 'before_cursor_execute', listener)
+        try:
+            stats = ProductImporter(chunk_size=50).run(make_rows(120))
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', listener)
+        assert (stats.read, stats.inserted, stats.updated, stats.failed) == (120, 120, 0, 0)
+        assert stats.rows_per_second > 0
+        assert Product.query.count() == 120
+        assert Category.query.count() == 3
+
+        # 查询数按块计，与行数无关
+        product_inserts = [s for s in statements if s.startswith('INSERT INTO product ')]
+        sku_lookups = [s for s in statements if s.startswith('SELECT product.sku, product.barcode')]
+        assert len(product_inserts) == 3
+        assert len(sku_lookups) == 3
+
+        # 再次导入：已有货号更新，不改变创建时间和上架状态
+        product = Product.query.filter_by(sku='IMP-00001').one()
+        created_at = product.created_at
+        product.is_active = False
+        db.session.commit()
+        stats = ProductImporter(chunk_size=50).run(make_rows(60, start=100, retail_price='20'))
+        assert (stats.inserted, stats.updated) == (40, 20)
+        db.session.expire_all()
+        updated = Product.query.filter_by(sku='IMP-00110').one()
+        assert updated.retail_price == 20.0
+        assert Product.query.filter_by(sku='IMP-00001').one().created_at == created_at
+
+        stats = ProductImporter(skip_existing=True).run(make_rows(5, retail_price='99'))
+        assert (stats.inserted, stats.updated, stats.skipped) == (0, 0, 5)
+        assert Product.query.filter_by(sku='IMP-00000').one().retail_price == 12.5
+
+        assert dashboard_counters.reconcile(apply=False) == []
+        assert dashboard_counters.read_counters()['products.total'] == 160
+
+
+def test_partial_columns_keep_other_fields(make_app):
+    """文件中没有的列不覆盖已有产品的数据"""
+    app = make_app()
+    with app.app_context():
+        ProductImporter().run(make_rows(2, description='原描述', spec='500ml'))
+        data = '货号,品名,库存\nIMP-00000,改名产品,3\nNEW-1,新产品,\n'.encode('utf-8')
+        stats = ProductImporter().run(iter_csv_rows(io.BytesIO(data)))
+        assert (stats.inserted, stats.updated) == (1, 1)
+        db.session.expire_all()
+        product = Product.query.filter_by(sku='IMP-00000').one()
+        assert (product.name, product.stock_quantity) == ('改名产品', 3)
+        assert (product.barcode, product.retail_price, product.wholesale_price) == ('6900000000000', 12.5, 10.0)
+        assert (product.spec, product.description, product.category.name) == ('500ml', '原描述', '分类0')
+        new = Product.query.filter_by(sku='NEW-1').one()
+        assert (new.barcode, new.spec, new.stock_quantity, new.category_id) == (None, '', 0, None)
+
+        # 文件中有的列为空时仍然清空
+        data = '货号,品名,条码,分类\nIMP-00001,导入产品1,,\n'.encode('utf-8')
+        ProductImporter().run(iter_csv_rows(io.BytesIO(data)))
+        db.session.expire_all()
+        product = Product.query.filter_by(sku='IMP-00001').one()
+        assert (product.barcode, product.category_id, product.spec) == (None, None, '500ml')
+        assert dashboard_counters.reconcile(apply=False) == []
+
+
+def test_row_errors(make_app):
+    app = make_app()
+    with app.app_context():
+        db.session.add(Product(sku='OLD-1', name='已有产品', barcode='6900000000001'))
+        db.session.commit()
+
+        rows = [
+            (2, {'sku': 'NEW-1', 'name': '条码被占用', 'barcode': '6900000000001'}),
+            (3, {'sku': 'NEW-2', 'name': '正常', 'barcode': '6900000000002'}),
+            (4, {'sku': 'NEW-3', 'name': '块内条码重复', 'barcode': '6900000000002'}),
+            (5, {'sku': '', 'name': '缺少货号'}),
+            (6, {'sku': 'NEW-4', 'name': '价格错误', 'retail_price': 'abc'}),
+            (7, {'sku': 'NEW-5', 'name': '旧名称'}),
+            (8, {'sku': 'NEW-5', 'name': '新名称'}),
+        ]
+        stats = ProductImporter().run(rows)
+        assert stats.inserted == 2
+        assert stats.failed == 4
+        assert stats.skipped == 1
+        assert [line for line, _ in sorted(stats.errors)] == [2, 4, 5, 6]
+        assert Product.query.filter_by(sku='NEW-5').one().name == '新名称'
+        assert dashboard_counters.reconcile(apply=False) == []
+
+
+def test_import_invalidates_lookup_cache(make_app):
+    app = make_app()
+    with app.app_context():
+        db.session.add(Product(sku='CACHE-1', name='旧名称', barcode='6911111111111'))
+        db.session.commit()
+    client = app.test_client()
+    assert client.get('/api/lookup?sku=CACHE-1').get_json()['name'] == '旧名称'
+    assert client.get('/api/lookup?barcode=6922222222222').status_code == 404
+
+    with app.app_context():
+        ProductImporter().run([
+            (2, {'sku': 'CACHE-1', 'name': '新名称', 'barcode': '6911111111111'}),
+            (3, {'sku': 'CACHE-2', 'name': '新产品', 'barcode': '6922222222222'}),
+        ])
+    assert client.get('/api/lookup?sku=CACHE-1').get_json()['name'] == '新名称'
+    assert client.get('/api/lookup?barcode=6922222222222').get_json()['sku'] == 'CACHE-2'
+
+
+def write_csv(path, count, start=0):
+    with open(path, 'w', encoding='utf-8-sig', newline='') as f:
+        f.write('货号,品名,条码,零售价,库存,分类\n')
+        for i in range(start, start + count):
+            f.write(f'CSV-{i:07d},流式产品{i},69{i:011d},9.9,5,分类{i % 5}\n')
+
+
+def test_csv_stream(tmp_path):
+    data = '\ufeff货号,品名,描述\r\nA-1,毛巾,"两行\n描述"\r\n\r\nA-2,牙刷,\r\n'.encode('utf-8')
+    rows = list(iter_csv_rows(io.BytesIO(data)))
+    assert [row['sku'] for _, row in rows] == ['A-1', 'A-2']
+    assert rows[0][1]['description'] == '两行\n描述'
+    assert [row['sku'] for _, row in iter_csv_rows(io.BytesIO(data), start=1)] == ['A-2']
+    try:
+        list(iter_csv_rows(io.BytesIO('品名\n毛巾\n'.encode('utf-8'))))
+    except ValueError as e:
+        assert 'sku' in str(e)
+    else:
+        raise AssertionError('缺少货号列应当报错')
+
+    # 峰值内存与文件行数无关
+    directory = str(tmp_path)
+    peaks = []
+    for count in (10000, 100000):
+        path = os.path.join(directory, f'{count}.csv')
+        write_csv(path, count)
+        tracemalloc.start()
+        with open(path, 'rb') as f:
+            assert sum(1 for _ in iter_csv_rows(f)) == count
+        peaks.append(tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    assert peaks[1] < peaks[0] * 2 + 64 * 1024
+
+
+def test_resume_from_checkpoint(make_app, tmp_path):
+    app = make_app()
+    directory = str(tmp_path)
+    path = os.path.join(directory, 'feed.csv')
+    write_csv(path, 250)
+    checkpoint = ImportCheckpoint(os.path.join(directory, 'feed.checkpoint'), path)
+
+    class Crash(Exception):
+        pass
+
+    def crash_after_two_chunks(stats):
+        checkpoint.save(stats.read)
+        if stats.read >= 200:
+            raise Crash()
+
+    with app.app_context():
+        try:
+            with open(path, 'rb') as f:
+                ProductImporter(chunk_size=100, progress=crash_after_two_chunks).run(iter_csv_rows(f))
+        except Crash:
+            pass
+        assert checkpoint.load() == 200
+        assert Product.query.count() == 200
+
+        start = checkpoint.load()
+        with open(path, 'rb') as f:
+            stats = ProductImporter(chunk_size=100).run(iter_csv_rows(f, start=start))
+        assert (stats.read, stats.inserted, stats.updated) == (50, 50, 0)
+        assert Product.query.count() == 250
+        assert dashboard_counters.reconcile(apply=False) == []
+
+    # 源文件改变后断点作废
+    write_csv(path, 10, start=1000)
+    assert ImportCheckpoint(checkpoint.path, path).load() == 0
+    checkpoint.clear()
+    assert not os.path.exists(checkpoint.path)
+
+
+def make_xlsx(target, rows):
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet('产品')
+    sheet.append([])
+    sheet.append(['货号', '品名', '条码', '零售价格', '库存数量', '分类', '备注'])
+    for row in rows:
+        sheet.append(row)
+    workbook.save(target)
+
+
+def test_excel_rows(tmp_path):
+    path = str(tmp_path / 'products.xlsx')
+    make_xlsx(path, [
+        [1001, '毛巾', 6901234567890, 9.9, 10, '日用品', '忽略'],
+        [None, None, None, None, None, None, None],
+        ['X-2', '牙刷', None, None, 3.0, None, None],
+    ])
+    rows = list(iter_excel_rows(path))
+    assert [line for line, _ in rows] == [3, 5]
+    records = [normalize_row(row) for _, row in rows]
+    assert records[0]['sku'] == '1001'
+    assert records[0]['barcode'] == '6901234567890'
+    assert records[0]['retail_price'] == 9.9 and records[0]['category'] == '日用品'
+    assert records[1]['barcode'] is None and records[1]['stock_quantity'] == 3
+    assert [row['sku'] for _, row in iter_excel_rows(path, start=1)] == ['X-2']
+
+
+def test_parallel_normalization(make_app, tmp_path):
+    app = make_app()
+    directory = str(tmp_path)
+    path = os.path.join(directory, 'parallel.csv')
+    write_csv(path, 950)
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write('CSV-BAD,价格错误,,abc,1,分类0\n')
+    offsets = []
+    with app.app_context():
+        with open(path, 'rb') as f:
+            stats = ProductImporter(chunk_size=100, workers=2,
+                                    progress=lambda stats: offsets.append(stats.read)).run(iter_csv_rows(f))
+        assert (stats.read, stats.inserted, stats.failed) == (951, 950, 1)
+        assert stats.errors[0][0] == 952
+        # 各块按文件顺序提交，断点行数连续递增
+        assert offsets == list(range(100, 951, 100)) + [951]
+        assert Product.query.count() == 950
+        assert dashboard_counters.reconcile(apply=False) == []
+
+
+def test_delta_import(make_app):
+    app = make_app()
+    with app.app_context():
+        ProductImporter(chunk_size=50).run(make_rows(100))
+        assert ProductFingerprint.query.count() == 100
+
+        # 没有变化的块只有查询，不写入
+        statements = []
+        listener = lambda *args: statements.append(args[2])
+        event.listen(db.engine, 'before_cursor_execute', listener)
+        try:
+            stats = ProductImporter(chunk_size=50, delta=True).run(make_rows(100))
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', listener)
+        assert (stats.read, stats.unchanged, stats.inserted, stats.updated) == (100, 100, 0, 0)
+        assert not [s for s in statements if s.startswith(('INSERT', 'UPDATE', 'DELETE'))]
+
+        # 只写入变化的行和新行
+        rows = make_rows(100) + make_rows(5, start=100)
+        rows[3][1]['retail_price'] = '15'
+        rows[7][1]['category'] = '新分类'
+        stats = ProductImporter(chunk_size=50, delta=True).run(rows)
+        assert (stats.unchanged, stats.updated, stats.inserted) == (98, 2, 5)
+        assert Product.query.filter_by(sku='IMP-00003').one().retail_price == 15.0
+        assert Product.query.filter_by(sku='IMP-00007').one().category.name == '新分类'
+
+        # 后台修改过的产品下次导入一定写入
+        product = Product.query.filter_by(sku='IMP-00010').one()
+        product.name = '后台改名'
+        db.session.commit()
+        assert ProductFingerprint.query.filter_by(sku='IMP-00010').one().digest is None
+        stats = ProductImporter(chunk_size=50, delta=True).run(rows)
+        assert (stats.unchanged, stats.updated) == (104, 1)
+        db.session.expire_all()
+        assert Product.query.filter_by(sku='IMP-00010').one().name == '导入产品10'
+
+        # 下单扣减库存绕过 ORM 事件，增量导入按当前库存判断，库存恢复为文件中的值
+        place_order(Product.query.filter_by(sku='IMP-00020').one(), 2, '增量客户', '13800000000')
+        assert Product.query.filter_by(sku='IMP-00020').one().stock_quantity == 5
+        stats = ProductImporter(chunk_size=50, delta=True).run(rows)
+        assert (stats.unchanged, stats.updated) == (104, 1)
+        db.session.expire_all()
+        assert Product.query.filter_by(sku='IMP-00020').one().stock_quantity == 7
+        assert dashboard_counters.reconcile(apply=False) == []
+
+
+def test_deactivate_missing(make_app):
+    app = make_app()
+    with app.app_context():
+        db.session.add(Product(sku='MANUAL-1', name='后台下架', is_active=False))
+        db.session.commit()
+        ProductImporter(chunk_size=50).run(make_rows(100))
+
+        # 校验失败的行也算出现在文件中，不下架
+        rows = make_rows(90)
+        rows.append((200, {'sku': 'IMP-00095', 'name': '价格错误', 'retail_price': 'abc'}))
+        stats = ProductImporter(chunk_size=50, delta=True, deactivate_missing=True).run(rows)
+        assert (stats.unchanged, stats.failed, stats.deactivated) == (90, 1, 9)
+        assert Product.query.filter_by(is_active=True).count() == 91
+        assert Product.query.filter_by(sku='IMP-00095').one().is_active
+        assert dashboard_counters.reconcile(apply=False) == []
+
+        # 被下架的产品再次出现时重新上架，后台下架的产品不受影响
+        rows = make_rows(100) + [(300, {'sku': 'MANUAL-1', 'name': '后台下架'})]
+        stats = ProductImporter(chunk_size=50, delta=True, deactivate_missing=True).run(rows)
+        assert (stats.updated, stats.deactivated) == (10, 0)
+        assert Product.query.filter_by(is_active=True).count() == 100
+        assert not Product.query.filter_by(sku='MANUAL-1').one().is_active
+        assert dashboard_counters.reconcile(apply=False) == []
+        assert dashboard_counters.read_counters()['products.active'] == 100
+
+        # 空文件不下架任何产品
+        stats = ProductImporter(deactivate_missing=True).run([])
+        assert stats.deactivated == 0
+        assert Product.query.filter_by(is_active=True).count() == 100
+
+
+if __name__ == '__main__':
+    sys.exit(pytest.main([__file__, '-q']))
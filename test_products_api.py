@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+产品 NDJSON 接口测试
+验证 /api/products 以流式响应逐行输出 JSON，各搜索后端的筛选结果一致，
+默认不含下架产品，结果数量超过批大小时也完整输出。
+"""
+
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import pytest
+
+from models import db, Product, Category
+
+PRODUCTS = 25
+
+
+@pytest.fixture(params=['ngram', 'ilike', 'fulltext'])
+def app(make_app, request):
+    # 批大小小于结果数量，验证跨批输出
+    app = make_app(SEARCH_BACKEND=request.param, API_STREAM_BATCH_SIZE=4)
+    with app.app_context():
+        category = Category(name='接口分类')
+        db.session.add(category)
+        db.session.flush()
+        db.session.add_all(Product(sku=f'API-{i:03d}', barcode=f'69{i:011d}', name=f'接口产品{i}',
+                                   retail_price=float(i), is_active=i % 5 != 0,
+                                   category_id=category.id if i % 2 else None)
+                           for i in range(PRODUCTS))
+        db.session.commit()
+    # 第一次请求安装搜索后端（FTS5 影子表等）
+    app.test_client().get('/')
+    return app
+
+
+def read_lines(response):
+    assert response.status_code == 200
+    assert response.mimetype == 'application/x-ndjson'
+    body = response.get_data(as_text=True)
+    assert body == '' or body.endswith('\n')
+    return [json.loads(line) for line in body.splitlines()]
+
+
+def test_streams_products(app):
+    client = app.test_client()
+    response = client.get('/api/products', buffered=False)
+    assert response.is_streamed
+    # 先取到第一行，再读完其余部分
+    chunks = iter(response.response)
+    first = json.loads(next(chunks))
+    rest = [json.loads(line) for chunk in chunks for line in chunk.decode('utf-8').splitlines()]
+    response.close()
+    products = [first] + rest
+    assert len(products) == PRODUCTS - PRODUCTS // 5
+    assert all(p['is_active'] for p in products)
+    assert len({p['id'] for p in products}) == len(products)
+
+    with_category = next(p for p in products if p['sku'] == 'API-001')
+    assert with_category['category_name'] == '接口分类'
+    assert next(p for p in products if p['sku'] == 'API-002')['category_name'] is None
+
+    everything = read_lines(client.get('/api/products?include_inactive=true'))
+    assert len(everything) == PRODUCTS
+
+
+def test_filters(app):
+    client = app.test_client()
+    assert [p['sku'] for p in read_lines(client.get('/api/products?q=接口产品12'))] == ['API-012']
+    assert sorted(p['sku'] for p in read_lines(client.get('/api/products?sku=API-01'))) == [
+        'API-011', 'API-012', 'API-013', 'API-014', 'API-016', 'API-017', 'API-018', 'API-019']
+    assert [p['sku'] for p in read_lines(client.get('/api/products?barcode=6900000000007'))] == ['API-007']
+    assert read_lines(client.get('/api/products?q=不存在的产品')) == []
+
+
+if __name__ == '__main__':
+    sys.exit(pytest.main([__file__, '-q']))
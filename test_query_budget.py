@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+SQL 查询预算测试
+逐个请求常用路由，用 before_cursor_execute 统计每个请求执行的语句数，
+与路由上 @query_budget 声明的预算比较。模板或序列化中新增的延迟加载（N+1）会让这里失败。
+数据量取得比每页条数更多，逐行查询一定会超出预算。
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import pytest
+from sqlalchemy import event
+
+from models import db, Product, Category
+from orders import place_order
+from query_budget import budget_for
+
+# 必须声明预算的路由
+REQUIRED_ENDPOINTS = ('search', 'product_detail', 'order', 'statistics', 'settings')
+
+
+@pytest.fixture
+def app(make_app):
+    app = make_app()
+    with app.app_context():
+        categories = [Category(name=f'预算分类{i}') for i in range(3)]
+        db.session.add_all(categories)
+        db.session.flush()
+        products = [Product(sku=f'BUD-{i:03d}', barcode=f'6901{i:09d}', name=f'预算产品{i}',
+                            retail_price=10.0, wholesale_price=8.0, stock_quantity=100,
+                            category_id=categories[i % 3].id) for i in range(40)]
+        db.session.add_all(products)
+        db.session.commit()
+        for product in products[:15]:
+            place_order(product, 1, '张三', '13800000000')
+    return app
+
+
+def count_statements(app, func):
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        response = func()
+        # 流式响应在读取响应体时才执行查询
+        response.get_data()
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+    return response, statements
+
+
+def check_budget(app, client, method, url, data=None, json=None):
+    """发送请求并断言语句数不超过该路由的预算，返回实际语句数"""
+    with app.test_request_context(url, method=method):
+        from flask import request
+        endpoint = request.url_rule.endpoint
+    limit = budget_for(app.view_functions[endpoint], method)
+    assert limit is not None, f'{endpoint} 没有声明查询预算'
+
+    response, statements = count_statements(
+        app, lambda: client.open(url, method=method, data=data, json=json))
+    assert response.status_code < 400, f'{method} {url} 返回 {response.status_code}'
+    detail = '\n'.join('    ' + ' '.join(s.split())[:160] for s in statements)
+    assert len(statements) <= limit, \
+        f'{method} {url} ({endpoint}) 执行了 {len(statements)} 条 SQL，预算 {limit} 条:\n{detail}'
+    return len(statements)
+
+
+def hot_requests(product_id):
+    return [
+        ('GET', '/search?q=预算产品', None, None),
+        ('GET', '/search?sku=BUD-0', None, None),
+        ('GET', '/search?barcode=6901000000003', None, None),
+        ('GET', '/search?category=1&q=预算', None, None),
+        ('GET', f'/product/{product_id}', None, None),
+        ('GET', f'/order/{product_id}', None, None),
+        ('POST', f'/order/{product_id}', {'quantity': 2, 'customer_name': '李四', 'customer_phone': '13900000000'}, None),
+        ('POST', '/api/orders', None, {'customer_name': '王五', 'customer_phone': '13700000000',
+                                       'items': [{'sku': 'BUD-001', 'quantity': 1}, {'sku': 'BUD-002', 'quantity': 12},
+                                                 {'sku': 'BUD-003', 'quantity': 3}]}),
+        ('GET', '/statistics', None, None),
+        ('GET', '/statistics?range=30d', None, None),
+        ('GET', '/settings', None, None),
+        ('POST', '/settings', {'smtp_server': 'mail.example.com', 'enable_email': 'on'}, None),
+        ('GET', '/settings', None, None),
+        ('GET', '/api/lookup?sku=BUD-005', None, None),
+        ('GET', '/api/products?q=预算', None, None),
+        ('GET', '/api/top-products?range=7d', None, None),
+        ('GET', '/export/orders', None, None),
+    ]
+
+
+def test_routes_stay_within_budget(app):
+    client = app.test_client()
+    # 第一次请求触发 create_tables 和内存索引构建，不计入
+    client.get('/search?q=x')
+    with app.app_context():
+        product_id = Product.query.filter_by(sku='BUD-000').one().id
+
+    for endpoint in REQUIRED_ENDPOINTS:
+        assert budget_for(app.view_functions[endpoint], 'GET') is not None, f'{endpoint} 没有声明查询预算'
+
+    for method, url, data, json in hot_requests(product_id):
+        used = check_budget(app, client, method, url, data, json)
+        print(f"{method} {url}: {used} 条")
+
+
+def test_over_budget_is_reported(app):
+    client = app.test_client()
+    client.get('/search?q=x')
+    view = app.view_functions['statistics']
+    original = view.query_budget
+    view.query_budget = {'default': 1}
+    try:
+        check_budget(app, client, 'GET', '/statistics')
+    except AssertionError as e:
+        assert '预算 1 条' in str(e)
+    else:
+        raise AssertionError('超出预算没有被发现')
+    finally:
+        view.query_budget = original
+
+
+if __name__ == '__main__':
+    sys.exit(pytest.main([__file__, '-q']))
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+页面响应缓存测试
+验证搜索页重复请求走缓存并返回相同的强 ETag，带 If-None-Match 时返回 304，
+查询参数顺序和空值不影响缓存键，本进程或其他进程修改产品后 ETag 变化，时间段切换后重新渲染。
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import pytest
+from sqlalchemy import create_engine, event, update
+
+from models import db, Product, CacheVersion
+from response_cache import response_cache
+
+
+@pytest.fixture
+def app(make_app):
+    # 时间段固定，页面只随版本号失效；每次请求都读版本号
+    app = make_app(RESPONSE_CACHE_TTL=0, CACHE_VERSION_CHECK_INTERVAL=0)
+    with app.app_context():
+        db.session.add(Product(sku='ETAG-1', name='缓存产品', retail_price=12.0))
+        db.session.commit()
+    app.test_client().get('/')
+    return app
+
+
+def get_search(app, client, url='/search?q=缓存产品', **headers):
+    """请求页面，返回 (响应, 执行的查询 product 表的 SELECT 条数)"""
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if 'FROM product' in statement:
+            statements.append(statement)
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        response = client.get(url, headers=headers)
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+    return response, len(statements)
+
+
+def test_cached_page_and_etag(app):
+    client = app.test_client()
+    first, queries = get_search(app, client)
+    assert first.status_code == 200 and queries > 0
+    etag = first.headers['ETag']
+    assert first.headers['Cache-Control'] == 'no-cache'
+    assert '缓存产品' in first.get_data(as_text=True)
+
+    # 参数顺序和空参数不影响缓存键，命中后不再查产品
+    second, queries = get_search(app, client, '/search?sku=&q=缓存产品&barcode=')
+    assert (second.headers['ETag'], queries) == (etag, 0)
+    assert second.get_data() == first.get_data()
+
+    revalidated, queries = get_search(app, client, **{'If-None-Match': etag})
+    assert (revalidated.status_code, revalidated.data, queries) == (304, b'', 0)
+    assert revalidated.headers['ETag'] == etag
+
+    other, _ = get_search(app, client, '/search?q=其他')
+    assert other.headers['ETag'] != etag
+    assert get_search(app, client, **{'If-None-Match': '"stale"'})[0].status_code == 200
+
+
+def test_catalog_changes_invalidate(app):
+    client = app.test_client()
+    etag = get_search(app, client)[0].headers['ETag']
+
+    with app.app_context():
+        Product.query.filter_by(sku='ETAG-1').one().retail_price = 15.5
+        db.session.commit()
+    response, queries = get_search(app, client, **{'If-None-Match': etag})
+    assert response.status_code == 200 and queries > 0
+    assert response.headers['ETag'] != etag
+    assert '15.5' in response.get_data(as_text=True)
+
+    # 其他进程提交的修改只体现为版本号加一
+    etag = response.headers['ETag']
+    with app.app_context():
+        engine = create_engine(app.config['SQLALCHEMY_DATABASE_URI'])
+    with engine.begin() as conn:
+        conn.execute(update(Product).where(Product.sku == 'ETAG-1').values(name='改名产品'))
+        conn.execute(update(CacheVersion).where(CacheVersion.name == 'catalog')
+                     .values(version=CacheVersion.version + 1))
+    engine.dispose()
+    response, _ = get_search(app, client, '/search?q=改名产品', **{'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+    assert '改名产品' in response.get_data(as_text=True)
+
+
+def test_period_rollover(app, monkeypatch):
+    client = app.test_client()
+    etag = get_search(app, client)[0].headers['ETag']
+    # 进入下一个时间段（库存数量可能已变），所有进程同时换 ETag
+    monkeypatch.setattr(response_cache, 'period', lambda: 1)
+    response, queries = get_search(app, client, **{'If-None-Match': etag})
+    assert response.status_code == 200 and queries > 0
+    assert response.headers['ETag'] != etag
+
+
+if __name__ == '__main__':
+    sys.exit(pytest.main([__file__, '-q']))
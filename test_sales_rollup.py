@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+每日销量汇总测试
+验证下单、取消、恢复、删除订单时汇总随同一事务更新，热销排行按时间范围只读汇总表。
+"""
+
+import os
+import sys
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import pytest
+from sqlalchemy import event
+
+from models import db, Product, Order
+from orders import place_cart_order
+import sales_rollup
+
+
+@pytest.fixture
+def app(make_app):
+    app = make_app()
+    with app.app_context():
+        for i in range(1, 4):
+            db.session.add(Product(sku=f'TOP-{i}', name=f'热销产品{i}', retail_price=10.0 * i,
+                                   wholesale_price=8.0 * i, stock_quantity=1000))
+        db.session.commit()
+    return app
+
+
+def ranking(days):
+    return [(row.product.sku, row.units, row.revenue, row.order_count)
+            for row in sales_rollup.top_products(days)]
+
+
+def test_rollup_follows_orders(app):
+    with app.app_context():
+        p1, p2, p3 = Product.query.order_by(Product.sku).all()
+        first, _ = place_cart_order([(p1, 2), (p2, 1)], '张三', '13800000000')
+        second, _ = place_cart_order([(p2, 12)], '李四', '13900000000')
+        # 后台直接创建、没有明细的订单按订单头计入
+        db.session.add(Order(product_id=p3.id, quantity=3, total_amount=90.0))
+        db.session.commit()
+
+        assert ranking(1) == [('TOP-2', 13, 20.0 + 192.0, 2), ('TOP-3', 3, 90.0, 1), ('TOP-1', 2, 20.0, 1)]
+
+        # 取消后从排行中扣除，恢复后重新计入
+        db.session.expire_all()
+        second.status = 'cancelled'
+        db.session.commit()
+        assert ranking(1)[0] == ('TOP-3', 3, 90.0, 1)
+        second.status = 'confirmed'
+        db.session.commit()
+        assert ranking(1)[0] == ('TOP-2', 13, 212.0, 2)
+
+        db.session.delete(first)
+        db.session.commit()
+        assert ranking(1) == [('TOP-2', 12, 192.0, 1), ('TOP-3', 3, 90.0, 1)]
+
+        assert sales_rollup.reconcile(apply=False) == []
+
+
+def test_ranges_read_only_rollup(app):
+    with app.app_context():
+        p1, p2, p3 = Product.query.order_by(Product.sku).all()
+        now = datetime.utcnow()
+        db.session.add_all([
+            Order(product_id=p1.id, quantity=5, total_amount=50.0, created_at=now),
+            Order(product_id=p2.id, quantity=8, total_amount=160.0, created_at=now - timedelta(days=3)),
+            Order(product_id=p3.id, quantity=20, total_amount=600.0, created_at=now - timedelta(days=20)),
+            Order(product_id=p3.id, quantity=99, total_amount=990.0, created_at=now - timedelta(days=40)),
+        ])
+        db.session.commit()
+
+        statements = []
+
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+        try:
+            today = ranking(sales_rollup.RANGES['today'])
+            week = ranking(sales_rollup.RANGES['7d'])
+            month = ranking(sales_rollup.RANGES['30d'])
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+
+        assert [sku for sku, *_ in today] == ['TOP-1']
+        assert [sku for sku, *_ in week] == ['TOP-2', 'TOP-1']
+        assert [sku for sku, *_ in month] == ['TOP-3', 'TOP-2', 'TOP-1']
+        assert len(statements) == 3
+        assert not any('"order"' in s for s in statements)
+
+    client = app.test_client()
+    response = client.get('/api/top-products?range=30d&limit=1')
+    assert response.status_code == 200
+    assert [p['sku'] for p in response.get_json()['products']] == ['TOP-3']
+    assert client.get('/api/top-products?range=1y').status_code == 400
+
+
+def test_reconcile_rebuilds_rollup(app):
+    with app.app_context():
+        p1 = Product.query.filter_by(sku='TOP-1').one()
+        place_cart_order([(p1, 4)], '王五', '13700000000')
+        db.session.execute(db.delete(sales_rollup.ProductSalesDaily))
+        db.session.commit()
+        assert ranking(30) == []
+
+        drift = sales_rollup.reconcile(apply=False)
+        assert len(drift) == 1 and drift[0][1] is None
+        assert sales_rollup.reconcile() == drift
+        assert ranking(30) == [('TOP-1', 4, 40.0, 1)]
+
+
+if __name__ == '__main__':
+    sys.exit(pytest.main([__file__, '-q']))
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+n-gram 搜索索引测试
+验证名称/货号匹配和回表顺序，本进程增删改后索引即时同步，
+以及其他进程直接写库并让 catalog 版本号加一后，查询前能补齐变更。
+"""
+
+import os
+import sys
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import pytest
+from sqlalchemy import create_engine, delete, insert, update
+
+from models import db, Product, CacheVersion
+from pagination import Cursor
+from search_index import product_index
+
+
+@pytest.fixture
+def app(make_app):
+    # 每次查询都读版本号，其他进程的写入立即可见
+    app = make_app(CACHE_VERSION_CHECK_INTERVAL=0)
+    now = datetime.utcnow()
+    with app.app_context():
+        db.session.add_all([
+            Product(sku='TEA-001', name='西湖龙井', created_at=now - timedelta(minutes=3)),
+            Product(sku='TEA-002', name='龙井茶礼盒', created_at=now - timedelta(minutes=2)),
+            Product(sku='CUP-001', name='玻璃茶杯', created_at=now - timedelta(minutes=1)),
+        ])
+        db.session.commit()
+    return app
+
+
+def names(ids):
+    return [db.session.get(Product, pid).name for pid in ids]
+
+
+def test_match_and_fetch(app):
+    with app.app_context():
+        # 结果按创建时间倒序，名称和货号条件取交集，大小写不敏感
+        assert names(product_index.match(q='龙井')) == ['龙井茶礼盒', '西湖龙井']
+        assert names(product_index.match(q='茶')) == ['玻璃茶杯', '龙井茶礼盒']
+        assert names(product_index.match(q='龙井', sku='tea-001')) == ['西湖龙井']
+        assert product_index.match(q='井龙') == []
+        assert product_index.match(q='红茶') == []
+
+        assert names(product_index.match(q='茶', limit=1)) == ['玻璃茶杯']
+        first = db.session.get(Product, product_index.match(q='茶')[0])
+        after = Cursor(first.created_at, first.id, 'next')
+        assert names(product_index.match(q='茶', cursor=after)) == ['龙井茶礼盒']
+
+        query = Product.query.filter(Product.sku.like('TEA-%'))
+        assert [p.sku for p in product_index.fetch(query, q='茶', limit=10)] == ['TEA-002']
+        assert [p.sku for p in product_index.fetch(Product.query, sku='0', limit=2)] == ['CUP-001', 'TEA-002']
+
+
+def test_follows_committed_changes(app):
+    with app.app_context():
+        product_index.match(q='龙井')
+        db.session.add(Product(sku='TEA-003', name='狮峰龙井'))
+        db.session.commit()
+        assert names(product_index.match(q='龙井')) == ['狮峰龙井', '龙井茶礼盒', '西湖龙井']
+
+        product = Product.query.filter_by(sku='TEA-001').one()
+        product.name = '明前碧螺春'
+        db.session.commit()
+        assert names(product_index.match(q='龙井')) == ['狮峰龙井', '龙井茶礼盒']
+        assert names(product_index.match(q='碧螺春')) == ['明前碧螺春']
+
+        db.session.delete(Product.query.filter_by(sku='TEA-003').one())
+        db.session.commit()
+        assert names(product_index.match(q='龙井')) == ['龙井茶礼盒']
+
+        # 回滚的修改不进入索引
+        product.name = '白茶'
+        db.session.rollback()
+        assert product_index.match(q='白茶') == []
+
+
+def test_picks_up_other_process_writes(app):
+    with app.app_context():
+        product_index.match(q='龙井')
+        engine = create_engine(app.config['SQLALCHEMY_DATABASE_URI'])
+
+    # 模拟命令行导入：另一个连接直接写产品表并让版本号加一，本进程收不到 on_change
+    now = datetime.utcnow()
+    with engine.begin() as conn:
+        conn.execute(insert(Product).values(sku='TEA-004', name='安吉白茶龙井', is_active=True,
+                                            created_at=now, updated_at=now))
+        conn.execute(update(Product).where(Product.sku == 'TEA-002')
+                     .values(name='碧螺春礼盒', updated_at=now))
+        conn.execute(delete(Product).where(Product.sku == 'TEA-001'))
+        conn.execute(update(CacheVersion).where(CacheVersion.name == 'catalog')
+                     .values(version=CacheVersion.version + 1))
+    engine.dispose()
+
+    with app.app_context():
+        assert names(product_index.match(q='龙井')) == ['安吉白茶龙井']
+        assert names(product_index.match(q='礼盒')) == ['碧螺春礼盒']
+
+        response = app.test_client().get('/search?q=龙井')
+        assert '安吉白茶龙井' in response.get_data(as_text=True)
+
+
+if __name__ == '__main__':
+    sys.exit(pytest.main([__file__, '-q']))
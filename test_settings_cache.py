@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+系统设置缓存测试
+验证设置只在版本号变化时重新加载、保存用一条语句批量写入、其他进程能看到修改。
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import pytest
+from sqlalchemy import event
+
+from models import db, SystemSetting
+from settings_cache import settings_cache, SettingsCache
+
+
+@pytest.fixture
+def app(make_app):
+    app = make_app(
+        # 每次读取都检查版本号，模拟其他进程的修改立即可见
+        CACHE_VERSION_CHECK_INTERVAL=0,
+    )
+    with app.app_context():
+        db.session.add_all([
+            SystemSetting(key='smtp_port', value='587'),
+            SystemSetting(key='enable_email', value='true'),
+        ])
+        db.session.commit()
+    return app
+
+
+def count_statements(engine, func):
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        func()
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+    return statements
+
+
+def test_typed_snapshot_is_cached(app):
+    with app.app_context():
+        settings = settings_cache.snapshot()
+        assert settings.get_int('smtp_port') == 587
+        assert settings.get_bool('enable_email') is True
+        assert settings.get_bool('enable_sms') is False
+        assert settings.get_float('email_digest_window', 0) == 0
+
+        # 版本号未变时只查版本号，不重新加载设置
+        statements = count_statements(db.engine, settings_cache.snapshot)
+        assert not any('system_setting' in s for s in statements)
+
+
+def test_save_is_single_upsert_and_visible_to_other_workers(app):
+    with app.app_context():
+        other_worker = SettingsCache()
+        assert other_worker.snapshot()['smtp_port'] == '587'
+
+        statements = count_statements(db.engine, lambda: settings_cache.save(
+            {'smtp_port': '465', 'notify_email': 'ops@example.com', 'enable_sms': 'true'}))
+        assert sum('system_setting' in s for s in statements) == 1
+
+        settings = other_worker.snapshot()
+        assert settings['smtp_port'] == '465'
+        assert settings['notify_email'] == 'ops@example.com'
+        assert settings.get_bool('enable_sms')
+
+        # 后台管理通过 ORM 修改同样会让缓存失效
+        SystemSetting.query.filter_by(key='smtp_port').one().value = '25'
+        db.session.commit()
+        assert other_worker.snapshot().get_int('smtp_port') == 25
+
+
+def test_settings_form_saves_unchecked_switches(app):
+    client = app.test_client()
+    response = client.post('/settings', data={'smtp_server': 'mail.example.com', 'smtp_password': ''})
+    assert response.status_code == 302
+    with app.app_context():
+        settings = settings_cache.snapshot()
+        assert settings['smtp_server'] == 'mail.example.com'
+        assert settings.get_bool('enable_email') is False
+        assert 'smtp_password' not in settings
+
+
+if __name__ == '__main__':
+    sys.exit(pytest.main([__file__, '-q']))
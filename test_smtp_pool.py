@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+SMTP 连接池和邮件汇总测试
+"""
+
+import os
+import sys
+import time
+from email.message import EmailMessage
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import pytest
+
+from smtp_pool import SMTPPool
+from smtp_stub import SMTPStub
+
+
+def make_settings(stub):
+    return {
+        'smtp_server': stub.host, 'smtp_port': str(stub.port), 'smtp_use_tls': 'false',
+        'smtp_username': 'orders@example.com', 'smtp_password': 'secret',
+    }
+
+
+def make_message(i):
+    msg = EmailMessage()
+    msg['Subject'] = f'测试邮件 {i}'
+    msg['From'] = 'orders@example.com'
+    msg['To'] = 'sales@example.com'
+    msg.set_content('测试')
+    return msg
+
+
+def test_connection_reused():
+    """连续发送复用同一个已登录的连接"""
+    with SMTPStub() as stub:
+        pool = SMTPPool()
+        for i in range(5):
+            pool.send(make_settings(stub), make_message(i))
+        pool.close_all()
+        assert len(stub.messages) == 5
+        assert stub.connections == 1
+        assert stub.commands.count('AUTH') == 1
+
+
+def test_noop_health_check_and_reconnect():
+    """空闲连接取出时先 NOOP 检查；服务器断开后自动重连，邮件不丢"""
+    with SMTPStub(close_after=2) as stub:
+        pool = SMTPPool(noop_interval=0)
+        for i in range(3):
+            time.sleep(0.01)
+            pool.send(make_settings(stub), make_message(i))
+        assert 'NOOP' in stub.commands
+
+        # 不做 NOOP 检查时，发送时才发现连接已断开，重连后重发
+        pool.noop_interval = 60
+        for i in range(3, 6):
+            pool.send(make_settings(stub), make_message(i))
+        pool.close_all()
+        assert [m['Subject'] for m in stub.messages] == [f'测试邮件 {i}' for i in range(6)]
+        assert stub.connections == 3
+
+
+def test_digest_batches_orders(make_app):
+    """汇总窗口内的多个订单合并成一封邮件"""
+    from test_notification_outbox import make_outbox_app, order_once
+    from models import db, SystemSetting, NotificationOutbox
+    from notification_outbox import outbox_worker
+
+    with SMTPStub() as stub:
+        app = make_outbox_app(make_app, stub)
+        with app.app_context():
+            db.session.add(SystemSetting(key='email_digest_window', value='0.5'))
+            db.session.commit()
+            order_ids = [order_once().id for _ in range(3)]
+            # 窗口未结束前不发送
+            assert outbox_worker.run_pending() == 0
+            time.sleep(0.6)
+            assert outbox_worker.run_pending() == 3
+            assert len(stub.messages) == 1
+            digest = stub.messages[0]
+            assert '3 个订单' in digest['Subject']
+            body = digest.get_content()
+            for order_id in order_ids:
+                assert f'订单ID: {order_id}' in body
+            statuses = {e.status for e in NotificationOutbox.query.all()}
+            assert statuses == {'sent'}
+
+
+if __name__ == '__main__':
+    sys.exit(pytest.main([__file__, '-q']))
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+库存并发扣减压力测试
+多个线程同时对同一个产品下单，验证不会超卖，并输出下单吞吐量。
+默认使用临时 SQLite 数据库，设置 STRESS_DATABASE_URL 可以指向 PostgreSQL 测试库。
+
+直接运行: python test_stock_concurrency.py [线程数] [每线程下单次数]
+"""
+
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from conftest import create_test_app
+from models import db, Product, Order
+from orders import place_order
+
+INITIAL_STOCK = 100
+
+
+def run_stress(database_url, threads=16, orders_per_thread=20, quantity=1):
+    """并发下单，返回 (成功订单数, 失败次数, 剩余库存, 耗时秒)"""
+    # 每个线程一个连接；SQLite 写锁等待时间在线程多时需要放宽
+    engine_options = {'pool_size': threads, 'max_overflow': 0}
+    if database_url.startswith('sqlite'):
+        engine_options['connect_args'] = {'timeout': 30}
+    app = create_test_app(database_url, SQLALCHEMY_ENGINE_OPTIONS=engine_options)
+    with app.app_context():
+        Product.query.filter_by(sku='STRESS-SKU').delete()
+        product = Product(sku='STRESS-SKU', name='压力测试产品', retail_price=10.0,
+                          wholesale_price=8.0, stock_quantity=INITIAL_STOCK, is_active=True)
+        db.session.add(product)
+        db.session.commit()
+        product_id = product.id
+
+    placed = []
+    rejected = []
+    errors = []
+    barrier = threading.Barrier(threads)
+
+    def worker():
+        with app.app_context():
+            p = db.session.get(Product, product_id)
+            barrier.wait()
+            for _ in range(orders_per_thread):
+                try:
+                    order = place_order(p, quantity, '压力测试', '13800000000')
+                except Exception as e:
+                    db.session.rollback()
+                    errors.append(e)
+                    continue
+                (placed if order is not None else rejected).append(order.id if order else None)
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    start = time.perf_counter()
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    elapsed = time.perf_counter() - start
+
+    with app.app_context():
+        stock = db.session.get(Product, product_id).stock_quantity
+        order_count = Order.query.filter_by(product_id=product_id).count()
+        Order.query.filter_by(product_id=product_id).delete()
+        Product.query.filter_by(id=product_id).delete()
+        db.session.commit()
+        db.engine.dispose()
+
+    if errors:
+        raise errors[0]
+    assert order_count == len(placed)
+    return len(placed), len(rejected), stock, elapsed
+
+
+def stress_database_url(directory):
+    return os.environ.get('STRESS_DATABASE_URL') or f"sqlite:///{directory}/stress.db"
+
+
+def test_no_oversell(tmp_path):
+    """并发下单总数超过库存时，成功订单正好用完库存"""
+    placed, rejected, stock, elapsed = run_stress(stress_database_url(tmp_path), threads=8, orders_per_thread=20)
+    assert stock == 0
+    assert placed == INITIAL_STOCK
+    assert rejected == 8 * 20 - INITIAL_STOCK
+
+
+def main():
+    threads = int(sys.argv[1]) if len(sys.argv) > 1 else 16
+    orders_per_thread = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    with tempfile.TemporaryDirectory() as directory:
+        placed, rejected, stock, elapsed = run_stress(stress_database_url(directory), threads, orders_per_thread)
+    attempts = threads * orders_per_thread
+    print(f"线程数: {threads}, 下单尝试: {attempts}, 初始库存: {INITIAL_STOCK}")
+    print(f"成功: {placed}, 库存不足: {rejected}, 剩余库存: {stock}")
+    print(f"耗时: {elapsed:.2f} 秒, 吞吐量: {attempts / elapsed:.0f} 次/秒")
+    if stock < 0 or placed + stock != INITIAL_STOCK:
+        print("✗ 出现超卖")
+        return 1
+    print("✓ 没有超卖")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
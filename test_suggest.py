@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+输入联想测试
+验证前缀匹配按名称、货号、条码的顺序和字典序排列，同一产品只出现一次，
+limit 上限，下架产品不出现，以及本进程和其他进程修改产品后联想结果随之更新。
+"""
+
+import os
+import sys
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import pytest
+from sqlalchemy import create_engine, insert, update
+
+from models import db, Product, CacheVersion
+
+
+@pytest.fixture
+def app(make_app):
+    app = make_app(CACHE_VERSION_CHECK_INTERVAL=0)
+    with app.app_context():
+        db.session.add_all([
+            Product(sku='AB-200', barcode='6901', name='Abc 笔记本'),
+            Product(sku='AB-100', barcode='6902', name='苹果'),
+            Product(sku='XY-1', barcode='ab-code', name='abacus'),
+            Product(sku='AB-300', barcode='6903', name='下架产品', is_active=False),
+        ] + [Product(sku=f'BULK-{i:02d}', name=f'批量{i:02d}') for i in range(60)])
+        db.session.commit()
+    return app
+
+
+def suggest(client, **args):
+    response = client.get('/api/suggest', query_string=args)
+    assert response.status_code == 200
+    return [(s['sku'], s['match']) for s in response.get_json()['suggestions']]
+
+
+def test_ranking_and_fields(app):
+    client = app.test_client()
+    # 先名称后货号、条码，字段内按规范化文本排序；abacus 名称已命中，条码不再重复
+    assert suggest(client, q='ab') == [
+        ('XY-1', 'name'), ('AB-200', 'name'), ('AB-100', 'sku')]
+    assert suggest(client, q='  AB- ') == [('AB-100', 'sku'), ('AB-200', 'sku'), ('XY-1', 'barcode')]
+    assert suggest(client, q='ab', field='barcode') == [('XY-1', 'barcode')]
+    assert suggest(client, q='690', field='barcode') == [('AB-200', 'barcode'), ('AB-100', 'barcode')]
+    assert suggest(client, q='下架') == []
+    assert suggest(client, q='') == []
+
+    item = client.get('/api/suggest?q=苹').get_json()['suggestions'][0]
+    assert (item['name'], item['sku'], item['barcode']) == ('苹果', 'AB-100', '6902')
+
+
+def test_limits(app):
+    client = app.test_client()
+    assert suggest(client, q='批量', limit=3) == [('BULK-00', 'name'), ('BULK-01', 'name'), ('BULK-02', 'name')]
+    assert len(suggest(client, q='批量')) == 10
+    assert len(suggest(client, q='批量', limit=0)) == 10
+    assert len(suggest(client, q='批量', limit=1000)) == 50
+
+
+def test_follows_changes(app):
+    client = app.test_client()
+    assert suggest(client, q='苹果') == [('AB-100', 'name')]
+    with app.app_context():
+        product = Product.query.filter_by(sku='AB-100').one()
+        product.name = '香蕉'
+        Product.query.filter_by(sku='AB-300').one().is_active = True
+        db.session.commit()
+    assert suggest(client, q='苹果') == []
+    assert suggest(client, q='香') == [('AB-100', 'name')]
+    assert suggest(client, q='下架') == [('AB-300', 'name')]
+
+    # 其他进程写入的产品在版本号变化后补齐
+    with app.app_context():
+        engine = create_engine(app.config['SQLALCHEMY_DATABASE_URI'])
+    now = datetime.utcnow()
+    with engine.begin() as conn:
+        conn.execute(insert(Product).values(sku='NEW-1', name='香瓜', is_active=True,
+                                            created_at=now, updated_at=now))
+        conn.execute(update(Product).where(Product.sku == 'AB-300').values(is_active=False, updated_at=now))
+        conn.execute(update(CacheVersion).where(CacheVersion.name == 'catalog')
+                     .values(version=CacheVersion.version + 1))
+    engine.dispose()
+    assert suggest(client, q='香') == [('NEW-1', 'name'), ('AB-100', 'name')]
+    assert suggest(client, q='下架') == []
+
+
+if __name__ == '__main__':
+    sys.exit(pytest.main([__file__, '-q']))
@@ -1,5 +1,4 @@
 import os
-import smtplib
 import requests
 import uuid
 from email.message import EmailMessage
@@ -8,6 +7,9 @@ from werkzeug.utils import secure_filename
 from io import BytesIO
 import re
 
+from metrics import time_notification
+from smtp_pool import smtp_pool
+
 def allowed_file(filename, allowed_extensions=None):
     """检查文件扩展名是否允许"""
     if allowed_extensions is None:
@@ -25,53 +27,80 @@ def resize_image(image_path, max_size=(800, 600)):
         print(f"图片压缩失败: {e}")
         return False
 
-def send_email_notification(order, product, settings):
-    """发送邮件通知"""
-    try:
-        msg = EmailMessage()
-        msg['Subject'] = f'新订单通知 - {product.name} x{order.quantity}'
-        msg['From'] = settings.get('smtp_username', 'noreply@example.com')
-        msg['To'] = settings.get('notify_email', 'sales@example.com')
-        
-        body = f"""
-订单详情:
-=================
+def _order_details(order, product):
+    """邮件中单个订单的明细，多行订单逐行列出产品"""
+    if len(order.items) > 1:
+        lines = '\n'.join(
+            f"  {item.product.sku} {item.product.name} x{item.quantity} 单价: {item.unit_price} 小计: {item.total_amount}"
+            for item in order.items
+        )
+        products = f"产品明细:\n{lines}"
+    else:
+        products = f"产品名称: {product.name}\n产品货号: {product.sku}\n单价: {order.unit_price}"
+    return f"""
 订单ID: {order.id}
-产品名称: {product.name}
-产品货号: {product.sku}
+{products}
 订购数量: {order.quantity}
-单价: {order.unit_price}
 总金额: {order.total_amount}
 客户姓名: {order.customer_name}
 客户电话: {order.customer_phone}
 下单时间: {order.created_at}
 备注: {order.notes or '无'}
+"""
 
-请及时处理订单！
-        """
-        
+def _send_email(subject, body, settings):
+    """通过连接池发送邮件，返回是否发送成功，SMTP 未配置时打印内容并返回 None"""
+    try:
+        msg = EmailMessage()
+        msg['Subject'] = subject
+        msg['From'] = settings.get('smtp_username', 'noreply@example.com')
+        msg['To'] = settings.get('notify_email', 'sales@example.com')
         msg.set_content(body)
         
-        smtp_server = settings.get('smtp_server', 'smtp.example.com')
-        smtp_port = int(settings.get('smtp_port', '587'))
         smtp_username = settings.get('smtp_username', '')
         smtp_password = settings.get('smtp_password', '')
         
         if smtp_username and smtp_password:
-            with smtplib.SMTP(smtp_server, smtp_port) as server:
-                server.starttls()
-                server.login(smtp_username, smtp_password)
-                server.send_message(msg)
+            smtp_pool.send(settings, msg)
             print("邮件通知发送成功")
+            return True
         else:
             print("SMTP未配置，邮件通知内容:")
             print(body)
             
     except Exception as e:
         print(f"发送邮件通知失败: {e}")
+        return False
 
+@time_notification('email')
+def send_email_notification(order, product, settings):
+    """发送邮件通知，返回是否发送成功，未配置时返回 None"""
+    body = f"""
+订单详情:
+================={_order_details(order, product)}
+请及时处理订单！
+        """
+    if len(order.items) > 1:
+        subject = f'新订单通知 - {product.name} 等 {len(order.items)} 种产品'
+    else:
+        subject = f'新订单通知 - {product.name} x{order.quantity}'
+    return _send_email(subject, body, settings)
+
+@time_notification('email_digest')
+def send_email_digest(orders, settings):
+    """把一段时间内的多个订单合并成一封邮件发送，返回值同 send_email_notification"""
+    total = sum(order.total_amount or 0 for order in orders)
+    details = '-----------------'.join(_order_details(order, order.product) for order in orders)
+    body = f"""
+订单汇总: 共 {len(orders)} 个订单，总金额 {total:.2f}
+================={details}
+请及时处理订单！
+        """
+    return _send_email(f'新订单汇总 - {len(orders)} 个订单', body, settings)
+
+@time_notification('sms')
 def send_sms_notification(order, product, settings):
-    """发送短信通知"""
+    """发送短信通知，返回是否发送成功，未配置时返回 None"""
     try:
         # 这里使用阿里云短信服务示例
         # 需要先安装: pip install aliyun-python-sdk-core
@@ -103,7 +132,7 @@ def send_sms_notification(order, product, settings):
         
         # 短信模板参数
         template_param = {
-            "product": product.name,
+            "product": product.name if len(order.items) <= 1 else f"{product.name}等{len(order.items)}种",
             "quantity": str(order.quantity),
             "customer": order.customer_name
         }
@@ -111,11 +140,13 @@ def send_sms_notification(order, product, settings):
         
         response = client.do_action_with_exception(request)
         print("短信通知发送成功")
+        return True
         
     except ImportError:
         print("未安装阿里云短信SDK，请运行: pip install aliyun-python-sdk-core")
     except Exception as e:
         print(f"发送短信通知失败: {e}")
+        return False
 
 def fetch_product_image(product_name):
     """从网络获取产品图片"""